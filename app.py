@@ -1,22 +1,19 @@
-import traceback
 from dotenv import load_dotenv
 
-from utils.impersonate import random_impersonate_target
-from utils.url_sanitizer import sanitize_url
+from utils.url_sanitizer import sanitize_url, sanitize_urls
 
 load_dotenv()
 
+import atexit
+import importlib
 import os
 import sys
-import uuid
 import logging
-from logging.handlers import RotatingFileHandler
 
-import yt_dlp
-import subprocess
-from typing import Dict, Optional, Any
+from typing import Callable, Dict, Any, List
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, send_file
+from itsdangerous import BadSignature, SignatureExpired
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from werkzeug.middleware.proxy_fix import ProxyFix
@@ -24,186 +21,70 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 # from threading import Thread
 from flask_socketio import SocketIO
 
-from utils.upload_to_s3 import upload_to_s3_and_get_url
+from utils.upload_to_s3 import (
+    S3_BUCKET_NAME,
+    get_s3_presigned_url,
+    make_unique_object_name,
+    upload_to_s3_and_presign,
+)
+from utils.video_info import info_cache
+from utils.result_cache import make_cache_key, result_cache
 from flask_socketio import join_room
+from utils.batch import (
+    BATCH_CONCURRENCY,
+    BATCH_DELIVERIES,
+    BATCH_MAX_ITEMS,
+    BatchManager,
+    batch_status,
+)
 from utils.cleanup_s3 import init_cleanup_scheduler
-
-# from prometheus_flask_exporter import PrometheusMetrics
+from utils.disk_manager import DiskManager
+from utils.resume import (
+    DOWNLOAD_RESUME,
+    RESUME_DONE,
+    RESUME_FAILED,
+    RESUME_ON_START,
+    RESUME_RUNNING,
+    claim_unfinished_downloads,
+    is_resume_dir,
+    write_manifest,
+)
+from utils.format_planner import is_clip, parse_format_policy
+from utils.job_queue import JOB_FAILED, JobQueue, QueueFullError, job_status
+from utils.job_store import REDIS_URL, create_job_store
+from utils.metrics import (
+    record_download_metrics,
+    register_disk_gauges,
+    register_queue_gauges,
+    render_metrics,
+)
+from utils.process_pool import DOWNLOAD_PROCESSES, DownloadProcessPool
+from utils.progress import ProgressThrottle
+from utils.scheduler import (
+    BATCH_PRIORITY,
+    DEFAULT_PRIORITY,
+    job_domain,
+    priority_value,
+)
+from utils.local_delivery import (
+    DELIVERY_BACKEND,
+    deliver_locally,
+    get_presigned_url,
+    init_local_cleanup_scheduler,
+    local_path,
+    verify_token,
+    zip_local_files,
+)
+from utils.log_config import setup_queue_logging
+from utils.stream_to_s3 import zip_objects_to_s3
 
 
 # Configure logging
 def setup_logging(app):
     """Set up logging for the application."""
-    # Ensure logs directory exists
-    log_dir = os.path.join(os.getcwd(), "logs")
-    os.makedirs(log_dir, exist_ok=True)
-
-    # Configure file handler
-    file_handler = RotatingFileHandler(
-        os.path.join(log_dir, "app.log"), maxBytes=10240, backupCount=10
-    )
-    file_handler.setFormatter(
-        logging.Formatter(
-            "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]"
-        )
-    )
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.setLevel(logging.INFO)
-
-
-class VideoDownloader:
-    def __init__(self, output_dir: Optional[str] = None):
-        """
-        Initialize the VideoDownloader with a custom or default output directory.
-
-        :param output_dir: Directory to save downloaded videos.
-                            If None, creates a 'downloads' folder in current directory.
-        """
-        base_output_dir = output_dir or os.path.join(os.getcwd(), "downloads")
-
-        # Create a unique subdirectory for each download session
-        unique_session_id = str(uuid.uuid4())[:8]  # Use first 8 characters of UUID
-        self.output_dir = os.path.join(base_output_dir, unique_session_id)
-
-        # Ensure the unique directory is created
-        os.makedirs(self.output_dir, exist_ok=True)
-
-        self._check_ffmpeg()
-
-    def _check_ffmpeg(self):
-        """
-        Check if ffmpeg is installed, provide installation instructions if not.
-        """
-        try:
-            subprocess.run(
-                ["ffmpeg", "-version"],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                check=True,
-            )
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            print("\n⚠️ WARNING: FFmpeg is not installed!")
-            if sys.platform == "darwin":
-                print("Install FFmpeg using Homebrew:")
-                print("1. Install Homebrew (if not already installed):")
-                print(
-                    '   /bin/bash -c "$(curl -fsSL https://raw.githubusercontent.com/Homebrew/install/HEAD/install.sh)"'
-                )
-                print("2. Install FFmpeg:")
-                print("   brew install ffmpeg")
-            elif sys.platform.startswith("linux"):
-                print("Install FFmpeg using package manager:")
-                print("For Ubuntu/Debian: sudo apt-get install ffmpeg")
-                print("For Fedora: sudo dnf install ffmpeg")
-            elif sys.platform == "win32":
-                print("Download FFmpeg from: https://ffmpeg.org/download.html")
-                print("Add FFmpeg to your system PATH")
-
-            print("\nFFmpeg is required for merging video and audio streams.")
-            print("Please install it and try again.\n")
-
-    def download(
-        self, url: str, options: Optional[Dict[str, Any]] = None
-    ) -> Dict[str, Any]:
-        """
-        Download a video from the given URL.
-
-        :param url: URL of the video to download
-        :param options: Optional dictionary of yt-dlp download options
-        :return: Dictionary containing download information
-        """
-        # Default download options with headers and bypass configurations
-        default_opts = {
-            "format": "bestvideo[ext=mp4]+bestaudio/best[ext=mp4]",
-            "outtmpl": os.path.join(self.output_dir, "%(title).50s.%(ext)s"),
-            "merge_output_format": "mp4",
-            "verbose": True,
-            "progress_hooks": [self._progress_hook],
-            "nooverwrites": True,
-            # "http_headers": {
-            #     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            #     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            #     "Accept-Language": "en-US,en;q=0.5",
-            #     "Referer": "https://www.google.com/",
-            # },
-            # "extractor_args": {
-            #     "youtube": {
-            #         "player_client": ["android"],
-            #         "player_skip": ["webpage"],
-            #     }
-            # },
-            # "force_generic_extractor": True,
-            # "ignoreerrors": True,
-            # "retries": 10,
-            # "fragment_retries": 10,
-            # "skip_unavailable_fragments": True,
-            # "extract_flat": True,
-            "impersonate": random_impersonate_target(),
-            # "referer": url,  # Use the video URL as referer
-            # "playlist_items": None,
-            # "throttled_rate": "1M",  # Limit download speed to avoid detection
-            # "sleep_interval": 5,  # Add delay between requests
-            # "max_sleep_interval": 10,
-            # "force_ipv4": False,
-            # Add filename sanitization options
-            # "restrictfilenames": True,  # Convert filename to ASCII
-            "windowsfilenames": True,   # Ensure Windows compatibility
-        }
-
-        # Update default options with user-provided options
-        if options:
-            default_opts.update(options)
-
-        try:
-            with yt_dlp.YoutubeDL(default_opts) as ydl:
-                # Extract video information
-                info_dict = ydl.extract_info(url, download=True)
-                app.logger.info(f"Downloaded video info: {info_dict}")
-                # Prepare return information
-                return {
-                    "success": True,
-                    "title": info_dict.get("title"),
-                    "filename": ydl.prepare_filename(info_dict),
-                    "url": url,
-                    "extractor": info_dict.get("extractor"),
-                    "download_directory": self.output_dir,
-                }
-
-        except Exception as e:
-            app.logger.error(f"Error downloading video: {str(e)}")
-            app.logger.error(traceback.format_exc())
-            return {"success": False, "error": str(e), "url": url}
-
-    def _progress_hook(self, d: Dict[str, Any]) -> None:
-        """
-        Internal progress hook for download tracking.
-        """
-        if d["status"] == "finished":
-            print(f"Download complete: {d['filename']}")
-            socketio.emit("download_progress", {"percent": 100}, room=self.client_id)
-
-        elif d["status"] == "downloading":
-            downloaded_bytes = d.get("downloaded_bytes", 0)
-            total_bytes = d.get("total_bytes") or d.get("total_bytes_estimate", 0)
-            if total_bytes > 0:
-                percent = downloaded_bytes / total_bytes * 100
-                print(f"Downloading: {percent:.1f}%")
-                socketio.emit(
-                    "download_progress", {"percent": percent}, room=self.client_id
-                )
-
-
-def download_video(url: str, output_dir: Optional[str] = None) -> Dict[str, Any]:
-    """
-    Convenience function for quick video downloads.
-
-    :param url: URL of the video to download
-    :param output_dir: Optional directory to save the video
-    :return: Download result dictionary
-    """
-    downloader = VideoDownloader(output_dir)
-    return downloader.download(url)
+    # Modules under utils/ log through their own loggers; both go through a
+    # queue to a background writer, see utils.log_config
+    setup_queue_logging([app.logger, logging.getLogger("utils")])
 
 
 # app = Flask(__name__)
@@ -211,13 +92,21 @@ app = Flask(__name__, template_folder=os.path.join(os.getcwd(), "templates"))
 
 # Fix for running behind a proxy (like Nginx)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1)
+# Let the proxy send locally delivered files itself (X-Sendfile)
+app.config["USE_X_SENDFILE"] = (
+    os.environ.get("USE_X_SENDFILE", "False").lower() == "true"
+)
 
 # Set up rate limiting
+app.config["RATELIMIT_ENABLED"] = (
+    os.environ.get("RATELIMIT_ENABLED", "True").lower() == "true"
+)
 limiter = Limiter(
     get_remote_address,
     app=app,
     default_limits=["1000 per day", "300 per hour"],
-    storage_uri="memory://",
+    # Shared across workers and nodes when Redis is configured
+    storage_uri=os.environ.get("RATELIMIT_STORAGE_URI") or REDIS_URL or "memory://",
 )
 
 # Set up logging
@@ -226,6 +115,8 @@ setup_logging(app)
 # Initialize the cleanup scheduler
 if os.environ.get("ENABLE_S3_CLEANUP", "False").lower() == "true":
     init_cleanup_scheduler()
+if DELIVERY_BACKEND == "local":
+    init_local_cleanup_scheduler()
 
 
 # Add this route before the download API route
@@ -237,18 +128,226 @@ def index():
     return render_template("index.html")
 
 
-def download_video_task(url, client_id):
+def emit_to_job_clients(job_id: str, event: str, data: Dict[str, Any]) -> None:
+    """
+    Emit a Socket.IO event to the room of every client waiting on a job.
+
+    The clients are looked up on every emit since requests (on any node)
+    can attach to the job while it runs.
+
+    :param job_id: Job whose clients to notify
+    :param event: Event name
+    :param data: Event payload
+    """
+    for client_id in job_queue.client_ids(job_id):
+        socketio.emit(event, data, room=client_id)
+
+
+def emit_job_progress(job_id: str, data: Dict[str, Any]) -> None:
+    """
+    Report a job's progress to its clients and to the batches it belongs to.
+    """
+    emit_to_job_clients(job_id, "download_progress", data)
+    batch_manager.job_progress(job_id, data)
+
+
+def make_upload_progress_emitter(job_id: str) -> Callable[[int, int], None]:
+    """
+    Build an upload progress callback that reports to the job's clients.
+
+    :param job_id: Job whose clients to notify
+    :return: Callable receiving (uploaded bytes, total bytes)
+    """
+    throttle = ProgressThrottle(lambda data: emit_job_progress(job_id, data))
+
+    def emit_upload_progress(uploaded_bytes: int, total_bytes: int) -> None:
+        percent = uploaded_bytes * 100 / total_bytes if total_bytes else 100.0
+        throttle(
+            {
+                "phase": "upload",
+                "percent": percent,
+                "uploaded_bytes": uploaded_bytes,
+                "total_bytes": total_bytes,
+            },
+            final=uploaded_bytes >= total_bytes,
+        )
+
+    return emit_upload_progress
+
+
+def make_download_progress_emitter(job_id: str) -> Callable[[Dict[str, Any]], None]:
+    """
+    Build a download progress callback that reports to the job's clients.
+
+    :param job_id: Job whose clients to notify
+    :return: Callable receiving progress events from the downloader
+    """
+
+    def emit_download_progress(data: Dict[str, Any]) -> None:
+        emit_job_progress(job_id, data)
+
+    return emit_download_progress
+
+
+def get_impersonation_selector():
+    """
+    Return this process's ImpersonationSelector, see utils.impersonate.
+
+    yt-dlp and the modules built on it are imported where they are first
+    used rather than at the top of this file, so the app starts serving
+    without paying for them; with DOWNLOAD_PROCESSES set, most of yt-dlp is
+    never loaded into the web process at all.
+    """
+    from utils.impersonate import impersonation_selector
+
+    return impersonation_selector
+
+
+# Names this module used to import at the top; they stay importable from
+# it (from app import download_video) but are only loaded when asked for
+_LAZY_IMPORTS = {
+    "download_video": "utils.video_downloader",
+    "run_download_task": "utils.video_downloader",
+    "run_expand_task": "utils.video_downloader",
+    "run_info_task": "utils.video_downloader",
+    "impersonation_selector": "utils.impersonate",
+    "probe_ffmpeg": "utils.ydl_pool",
+}
+
+
+def __getattr__(name: str) -> Any:
+    # Only called for names this module does not define (PEP 562)
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+
+
+def save_impersonation_stats() -> None:
+    # Only if a job loaded the selector; importing it here would load yt-dlp
+    module = sys.modules.get("utils.impersonate")
+    if module and module.impersonation_selector.state_file:
+        module.impersonation_selector.save()
+
+
+# Keep what was learnt about impersonation targets across restarts
+atexit.register(save_impersonation_stats)
+
+
+def ffmpeg_available() -> bool:
+    from utils.ydl_pool import probe_ffmpeg
+
+    return probe_ffmpeg()["available"]
+
+
+def extract_video_info(url: str) -> Dict[str, Any]:
+    """
+    Extract a video's metadata, reusing a cached extraction of the same URL.
+
+    :param url: Sanitized URL of the video
+    :return: Result dictionary with the "summary" of the video on success
+    """
+    cached = info_cache.get(url)
+    if cached:
+        return {"success": True, "cached": True, **cached}
+
+    targets = get_impersonation_selector().ranking(job_domain(url))
+    try:
+        if process_pool:
+            result = process_pool.run(
+                {
+                    "action": "info",
+                    "url": url,
+                    "impersonate_targets": [str(t) for t in targets],
+                },
+                lambda _: None,
+            )
+        else:
+            from utils.video_downloader import run_info_task
+
+            result = run_info_task(url, targets)
+    except Exception as e:
+        app.logger.exception("Unexpected error during extraction")
+        return {"success": False, "error": str(e)}
+    record_download_metrics(result)
+    get_impersonation_selector().record_attempts(result.get("impersonation"))
+
+    if result["success"]:
+        info_cache.set(url, {"summary": result["summary"], "info": result["info"]})
+    return result
+
+
+def expand_playlist(url: str, limit: int) -> List[str]:
+    """
+    List the video URLs of a playlist; a single video lists just itself.
+
+    :param url: Sanitized playlist or video URL
+    :param limit: Maximum number of entries
+    :return: Sanitized entry URLs
+    :raises ValueError: If the playlist cannot be extracted
+    """
+    targets = get_impersonation_selector().ranking(job_domain(url))
+    task = {
+        "action": "expand",
+        "url": url,
+        "limit": limit,
+        "impersonate_targets": [str(t) for t in targets],
+    }
+    if process_pool:
+        result = process_pool.run(task, lambda _: None)
+    else:
+        from utils.video_downloader import run_expand_task
+
+        result = run_expand_task(url, limit, targets)
+    get_impersonation_selector().record_attempts(result.get("impersonation"))
+    if not result["success"]:
+        raise ValueError(f"Could not list the playlist: {result.get('error')}")
+    return sanitize_urls(result["urls"], unique=True)
+
+
+def download_video_task(url, job_id, output_dir=None, policy=None, resume=False):
     try:
-        downloader = VideoDownloader()
-        # Add client_id to the downloader instance
-        downloader.client_id = client_id
-        result = downloader.download(url)
+        progress_callback = make_download_progress_emitter(job_id)
+        # A recent /info of the same URL saves extracting it again
+        cached = info_cache.get(url)
+        info = cached["info"] if cached else None
+        # Targets that worked for this site recently are tried first
+        targets = get_impersonation_selector().ranking(job_domain(url))
+
+        if process_pool:
+            result = process_pool.run(
+                {
+                    "url": url,
+                    "output_dir": output_dir,
+                    "info": info,
+                    "policy": policy,
+                    "impersonate_targets": [str(t) for t in targets],
+                    "resume": resume,
+                },
+                progress_callback,
+            )
+        else:
+            from utils.video_downloader import run_download_task
+
+            result = run_download_task(
+                url,
+                progress_callback,
+                output_dir=output_dir,
+                info=info,
+                policy=policy,
+                impersonate_targets=targets,
+                resume=resume,
+            )
+        record_download_metrics(result)
+        get_impersonation_selector().record_attempts(result.get("impersonation"))
 
         # Check if download was successful
         if not result["success"]:
             app.logger.error(f"Download failed: {result.get('error', 'Unknown error')}")
         else:
-            app.logger.info(f"Successfully downloaded video: {result['filename']}")
+            app.logger.info(
+                "Successfully downloaded video: "
+                f"{result.get('filename') or result.get('object_name')}"
+            )
 
         return result
     except Exception as e:
@@ -256,11 +355,260 @@ def download_video_task(url, client_id):
         return {"success": False, "error": str(e), "filename": None}
 
 
+def process_download_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Download the job's video and upload it to S3.
+
+    Runs on a job queue worker, outside of any request.
+
+    :param job: Job record with "id", "url" and the cache "key"
+    :return: Result dictionary with the download URL on success
+    """
+    cache_key = job["key"]
+
+    cached_object_name = result_cache.get(cache_key)
+    download_url = None
+    if cached_object_name:
+        download_url = get_presigned_url(cached_object_name)
+
+    if download_url:
+        app.logger.info(f"Result cache hit for {job['url']}: {cached_object_name}")
+        return {
+            "success": True,
+            "download_url": download_url,
+            "object_name": cached_object_name,
+            "cached": True,
+        }
+
+    # Queued jobs wait a little for eviction or other jobs to free space
+    if not disk_manager.wait_for_space():
+        return {"success": False, "error": "Not enough disk space, try again later"}
+
+    # The session directory is removed once the job is done; a resumable
+    # one is kept on failure, so the next attempt continues from its data
+    with disk_manager.session(cache_key if DOWNLOAD_RESUME else None) as session_dir:
+        resume = is_resume_dir(session_dir)
+        if resume:
+            write_manifest(
+                session_dir,
+                key=cache_key,
+                url=job["url"],
+                policy=job.get("policy"),
+                job_id=job["id"],
+                status=RESUME_RUNNING,
+            )
+        result = None
+        try:
+            result = download_and_upload(job, session_dir, resume)
+            return result
+        finally:
+            # Only downloads still marked running are requeued on startup
+            if resume and os.path.isdir(session_dir):
+                write_manifest(
+                    session_dir,
+                    status=(
+                        RESUME_DONE if result and result["success"] else RESUME_FAILED
+                    ),
+                )
+
+
+def download_and_upload(
+    job: Dict[str, Any], session_dir: str, resume: bool = False
+) -> Dict[str, Any]:
+    """
+    Download the job's video into session_dir and deliver it.
+
+    Files are uploaded to S3, or with DELIVERY_BACKEND=local served from
+    this node, see utils.local_delivery.
+
+    :param job: Job record with "id", "url" and the cache "key"
+    :param session_dir: Directory the download may write to
+    :param resume: Whether session_dir is a working directory to resume in
+    :return: Result dictionary with the download URL on success
+    """
+    cache_key = job["key"]
+    download_req = download_video_task(
+        job["url"], job["id"], session_dir, job.get("policy"), resume
+    )
+
+    if not download_req.get("success"):
+        return {
+            "success": False,
+            "error": download_req.get("error", "Unknown error"),
+        }
+
+    # Chosen format and time spent per phase, including any merge
+    details = {
+        "format_id": download_req.get("format_id"),
+        "phase_seconds": download_req.get("phase_seconds"),
+    }
+
+    # Streamed downloads are already in S3
+    if download_req.get("object_name"):
+        object_name = download_req["object_name"]
+        download_url = get_s3_presigned_url(S3_BUCKET_NAME, object_name)
+        if download_url:
+            result_cache.set(cache_key, object_name)
+            return {
+                "success": True,
+                "download_url": download_url,
+                "object_name": object_name,
+                **details,
+            }
+
+    # Upload the downloaded file to blob Storage, or serve it from here
+    filename = download_req.get("filename")
+    if filename and DELIVERY_BACKEND == "local":
+        uploaded = deliver_locally(
+            filename, os.path.basename(filename), download_req.get("extractor")
+        )
+    elif filename:
+        uploaded = upload_to_s3_and_presign(
+            filename,
+            os.path.basename(filename),
+            download_directory=download_req.get("download_directory"),
+            progress_callback=make_upload_progress_emitter(job["id"]),
+            extractor=download_req.get("extractor"),
+        )
+    else:
+        uploaded = None
+    if uploaded:
+        object_name, download_url = uploaded
+        result_cache.set(cache_key, object_name)
+        return {
+            "success": True,
+            "download_url": download_url,
+            "object_name": object_name,
+            **details,
+        }
+
+    return {"success": False, "error": "Failed to upload file"}
+
+
+def notify_job_complete(job: Dict[str, Any]) -> None:
+    """
+    Push a finished job's result to every client attached to it.
+
+    :param job: Finished or failed job record
+    """
+    batch_manager.job_finished(job)
+    if job["result"].get("success"):
+        emit_to_job_clients(
+            job["id"],
+            "download_complete",
+            {"job_id": job["id"], "download_url": job["result"]["download_url"]},
+        )
+    else:
+        emit_to_job_clients(
+            job["id"],
+            "download_failed",
+            {"job_id": job["id"], "error": job["error"]},
+        )
+
+
+# Session directories for downloads, kept within the local disk quota
+disk_manager = DiskManager()
+disk_manager.remove_orphans()
+disk_manager.start_monitor()
+register_disk_gauges(disk_manager.stats)
+# yt-dlp runs in recycled worker processes when DOWNLOAD_PROCESSES is set
+process_pool = DownloadProcessPool() if DOWNLOAD_PROCESSES > 0 else None
+# Job records live in Redis when REDIS_URL is set, so any node can serve /jobs
+job_queue = JobQueue(
+    process_download_job, on_complete=notify_job_complete, store=create_job_store()
+)
+register_queue_gauges(job_queue.stats)
+
+
+def resume_interrupted_downloads() -> None:
+    """
+    Requeue the downloads a previous run of the app did not finish.
+
+    Their clients are gone, but the result lands in the result cache, so
+    asking for the video again returns it without downloading. Downloads
+    that failed are not requeued, and each Gunicorn worker only requeues
+    the ones it claimed.
+    """
+    for manifest in claim_unfinished_downloads(disk_manager.base_dir):
+        try:
+            job = job_queue.submit(
+                key=manifest["key"],
+                url=manifest["url"],
+                policy=manifest.get("policy"),
+                priority=priority_value(BATCH_PRIORITY),
+            )
+        except QueueFullError:
+            app.logger.warning("Queue is full, not resuming more downloads")
+            return
+        app.logger.info(f"Resuming download of {manifest['url']} as job {job['id']}")
+
+
+if DOWNLOAD_RESUME and RESUME_ON_START:
+    resume_interrupted_downloads()
+
+
+def submit_batch_item(url: str, batch: Dict[str, Any]) -> Dict[str, Any]:
+    # Batch items are regular jobs; progress reaches the batch's client
+    # through the batch instead of a per-item client. They count as the
+    # batch client's jobs, so its higher priority downloads go first and
+    # other clients take turns with it
+    return job_queue.submit(
+        key=make_cache_key(url, batch["policy"]),
+        url=url,
+        policy=batch["policy"],
+        owner=batch["client_id"],
+        priority=priority_value(batch["priority"]),
+    )
+
+
+def package_batch_zip(batch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Stream the batch's downloaded videos into one ZIP in S3, or on the
+    local disk with DELIVERY_BACKEND=local.
+
+    :param batch: Batch record whose items are done
+    :return: Fields to add to the batch, with the archive's "zip_url"
+    """
+    members = []
+    for index, item in enumerate(batch["items"], start=1):
+        if item["status"] == "finished" and item["object_name"]:
+            # Drop the uuid prefix of the object name, number the entries
+            name = os.path.basename(item["object_name"]).split("_", 1)[-1]
+            members.append((f"{index:03d}_{name}", item["object_name"]))
+    object_name = make_unique_object_name(f"batch_{batch['id'][:8]}.zip")
+    if DELIVERY_BACKEND == "local":
+        size = zip_local_files(object_name, members)
+    else:
+        size = zip_objects_to_s3(object_name, members)
+    app.logger.info(f"Packaged batch {batch['id']} into {object_name} ({size} bytes)")
+    return {
+        "zip_object_name": object_name,
+        "zip_url": get_presigned_url(object_name),
+    }
+
+
+def notify_batch(batch: Dict[str, Any], event: str, data: Dict[str, Any]) -> None:
+    socketio.emit(event, data, room=batch["client_id"])
+
+
+# Batches feed their items into job_queue a few at a time
+batch_manager = BatchManager(
+    submit_batch_item,
+    job_queue.get,
+    expand_playlist,
+    notify_batch,
+    package=package_batch_zip,
+)
+
+
 @app.route("/download", methods=["POST"])
 # @limiter.limit("100 per hour")  # Additional rate limiting for this specific endpoint
 def download_video_api():
     """
-    API endpoint to download a video and return the file.
+    API endpoint to queue a video download.
+
+    Returns a job id immediately; the download URL is pushed to the client's
+    Socket.IO room and is also available from /jobs/<job_id>.
 
     Expected JSON payload:
     {
@@ -286,38 +634,279 @@ def download_video_api():
     #     return jsonify({"success": False, "error": "Invalid API key"}), 403
 
     # Extract URL
-    url = sanitize_url(data.get("url"))
-    if not url:
+    if not data.get("url"):
         app.logger.warning("Download request without URL")
         return jsonify({"success": False, "error": "No URL provided"}), 400
+    if not isinstance(data["url"], str):
+        return jsonify({"success": False, "error": "url must be a string"}), 400
+    url = sanitize_url(data.get("url"))
 
     client_id = data.get("client_id")
     if not client_id:
         return jsonify({"success": False, "error": "No client ID provided"}), 400
 
-    download_req = download_video_task(url, client_id)
+    try:
+        policy = parse_format_policy(data)
+        priority = priority_value(data.get("priority", DEFAULT_PRIORITY))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if is_clip(policy) and not ffmpeg_available():
+        return (
+            jsonify({"success": False, "error": "Clips need ffmpeg on the server"}),
+            400,
+        )
 
-    # Check if download was successful
-    if not download_req.get("success"):
+    if not disk_manager.has_space():
+        app.logger.warning("Rejected download request: low on disk space")
+        return (
+            jsonify({"success": False, "error": "Server is busy, try again later"}),
+            503,
+        )
+
+    try:
+        # Identical requests attach to the job already downloading that video
+        job = job_queue.submit(
+            key=make_cache_key(url, policy),
+            client_id=client_id,
+            url=url,
+            policy=policy,
+            priority=priority,
+        )
+    except QueueFullError as e:
+        app.logger.warning(f"Rejected download request: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 503
+
+    app.logger.info(
+        f"Queued download job {job['id']} for {url} ({job['coalesced']} coalesced)"
+    )
+    return jsonify({"success": True, **job_status(job)}), 202
+
+
+@app.route("/batch", methods=["POST"])
+def batch_download_api():
+    """
+    API endpoint to queue a batch of downloads.
+
+    Items are downloaded a few at a time. Progress of the whole batch is
+    pushed to the client's Socket.IO room as batch_progress events, followed
+    by batch_complete; the status is also available from /batches/<batch_id>.
+
+    Expected JSON payload:
+    {
+        "urls": ["video_url", ...] or "playlist_url": "playlist_url",
+        "client_id": "unique_client_id",
+        "delivery": "items" or "zip",
+        "concurrency": 4
+    }
+    plus the format policy fields of /download, applied to every item.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({"success": False, "error": "Invalid request"}), 400
+
+    client_id = data.get("client_id")
+    if not client_id:
+        return jsonify({"success": False, "error": "No client ID provided"}), 400
+
+    urls = data.get("urls")
+    playlist_url = data.get("playlist_url")
+    if bool(urls) == bool(playlist_url):
         return (
             jsonify(
-                {"success": False, "error": download_req.get("error", "Unknown error")}
+                {"success": False, "error": "Provide either urls or a playlist_url"}
             ),
-            500,
+            400,
         )
+    if urls is not None:
+        if not isinstance(urls, list) or not all(isinstance(u, str) for u in urls):
+            return jsonify({"success": False, "error": "urls must be a list"}), 400
+        if len(urls) > BATCH_MAX_ITEMS:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": f"A batch holds at most {BATCH_MAX_ITEMS} URLs",
+                    }
+                ),
+                400,
+            )
+        urls = sanitize_urls(urls)
+    else:
+        if not isinstance(playlist_url, str):
+            return (
+                jsonify({"success": False, "error": "playlist_url must be a string"}),
+                400,
+            )
+        playlist_url = sanitize_url(playlist_url)
 
-    # Upload the downloaded file to blob Storage
-    filename = download_req.get("filename")
-    if filename:
-        download_url = upload_to_s3_and_get_url(
-            filename,
-            os.path.basename(filename),
-            download_directory=download_req.get("download_directory"),
+    delivery = data.get("delivery", "items")
+    if delivery not in BATCH_DELIVERIES:
+        return (
+            jsonify({"success": False, "error": "delivery must be items or zip"}),
+            400,
         )
-        if download_url:
-            return jsonify({"success": True, "download_url": download_url})
+    concurrency = data.get("concurrency", BATCH_CONCURRENCY)
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int):
+        return jsonify({"success": False, "error": "concurrency must be a number"}), 400
+
+    priority = data.get("priority", BATCH_PRIORITY)
+    try:
+        policy = parse_format_policy(data)
+        priority_value(priority)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if is_clip(policy) and not ffmpeg_available():
+        return (
+            jsonify({"success": False, "error": "Clips need ffmpeg on the server"}),
+            400,
+        )
+
+    if not disk_manager.has_space():
+        app.logger.warning("Rejected batch request: low on disk space")
+        return (
+            jsonify({"success": False, "error": "Server is busy, try again later"}),
+            503,
+        )
+
+    batch = batch_manager.create(
+        client_id,
+        urls=urls,
+        playlist_url=playlist_url,
+        policy=policy,
+        delivery=delivery,
+        concurrency=concurrency,
+        priority=priority,
+    )
+    app.logger.info(
+        f"Queued batch {batch['id']} of "
+        f"{len(urls) if urls else 'playlist ' + playlist_url}"
+    )
+    return jsonify({"success": True, **batch_status(batch)}), 202
+
+
+@app.route("/batches/<batch_id>", methods=["GET"])
+@limiter.exempt
+def get_batch(batch_id):
+    """
+    API endpoint to check the progress and per-item results of a batch.
+    """
+    batch = batch_manager.get(batch_id)
+    if not batch:
+        return jsonify({"success": False, "error": "Batch not found"}), 404
+
+    return jsonify({"success": True, **batch_status(batch)})
+
+
+@app.route("/info", methods=["GET"])
+def get_video_info():
+    """
+    API endpoint describing a video without downloading it.
+
+    Query parameters: url. Returns the title, duration, available formats
+    with estimated sizes and the format a download would pick.
+    """
+    if not request.args.get("url"):
+        return jsonify({"success": False, "error": "No URL provided"}), 400
+    url = sanitize_url(request.args["url"])
+
+    result = extract_video_info(url)
+    if not result["success"]:
+        app.logger.error(f"Extraction failed: {result.get('error', 'Unknown error')}")
+        return jsonify({"success": False, "error": result.get("error")}), 422
+
+    return jsonify(
+        {"success": True, "cached": result.get("cached", False), **result["summary"]}
+    )
 
-    return jsonify({"success": False, "error": "Failed to upload file"}), 500
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+@limiter.exempt
+def get_job(job_id):
+    """
+    API endpoint to check the status and result of a download job.
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+
+    return jsonify({"success": job["status"] != JOB_FAILED, **job_status(job)})
+
+
+@app.route("/files/<token>", methods=["GET", "HEAD"])
+@limiter.exempt
+def get_file(token):
+    """
+    Serve a locally delivered file from its signed link.
+
+    Supports Range and conditional requests, so players can seek and
+    downloads can continue; the body is sent with the server's sendfile
+    support, or by the proxy with USE_X_SENDFILE.
+    """
+    try:
+        object_name = verify_token(token)
+    except SignatureExpired:
+        return jsonify({"success": False, "error": "Link expired"}), 403
+    except BadSignature:
+        return jsonify({"success": False, "error": "Invalid link"}), 403
+
+    path = local_path(object_name)
+    if not path or not os.path.isfile(path):
+        return jsonify({"success": False, "error": "File not found"}), 404
+
+    # Drop the uuid prefix of the object name
+    download_name = os.path.basename(object_name).split("_", 1)[-1]
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        etag=True,
+        max_age=0,
+    )
+
+
+@app.route("/queue/stats", methods=["GET"])
+@limiter.exempt
+def get_queue_stats():
+    """
+    API endpoint reporting queued and running jobs and wait times per site.
+    """
+    return jsonify(
+        {"success": True, **job_queue.stats(), **job_queue.scheduler_stats()}
+    )
+
+
+@app.route("/impersonation/stats", methods=["GET"])
+def get_impersonation_stats():
+    """
+    API endpoint reporting per-site success rates and throughput of each
+    impersonation target.
+    """
+    return jsonify({"success": True, "sites": get_impersonation_selector().stats()})
+
+
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """
+    API endpoint reporting cache sizes and hit/miss counters.
+    """
+    return jsonify(
+        {
+            "success": True,
+            "result_cache": result_cache.stats(),
+            "info_cache": info_cache.stats(),
+        }
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+@limiter.exempt
+def metrics():
+    """
+    Prometheus scrape endpoint with per-phase timings, throughput and queue gauges.
+    """
+    payload, content_type = render_metrics()
+    return Response(payload, mimetype=content_type)
 
 
 # Error handlers
@@ -332,7 +921,9 @@ def internal_error_handler(e):
     return jsonify(error="Internal server error"), 500
 
 
-socketio = SocketIO(app)
+# With a message queue, emits from any worker or node reach clients connected
+# to another one
+socketio = SocketIO(app, message_queue=REDIS_URL)
 
 
 @socketio.on("register_client")
@@ -343,10 +934,5 @@ def handle_client_registration(data):
         join_room(client_id)
 
 
-# def init_metrics(app):
-#     metrics = PrometheusMetrics(app)
-#     metrics.info('app_info', 'Application info', version='1.0.0')
-
-
 if __name__ == "__main__":
     socketio.run(app, port=3001, debug=False)
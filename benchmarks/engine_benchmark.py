@@ -0,0 +1,105 @@
+"""
+Measure the per-request setup cost of the yt-dlp engine.
+
+Compares building a fresh YoutubeDL (and probing ffmpeg) for every request,
+as VideoDownloader used to, with handing out pooled instances. Each mode is
+timed for setup alone and for setup plus extracting a small clip served
+locally, since that overhead is paid even on the smallest downloads.
+
+    python -m benchmarks.engine_benchmark --requests 50
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp  # noqa: E402
+
+from benchmarks.local_services import generate_media, start_media_server  # noqa: E402
+from utils.impersonate import random_impersonate_target  # noqa: E402
+from utils.ydl_pool import YoutubeDLPool  # noqa: E402
+
+
+def build_options(output_dir: str) -> dict:
+    return {
+        "format": "bestvideo[ext=mp4]+bestaudio/best[ext=mp4]/best",
+        "outtmpl": os.path.join(output_dir, "%(title).50s.%(ext)s"),
+        "merge_output_format": "mp4",
+        "quiet": True,
+        "no_warnings": True,
+        "progress_hooks": [lambda d: None],
+        "impersonate": random_impersonate_target(),
+    }
+
+
+def cold(options: dict, url: str = None) -> None:
+    try:
+        subprocess.run(
+            ["ffmpeg", "-version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    except FileNotFoundError:
+        pass
+    with yt_dlp.YoutubeDL(options) as ydl:
+        if url:
+            ydl.extract_info(url, download=False)
+
+
+def make_warm(pool: YoutubeDLPool) -> Callable[[dict, str], None]:
+    def warm(options: dict, url: str = None) -> None:
+        with pool.acquire(options) as ydl:
+            if url:
+                ydl.extract_info(url, download=False)
+
+    return warm
+
+
+def time_requests(
+    run: Callable[[dict, str], None], output_dir: str, url: str, requests: int
+) -> List[float]:
+    timings = []
+    for _ in range(requests):
+        options = build_options(output_dir)
+        start = time.perf_counter()
+        run(options, url)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="engine-benchmark-")
+    media = generate_media(os.path.join(work_dir, "media"), duration=2, size_mb=1)
+    base_url = start_media_server(os.path.join(work_dir, "media"))
+    clip_url = f"{base_url}/{media['progressive']}"
+    output_dir = os.path.join(work_dir, "out")
+
+    pool = YoutubeDLPool()
+    modes = {"fresh": cold, "pooled": make_warm(pool)}
+    print(f"{args.requests} requests per mode, times in ms")
+    print(f"{'mode':>8} {'work':>8} {'mean':>8} {'p50':>8} {'p95':>8}")
+    for work, url in (("setup", None), ("extract", clip_url)):
+        for name, run in modes.items():
+            # Warm up imports, the pool and the media server connection
+            time_requests(run, output_dir, url, 2)
+            timings = sorted(time_requests(run, output_dir, url, args.requests))
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(
+                f"{name:>8} {work:>8} {statistics.mean(timings):>8.1f} "
+                f"{statistics.median(timings):>8.1f} {p95:>8.1f}"
+            )
+    print(f"pool: {pool.stats()}")
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
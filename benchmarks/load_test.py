@@ -0,0 +1,257 @@
+"""
+End-to-end load benchmark for the /download pipeline, fully offline.
+
+Serves synthetic media from a local HTTP server, stores uploads in a local
+moto S3 server and runs the app under Gunicorn (gevent worker, as in the
+Dockerfile). For each concurrency level it submits that many downloads at
+once, each with a unique URL so the result cache and coalescing do not kick
+in, and waits for every job to finish.
+
+    python -m benchmarks.load_test --concurrency 1 4 16 --media progressive hls
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import psutil
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.local_services import (  # noqa: E402
+    free_port,
+    generate_media,
+    start_media_server,
+    start_moto_server,
+)
+
+
+def request_json(url: str, payload: Dict[str, Any] = None) -> Dict[str, Any]:
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(
+        url, data=data, headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        return json.load(e)
+
+
+def run_job(app_url: str, media_url: str, timeout: float) -> Dict[str, Any]:
+    start = time.perf_counter()
+    job = request_json(
+        f"{app_url}/download", {"url": media_url, "client_id": "load-test"}
+    )
+    if "job_id" not in job:
+        return {"success": False, "error": job.get("error"), "seconds": 0}
+
+    while time.perf_counter() - start < timeout:
+        status = request_json(f"{app_url}/jobs/{job['job_id']}")
+        if status.get("status") in ("finished", "failed"):
+            return {
+                "success": status["status"] == "finished",
+                "error": status.get("error"),
+                "seconds": time.perf_counter() - start,
+            }
+        time.sleep(0.1)
+    return {"success": False, "error": "timeout", "seconds": timeout}
+
+
+class ResourceSampler:
+    def __init__(self, pid: int, disk_dir: str, interval: float = 0.1):
+        """
+        Sample peak RSS of the app (and its children) and peak disk usage.
+        """
+        self.process = psutil.Process(pid)
+        self.disk_dir = disk_dir
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_disk = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "ResourceSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                processes = [self.process] + self.process.children(recursive=True)
+                rss = sum(p.memory_info().rss for p in processes)
+            except psutil.Error:
+                rss = 0
+            self.peak_rss = max(self.peak_rss, rss)
+            self.peak_disk = max(self.peak_disk, directory_size(self.disk_dir))
+            self._stop.wait(self.interval)
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def percentile(values: List[float], pct: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def wait_for_app(app_url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("App exited during startup")
+        try:
+            urllib.request.urlopen(f"{app_url}/jobs/ping", timeout=1)
+        except urllib.error.HTTPError:
+            return  # 404 means the app is serving
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("App did not start in time")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument(
+        "--media",
+        nargs="+",
+        default=["progressive"],
+        choices=["progressive", "hls", "dash"],
+    )
+    parser.add_argument("--duration", type=int, default=30)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument(
+        "--env",
+        nargs="*",
+        default=[],
+        help="Extra KEY=VALUE settings for the app, e.g. STREAM_UPLOADS=true",
+    )
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="video-downloader-bench-")
+    media_dir = os.path.join(work_dir, "media")
+    app_dir = os.path.join(work_dir, "app")
+    os.makedirs(app_dir)
+
+    media = generate_media(media_dir, duration=args.duration)
+    media_url = start_media_server(media_dir)
+    s3_url = start_moto_server()
+
+    import boto3
+
+    bucket = "load-test"
+    boto3.client(
+        "s3",
+        endpoint_url=s3_url,
+        region_name="us-east-1",
+        aws_access_key_id="bench",
+        aws_secret_access_key="bench",
+    ).create_bucket(Bucket=bucket)
+
+    port = free_port()
+    app_url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        "PYTHONPATH": REPO_ROOT,
+        "AWS_ENDPOINT_URL": s3_url,
+        "AWS_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "S3_BUCKET_NAME": bucket,
+        "RATELIMIT_ENABLED": "false",
+        # Every job downloads from the one local media host; without this the
+        # per-site limit, not the pipeline, would cap the running jobs
+        "DOMAIN_MAX_CONCURRENCY": str(max(args.concurrency)),
+        **dict(item.split("=", 1) for item in args.env),
+    }
+    # Run from a scratch directory since downloads/ and logs/ are cwd-relative
+    app_process = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "--worker-class", "gevent",
+            "-w", "1", "--bind", f"127.0.0.1:{port}", "app:app",
+        ],
+        cwd=app_dir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )  # fmt: skip
+
+    try:
+        wait_for_app(app_url, app_process)
+        print(
+            f"{'media':>12} {'conc':>5} {'ok':>4} {'p50 s':>7} {'p95 s':>7} "
+            f"{'p99 s':>7} {'req/s':>7} {'MB/s':>7} {'RSS MB':>7} {'disk MB':>8}"
+        )
+        run_id = 0
+        for kind in args.media:
+            if kind not in media:
+                print(f"{kind:>12} skipped, needs ffmpeg to generate")
+                continue
+            media_path = os.path.join(media_dir, media[kind])
+            size = directory_size(os.path.dirname(media_path))
+            if kind == "progressive":
+                size = os.path.getsize(media_path)
+
+            for concurrency in args.concurrency:
+                urls = []
+                for _ in range(concurrency):
+                    run_id += 1
+                    urls.append(f"{media_url}/{media[kind]}?run={run_id}")
+
+                with ResourceSampler(
+                    app_process.pid, os.path.join(app_dir, "downloads")
+                ) as sampler, ThreadPoolExecutor(concurrency) as pool:
+                    start = time.perf_counter()
+                    results = list(
+                        pool.map(lambda u: run_job(app_url, u, args.timeout), urls)
+                    )
+                    wall = time.perf_counter() - start
+
+                ok = [r for r in results if r["success"]]
+                latencies = sorted(r["seconds"] for r in ok) or [0.0]
+                for r in results:
+                    if not r["success"]:
+                        print(f"  failed: {r['error']}")
+                print(
+                    f"{kind:>12} {concurrency:>5} {len(ok):>4} "
+                    f"{percentile(latencies, 50):>7.2f} "
+                    f"{percentile(latencies, 95):>7.2f} "
+                    f"{percentile(latencies, 99):>7.2f} "
+                    f"{len(ok) / wall:>7.2f} "
+                    f"{len(ok) * size / wall / 1e6:>7.1f} "
+                    f"{sampler.peak_rss / 1e6:>7.0f} "
+                    f"{sampler.peak_disk / 1e6:>8.1f}"
+                )
+    finally:
+        app_process.terminate()
+        app_process.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
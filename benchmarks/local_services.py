@@ -0,0 +1,115 @@
+"""
+Local stand-ins used by the benchmarks: an S3-compatible moto server and an
+HTTP server with synthetic media that yt-dlp's generic extractor can consume.
+"""
+
+import functools
+import http.server
+import logging
+import os
+import shutil
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+from typing import Dict
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_moto_server(port: int = 0) -> str:
+    """
+    Start an in-process moto S3 server and return its endpoint URL.
+    """
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    port = port or free_port()
+    server = ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+    return f"http://127.0.0.1:{port}"
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # The generic extractor hangs up after sniffing the first bytes
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_media_server(directory: str) -> str:
+    """
+    Serve directory over HTTP and return its base URL.
+    """
+    server = _ThreadingServer(
+        ("127.0.0.1", 0), functools.partial(_QuietHandler, directory=directory)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def generate_media(
+    directory: str, duration: int = 30, size_mb: int = 20
+) -> Dict[str, str]:
+    """
+    Write synthetic media into directory.
+
+    With ffmpeg available this produces a progressive MP4 plus HLS and DASH
+    renditions of a test pattern. Without ffmpeg only a progressive file of
+    random bytes is written, which the generic extractor still downloads as
+    a direct link.
+
+    :param directory: Output directory
+    :param duration: Length of the generated video in seconds
+    :param size_mb: Size of the random file when ffmpeg is missing
+    :return: Mapping of media kind ("progressive", "hls", "dash") to file path
+    """
+    os.makedirs(directory, exist_ok=True)
+    progressive = os.path.join(directory, "progressive.mp4")
+
+    if not shutil.which("ffmpeg"):
+        print("ffmpeg not found, serving random bytes as progressive.mp4 only")
+        block = os.urandom(1024 * 1024)
+        with open(progressive, "wb") as f:
+            for _ in range(size_mb):
+                f.write(block)
+        return {"progressive": "progressive.mp4"}
+
+    def ffmpeg(*args: str) -> None:
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *args], check=True
+        )
+
+    ffmpeg(
+        "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-b:v", "4M",
+        "-c:a", "aac", "-movflags", "+faststart", progressive,
+    )  # fmt: skip
+    ffmpeg(
+        "-i", progressive, "-c", "copy", "-f", "hls", "-hls_time", "4",
+        "-hls_playlist_type", "vod", os.path.join(directory, "hls.m3u8"),
+    )  # fmt: skip
+    dash_dir = os.path.join(directory, "dash")
+    os.makedirs(dash_dir, exist_ok=True)
+    ffmpeg(
+        "-i", progressive, "-map", "0:v", "-map", "0:a", "-c", "copy",
+        "-f", "dash", "-seg_duration", "4", os.path.join(dash_dir, "manifest.mpd"),
+    )  # fmt: skip
+    return {
+        "progressive": "progressive.mp4",
+        "hls": "hls.m3u8",
+        "dash": "dash/manifest.mpd",
+    }
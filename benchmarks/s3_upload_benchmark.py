@@ -0,0 +1,91 @@
+"""
+Measure S3 upload throughput for different multipart transfer settings.
+
+Runs against a local moto server by default, so no credentials or network
+are needed. Point --endpoint-url at MinIO (or real S3) to measure a real
+object store.
+
+    python -m benchmarks.s3_upload_benchmark --size-mb 512 \
+        --chunksize-mb 8 16 64 --concurrency 1 4 10
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.local_services import start_moto_server  # noqa: E402
+
+
+def make_test_file(size_mb: int) -> str:
+    handle, path = tempfile.mkstemp(suffix=".bin")
+    block = os.urandom(1024 * 1024)
+    with os.fdopen(handle, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--endpoint-url", help="S3 endpoint, defaults to a local moto server"
+    )
+    parser.add_argument("--bucket", default="upload-benchmark")
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--threshold-mb", type=int, default=8)
+    parser.add_argument("--chunksize-mb", type=int, nargs="+", default=[8, 16, 64])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    endpoint_url = args.endpoint_url or start_moto_server()
+    os.environ["AWS_ENDPOINT_URL"] = endpoint_url
+    os.environ["S3_BUCKET_NAME"] = args.bucket
+    os.environ.setdefault("AWS_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+    # Imported after the environment is set since S3_BUCKET_NAME is read at import
+    from utils.get_s3_client import get_s3_client
+    from utils.upload_to_s3 import build_transfer_config
+
+    s3_client = get_s3_client()
+
+    try:
+        s3_client.create_bucket(Bucket=args.bucket)
+    except s3_client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+    file_path = make_test_file(args.size_mb)
+    print(f"Uploading {args.size_mb} MB to {endpoint_url}, best of {args.repeat}")
+    print(f"{'chunk MB':>8} {'threads':>8} {'seconds':>8} {'MB/s':>8}")
+
+    try:
+        for chunksize_mb, concurrency in itertools.product(
+            args.chunksize_mb, args.concurrency
+        ):
+            config = build_transfer_config(args.threshold_mb, chunksize_mb, concurrency)
+            timings = []
+            for run in range(args.repeat):
+                key = f"benchmark/{chunksize_mb}-{concurrency}-{run}"
+                start = time.perf_counter()
+                s3_client.upload_file(file_path, args.bucket, key, Config=config)
+                timings.append(time.perf_counter() - start)
+                s3_client.delete_object(Bucket=args.bucket, Key=key)
+
+            best = min(timings)
+            print(
+                f"{chunksize_mb:>8} {concurrency:>8} {best:>8.2f} "
+                f"{args.size_mb / best:>8.1f}"
+            )
+    finally:
+        os.remove(file_path)
+
+
+if __name__ == "__main__":
+    main()
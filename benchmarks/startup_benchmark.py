@@ -0,0 +1,158 @@
+"""
+Measure how fast the service comes up and what a shared S3 client saves.
+
+Times `import app` in a fresh interpreter, and the time from starting
+Gunicorn (gevent, one worker) to the first served request, over several
+runs. Then compares S3 requests against a local moto server made with a
+new client each time, as cleanup used to, with requests sharing the
+process's pooled client.
+
+    python -m benchmarks.startup_benchmark --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.local_services import free_port, start_moto_server  # noqa: E402
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import app; "
+    "print(time.perf_counter() - start)"
+)
+HEAVY_MODULES = ("yt_dlp", "boto3", "apscheduler")
+
+
+def app_env(extra: Dict[str, str]) -> Dict[str, str]:
+    return {
+        **os.environ,
+        "PYTHONPATH": REPO_ROOT,
+        "RATELIMIT_ENABLED": "false",
+        "RESUME_ON_START": "false",
+        **extra,
+    }
+
+
+def time_import(work_dir: str, env: Dict[str, str]) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=work_dir,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+        text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def loaded_heavy_modules(work_dir: str, env: Dict[str, str]) -> List[str]:
+    snippet = (
+        "import sys, app; "
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=work_dir,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+        text=True,
+    ).stdout
+    return output.split()
+
+
+def time_first_request(
+    work_dir: str, env: Dict[str, str], timeout: float = 60
+) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "--worker-class", "gevent",
+            "-w", "1", "--bind", f"127.0.0.1:{port}", "app:app",
+        ],
+        cwd=work_dir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )  # fmt: skip
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError("App exited during startup")
+            try:
+                urllib.request.urlopen(
+                    f"http://127.0.0.1:{port}/queue/stats", timeout=5
+                ).read()
+                return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("App did not start in time")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def time_s3_requests(make_client: Callable[[], object], requests: int) -> List[float]:
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        make_client().head_bucket(Bucket="startup-benchmark")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--s3-requests", type=int, default=50)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="startup-benchmark-")
+    env = app_env({"LOG_DIR": os.path.join(work_dir, "logs")})
+
+    imports = [time_import(work_dir, env) for _ in range(args.runs)]
+    print(
+        f"import app: median {statistics.median(imports) * 1000:.0f} ms, "
+        f"min {min(imports) * 1000:.0f} ms over {args.runs} runs"
+    )
+    heavy = loaded_heavy_modules(work_dir, env)
+    print(f"heavy modules loaded by import: {', '.join(heavy) or 'none'}")
+
+    firsts = [time_first_request(work_dir, env) for _ in range(args.runs)]
+    print(
+        f"gunicorn start to first response: median "
+        f"{statistics.median(firsts) * 1000:.0f} ms, min {min(firsts) * 1000:.0f} ms"
+    )
+
+    os.environ.update(
+        AWS_ENDPOINT_URL=start_moto_server(),
+        AWS_REGION="us-east-1",
+        AWS_ACCESS_KEY_ID="benchmark",
+        AWS_SECRET_ACCESS_KEY="benchmark",
+    )
+    from utils.get_s3_client import create_s3_client, get_s3_client
+
+    get_s3_client().create_bucket(Bucket="startup-benchmark")
+    print(f"{'s3 client':>10} {'p50 ms':>8} {'mean ms':>8}")
+    for name, make_client in (("new", create_s3_client), ("shared", get_s3_client)):
+        timings = time_s3_requests(make_client, args.s3_requests)
+        print(
+            f"{name:>10} {statistics.median(timings):>8.1f} "
+            f"{statistics.mean(timings):>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Measure URL normalization speed and how well it deduplicates.
+
+Compares the previous sanitizer (one uncompiled re.sub per tracking
+parameter) with the parse-based normalizer, uncached and cached, over a
+corpus of variants of the same videos: short links, mobile hosts, shorts,
+timestamps and share parameters. Reports the time per URL and how many
+distinct keys each produces for the corpus.
+
+    python -m benchmarks.url_benchmark --rounds 20
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.url_sanitizer import sanitize_url, sanitize_urls  # noqa: E402
+
+LEGACY_TRACKING_PARAMS = [
+    "utm_source",
+    "utm_medium",
+    "utm_campaign",
+    "utm_term",
+    "utm_content",
+    "fbclid",
+    "gclid",
+    "msclkid",
+    "dclid",
+    "mc_eid",
+]
+
+VARIANTS = [
+    "youtu.be/{yt}?si=share{n}",
+    "https://m.youtube.com/watch?v={yt}&t={n}",
+    "https://youtube.com/shorts/{yt}?feature=share",
+    "https://www.youtube.com/watch?v={yt}&utm_source=newsletter&utm_medium=email",
+    "https://twitter.com/user{n}/status/17{n:08d}?s=20",
+    "https://mobile.x.com/other/status/17{n:08d}",
+    "https://www.instagram.com/reel/C{n:09d}/?igsh=abc{n}",
+    "https://vimeo.com/{n}?share=copy#t=10",
+    "https://example.com/videos/{n}.mp4?fbclid=IwAR{n}&token=abc",
+]
+
+
+def legacy_sanitize_url(url: str) -> str:
+    if not url.startswith(("http://", "https://")):
+        url = "https://" + url
+    if "://amp." in url:
+        protocol_end = url.find("://") + 3
+        if url[protocol_end:].startswith("amp."):
+            url = url[:protocol_end] + url[protocol_end + 4 :]
+    for param in LEGACY_TRACKING_PARAMS:
+        url = re.sub(rf"[?&]{param}=[^&]*", "", url)
+    url = re.sub(r"[?&]$", "", url)
+    return url.split("#")[0]
+
+
+def build_corpus(videos: int) -> List[str]:
+    corpus = []
+    for n in range(videos):
+        yt = f"vid{n:08d}"
+        corpus.extend(variant.format(yt=yt, n=n) for variant in VARIANTS)
+    return corpus
+
+
+def time_per_url(normalize: Callable[[str], str], corpus: List[str], rounds: int):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for url in corpus:
+            normalize(url)
+        timings.append((time.perf_counter() - start) / len(corpus) * 1e6)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--videos", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.videos)
+    uncached = sanitize_url.__wrapped__
+    print(f"{len(corpus)} URLs, {args.rounds} rounds")
+    print(f"{'normalizer':>10} {'p50 us/url':>11} {'min us/url':>11} {'keys':>6}")
+    for name, normalize in (
+        ("legacy", legacy_sanitize_url),
+        ("parsed", uncached),
+        ("cached", sanitize_url),
+    ):
+        sanitize_url.cache_clear()
+        timings = time_per_url(normalize, corpus, args.rounds)
+        keys = len({normalize(url) for url in corpus})
+        print(
+            f"{name:>10} {statistics.median(timings):>11.2f} "
+            f"{min(timings):>11.2f} {keys:>6}"
+        )
+
+    sanitize_url.cache_clear()
+    start = time.perf_counter()
+    unique = sanitize_urls(corpus, unique=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"sanitize_urls(unique=True): {len(unique)} URLs in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
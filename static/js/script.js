@@ -8,9 +8,83 @@ document.addEventListener('DOMContentLoaded', () => {
 
   socket.on('download_progress', (data) => {
     const statusDiv = document.getElementById('status');
-    statusDiv.textContent = `Download Progress: ${data.percent.toFixed(1)}%`;
+    const label = data.phase === 'upload' ? 'Upload Progress' : 'Download Progress';
+    let details = '';
+    if (data.speed) {
+      details = ` (${(data.speed / 1024 / 1024).toFixed(1)} MB/s`;
+      details += data.eta != null ? `, ETA ${Math.round(data.eta)}s)` : ')';
+    }
+    statusDiv.textContent = `${label}: ${data.percent.toFixed(1)}%${details}`;
   });
 
+  let currentJobId = null;
+  let pollTimer = null;
+  // Set while /download has not answered yet; results pushed meanwhile
+  // (cache hits, coalesced or very short jobs) are kept until it does
+  let awaitingJobId = false;
+  const earlyResults = new Map();
+
+  const showDownloadLink = (downloadUrl) => {
+    const statusDiv = document.getElementById("status");
+    const downloadButton = document.createElement("a");
+    downloadButton.href = downloadUrl;
+    downloadButton.textContent = "Click here to download";
+    downloadButton.className = "download-button";
+
+    statusDiv.innerHTML = ""; // Clear previous status
+    statusDiv.appendChild(downloadButton);
+    statusDiv.className = "";
+  };
+
+  const showError = (message) => {
+    const statusDiv = document.getElementById("status");
+    statusDiv.textContent = message || "Download failed";
+    statusDiv.className = "error";
+  };
+
+  const finishJob = (jobId, downloadUrl, error) => {
+    if (awaitingJobId) {
+      earlyResults.set(jobId, { downloadUrl, error });
+      return;
+    }
+    if (jobId !== currentJobId) {
+      return;
+    }
+    currentJobId = null;
+    clearInterval(pollTimer);
+    document.getElementById("loader").style.display = "none"; // Hide loader
+
+    if (downloadUrl) {
+      showDownloadLink(downloadUrl);
+    } else {
+      showError(error);
+    }
+  };
+
+  socket.on('download_complete', (data) => {
+    finishJob(data.job_id, data.download_url, null);
+  });
+
+  socket.on('download_failed', (data) => {
+    finishJob(data.job_id, null, data.error);
+  });
+
+  // Fallback in case the socket missed the final event (e.g. reconnect)
+  const pollJob = (jobId) => {
+    pollTimer = setInterval(() => {
+      fetch(`/jobs/${jobId}`)
+        .then((response) => response.json())
+        .then((data) => {
+          if (data.status === "finished") {
+            finishJob(jobId, data.download_url, null);
+          } else if (!data.success) {
+            finishJob(jobId, null, data.error);
+          }
+        })
+        .catch((error) => console.error("Job status error:", error));
+    }, 5000);
+  };
+
   const form = document.getElementById('downloadForm');
   form.addEventListener('submit', (event) => {
     event.preventDefault();
@@ -19,9 +93,13 @@ document.addEventListener('DOMContentLoaded', () => {
     const statusDiv = document.getElementById("status");
     const loader = document.getElementById("loader");
 
-    statusDiv.textContent = "Downloading...";
+    statusDiv.textContent = "Queued...";
     statusDiv.className = ""; // Reset class
     loader.style.display = "block"; // Show loader
+    clearInterval(pollTimer);
+    currentJobId = null;
+    awaitingJobId = true;
+    earlyResults.clear();
 
     fetch("/download", {
       method: "POST",
@@ -34,7 +112,6 @@ document.addEventListener('DOMContentLoaded', () => {
       }),
     })
       .then((response) => {
-        loader.style.display = "none"; // Hide loader
         if (!response.ok) {
           return response.json().then((err) => {
             console.error("Detailed error:", err);
@@ -44,24 +121,25 @@ document.addEventListener('DOMContentLoaded', () => {
         return response.json();
       })
       .then((data) => {
-        if (data.success) {
-          const downloadButton = document.createElement("a");
-          downloadButton.href = data.download_url;
-          downloadButton.textContent = "Click here to download";
-          downloadButton.className = "download-button";
-
-          statusDiv.innerHTML = ""; // Clear previous status
-          statusDiv.appendChild(downloadButton);
+        awaitingJobId = false;
+        currentJobId = data.job_id;
+        const early = earlyResults.get(data.job_id);
+        earlyResults.clear();
+        if (data.status === "finished") {
+          finishJob(data.job_id, data.download_url, null);
+        } else if (data.status === "failed") {
+          finishJob(data.job_id, null, data.error);
+        } else if (early) {
+          finishJob(data.job_id, early.downloadUrl, early.error);
         } else {
-          statusDiv.textContent = data.message || "Download failed";
+          pollJob(data.job_id);
         }
-        statusDiv.className = "";
       })
       .catch((error) => {
+        awaitingJobId = false;
         loader.style.display = "none"; // Hide loader
         console.error("Full error:", error);
-        statusDiv.textContent = error.message || "Download failed";
-        statusDiv.className = "error";
+        showError(error.message);
       });
   });
 });
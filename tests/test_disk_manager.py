@@ -0,0 +1,40 @@
+import os
+
+from utils import disk_manager
+from utils.disk_manager import MB, DiskManager
+
+
+def make_session(base_dir, name, size_mb, mtime):
+    path = os.path.join(base_dir, name)
+    os.makedirs(path)
+    with open(os.path.join(path, "video.part"), "wb") as f:
+        f.write(b"x" * size_mb * MB)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_has_space_does_not_walk_downloads(tmp_path, monkeypatch):
+    manager = DiskManager(str(tmp_path), min_free_mb=1)
+
+    def walk(path):
+        raise AssertionError("has_space walked downloads/")
+
+    monkeypatch.setattr(disk_manager, "_dir_size", walk)
+    assert manager.has_space()
+    assert manager.stats()["used_bytes"] == 0
+
+
+def test_enforce_quota_evicts_oldest_and_caches_usage(tmp_path):
+    manager = DiskManager(
+        str(tmp_path), high_watermark_mb=2, low_watermark_mb=2, min_free_mb=0
+    )
+    # Named after a process that is gone, so both are unused
+    oldest = make_session(tmp_path, "4194305_old", 1, 1000)
+    newest = make_session(tmp_path, "4194305_new", 2, 2000)
+
+    assert manager.enforce_quota() == MB
+    assert not os.path.exists(oldest) and os.path.exists(newest)
+    stats = manager.stats()
+    assert stats["used_bytes"] == 2 * MB
+    assert stats["sessions"] == 1
+    assert stats["evicted"] == 1
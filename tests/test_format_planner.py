@@ -0,0 +1,28 @@
+import pytest
+
+from utils.format_planner import parse_format_policy
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"max_height": 1e400},
+        {"max_height": float("nan")},
+        {"max_filesize_mb": float("inf")},
+        {"max_filesize_mb": float("nan")},
+        {"max_filesize_mb": True},
+        {"start": float("nan")},
+        {"end": float("inf")},
+        {"start": -1},
+    ],
+)
+def test_non_finite_and_invalid_values_are_rejected(data):
+    with pytest.raises(ValueError):
+        parse_format_policy(data)
+
+
+def test_valid_policy():
+    policy = parse_format_policy(
+        {"max_height": 720.0, "max_filesize_mb": 1.5, "start": 0, "end": "00:01:30"}
+    )
+    assert policy == {"max_height": 720, "max_filesize_mb": 1.5, "end": 90}
@@ -0,0 +1,46 @@
+import pytest
+
+from utils import progress
+from utils.progress import ProgressThrottle
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(progress.time, "monotonic", lambda: now[0])
+    return now
+
+
+def run(throttle, clock, events):
+    for seconds, percent in events:
+        clock[0] = seconds
+        throttle({"percent": percent})
+
+
+def test_slow_download_reports_every_interval(clock):
+    sent = []
+    throttle = ProgressThrottle(sent.append, min_interval=0.5, min_percent_delta=1)
+    run(throttle, clock, [(0, 0.0), (0.6, 0.1), (1.2, 0.2), (1.3, 0.3)])
+    assert [event["percent"] for event in sent] == [0.0, 0.1, 0.2]
+
+
+def test_fast_download_reports_every_percent_step(clock):
+    sent = []
+    throttle = ProgressThrottle(sent.append, min_interval=0.5, min_percent_delta=1)
+    run(throttle, clock, [(0, 0.0), (0.01, 0.5), (0.02, 1.5), (0.03, 2.6)])
+    assert [event["percent"] for event in sent] == [0.0, 1.5, 2.6]
+
+
+def test_completion_is_always_reported_once(clock):
+    sent = []
+    throttle = ProgressThrottle(sent.append, min_interval=0.5, min_percent_delta=1)
+    run(throttle, clock, [(0, 99.5), (0.01, 100.0), (0.02, 100.0)])
+    assert [event["percent"] for event in sent] == [99.5, 100.0]
+
+
+def test_final_events_are_always_reported(clock):
+    sent = []
+    throttle = ProgressThrottle(sent.append, min_interval=0.5, min_percent_delta=1)
+    throttle({"percent": 50.0})
+    throttle({"percent": 50.0}, final=True)
+    assert len(sent) == 2
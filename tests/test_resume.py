@@ -0,0 +1,43 @@
+import os
+
+from utils.resume import (
+    RESUME_FAILED,
+    RESUME_MAX_ATTEMPTS,
+    RESUME_QUEUED,
+    RESUME_RUNNING,
+    claim_unfinished_downloads,
+    read_manifest,
+    resume_dir_name,
+    write_manifest,
+)
+
+
+def make_working_dir(base_dir, key, **fields):
+    path = os.path.join(base_dir, resume_dir_name(key))
+    os.makedirs(path)
+    write_manifest(path, key=key, url=f"https://example.com/{key}", **fields)
+    return path
+
+
+def test_only_interrupted_downloads_are_claimed(tmp_path):
+    make_working_dir(tmp_path, "running", status=RESUME_RUNNING)
+    make_working_dir(tmp_path, "failed", status=RESUME_FAILED)
+    make_working_dir(
+        tmp_path, "exhausted", status=RESUME_RUNNING, resumes=RESUME_MAX_ATTEMPTS
+    )
+    claimed = claim_unfinished_downloads(tmp_path)
+    assert [manifest["key"] for manifest in claimed] == ["running"]
+    assert claimed[0]["status"] == RESUME_QUEUED
+    assert claimed[0]["resumes"] == 1
+
+
+def test_a_download_is_claimed_by_one_live_process(tmp_path):
+    path = make_working_dir(tmp_path, "running", status=RESUME_RUNNING)
+    assert len(claim_unfinished_downloads(tmp_path)) == 1
+    # A sibling worker scanning afterwards sees it queued by a live process
+    assert claim_unfinished_downloads(tmp_path) == []
+
+    # After a restart the owner is gone, so it is claimed again
+    write_manifest(path, owner_pid=2**22 + 1)
+    assert len(claim_unfinished_downloads(tmp_path)) == 1
+    assert read_manifest(path)["resumes"] == 2
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+from utils.scheduler import PRIORITIES, FairScheduler, priority_value
+
+
+def make_job(job_id, client, created_at, priority=PRIORITIES["normal"]):
+    return {
+        "id": job_id,
+        "url": f"https://example.com/{job_id}",
+        "client_ids": {client},
+        "created_at": created_at,
+        "priority": priority,
+    }
+
+
+def drain(scheduler):
+    order = []
+    while scheduler.qsize():
+        job = scheduler.get()
+        order.append(job["id"])
+        scheduler.done(job)
+    return order
+
+
+def test_clients_take_turns_with_aging():
+    scheduler = FairScheduler(max_size=10, default_limit=10, aging_secs=120)
+    now = time.time()
+    for n in range(5):
+        scheduler.put(make_job(f"a{n}", "A", now + n * 0.001))
+    scheduler.put(make_job("b0", "B", now + 0.005))
+    assert drain(scheduler) == ["a0", "b0", "a1", "a2", "a3", "a4"]
+
+
+def test_aging_lifts_a_starved_job():
+    scheduler = FairScheduler(max_size=10, default_limit=10, aging_secs=60)
+    now = time.time()
+    scheduler.put(make_job("new", "A", now))
+    scheduler.put(make_job("old", "B", now - 130, priority=PRIORITIES["low"]))
+    assert drain(scheduler) == ["old", "new"]
+
+
+def test_a_clients_high_priority_job_overtakes_its_low_ones():
+    scheduler = FairScheduler(max_size=10, default_limit=10, aging_secs=120)
+    now = time.time()
+    scheduler.put(make_job("batch0", "A", now, priority=PRIORITIES["low"]))
+    scheduler.put(make_job("batch1", "A", now + 0.001, priority=PRIORITIES["low"]))
+    scheduler.put(make_job("urgent", "A", now + 0.002, priority=PRIORITIES["high"]))
+    assert drain(scheduler) == ["urgent", "batch0", "batch1"]
+
+
+@pytest.mark.parametrize("name", ["urgent", ["high"], {"high": 1}, None, 2])
+def test_unknown_priorities_are_rejected(name):
+    with pytest.raises(ValueError):
+        priority_value(name)
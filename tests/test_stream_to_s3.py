@@ -0,0 +1,72 @@
+import functools
+import http.server
+import os
+import threading
+
+import pytest
+from moto import mock_aws
+
+from utils import get_s3_client, stream_to_s3, video_downloader
+from utils.stream_to_s3 import FileTooLargeError, MultipartUploadWriter
+
+BUCKET = "test-bucket"
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setenv("AWS_REGION", "us-east-1")
+    monkeypatch.delenv("AWS_ENDPOINT_URL", raising=False)
+    monkeypatch.setattr(stream_to_s3, "S3_BUCKET_NAME", BUCKET)
+    with mock_aws():
+        monkeypatch.setattr(get_s3_client, "_client", None)
+        client = get_s3_client.get_s3_client()
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+    get_s3_client._client = None
+
+
+@pytest.fixture
+def media_url(tmp_path):
+    with open(tmp_path / "video.mp4", "wb") as f:
+        f.write(os.urandom(3 * MB))
+    handler = functools.partial(
+        http.server.SimpleHTTPRequestHandler, directory=str(tmp_path)
+    )
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/video.mp4"
+    server.shutdown()
+
+
+def assert_nothing_stored(s3):
+    assert s3.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
+    assert not s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+
+
+def test_writer_aborts_past_max_bytes(s3):
+    with pytest.raises(FileTooLargeError):
+        with MultipartUploadWriter("video.mp4", max_bytes=MB) as writer:
+            writer.write(b"x" * MB)
+            writer.write(b"x")
+    assert_nothing_stored(s3)
+
+
+def test_streamed_download_respects_max_filesize(s3, media_url, tmp_path, monkeypatch):
+    monkeypatch.setattr(video_downloader, "STREAM_UPLOADS", True)
+    monkeypatch.setattr(video_downloader, "DELIVERY_BACKEND", "s3")
+
+    result = video_downloader.run_download_task(
+        media_url,
+        output_dir=str(tmp_path / "downloads"),
+        policy={"max_filesize_mb": 1},
+    )
+
+    assert not result["success"]
+    # Stopped while streaming, without falling back to a download to disk
+    assert result["error_phase"] == "stream"
+    assert "size limit" in result["error"]
+    assert_nothing_stored(s3)
@@ -0,0 +1,61 @@
+import pytest
+
+from utils.url_sanitizer import sanitize_url, sanitize_urls
+
+YOUTUBE = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "youtu.be/dQw4w9WgXcQ?si=share",
+        "https://m.youtube.com/watch?v=dQw4w9WgXcQ&t=5",
+        "https://youtube.com/shorts/dQw4w9WgXcQ?feature=share",
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ&utm_source=mail#t=10",
+    ],
+)
+def test_youtube_variants_share_one_url(url):
+    assert sanitize_url(url) == YOUTUBE
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://example.com/a?utm_x=1&v=2#frag", "https://example.com/a?v=2"),
+        ("https://AMP.Example.com:443/p?fbclid=1", "https://example.com/p"),
+        (
+            "http://cdn.test/v.mp4?sig=a%2Fb&utm_source=x",
+            "http://cdn.test/v.mp4?sig=a%2Fb",
+        ),
+        ("https://twitter.com/user/status/123?s=20", "https://x.com/i/status/123"),
+        (
+            "https://x.com/user/status/123/video/2",
+            "https://x.com/i/status/123/video/2",
+        ),
+        ("https://player.vimeo.com/video/123?h=ff1", "https://vimeo.com/123/ff1"),
+        (
+            "https://vimeo.com/123/0a1b2c3d4e?share=copy",
+            "https://vimeo.com/123/0a1b2c3d4e",
+        ),
+        # Not a video page, left as it is
+        ("https://vimeo.com/123/likes", "https://vimeo.com/123/likes"),
+        (
+            "https://m.facebook.com/photo.php?fbid=111&mibextid=x",
+            "https://www.facebook.com/photo.php?fbid=111",
+        ),
+    ],
+)
+def test_canonical_urls(url, expected):
+    assert sanitize_url(url) == expected
+
+
+def test_distinct_facebook_ids_stay_distinct():
+    first = sanitize_url("https://www.facebook.com/photo.php?fbid=111")
+    second = sanitize_url("https://www.facebook.com/photo.php?fbid=222")
+    assert first != second
+
+
+def test_sanitize_urls_keeps_order_and_drops_duplicates():
+    urls = ["youtu.be/dQw4w9WgXcQ", "https://example.com/a", YOUTUBE]
+    assert sanitize_urls(urls) == [YOUTUBE, "https://example.com/a", YOUTUBE]
+    assert sanitize_urls(urls, unique=True) == [YOUTUBE, "https://example.com/a"]
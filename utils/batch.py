@@ -0,0 +1,322 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.job_queue import JOB_FAILED, JOB_FINISHED, QueueFullError
+from utils.job_store import JOB_RESULT_TTL_SECS
+from utils.progress import ProgressThrottle
+
+logger = logging.getLogger(__name__)
+
+# Entries taken from one batch, including expanded playlists
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "200"))
+# Items of one batch downloading at the same time (requests may ask for fewer)
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+# Batch items queued or running at the same time on this node, across all
+# batches, so single /download requests keep getting workers
+BATCH_GLOBAL_CONCURRENCY = int(os.environ.get("BATCH_GLOBAL_CONCURRENCY", "8"))
+# How often a batch polls its items, for jobs that run on another node
+BATCH_POLL_SECS = float(os.environ.get("BATCH_POLL_SECS", "2"))
+
+BATCH_DELIVERIES = ("items", "zip")
+
+BATCH_QUEUED = "queued"
+BATCH_EXPANDING = "expanding"
+BATCH_RUNNING = "running"
+BATCH_PACKAGING = "packaging"
+BATCH_FINISHED = "finished"
+BATCH_FAILED = "failed"
+
+ITEM_PENDING = "pending"
+ITEM_RUNNING = "running"
+
+# Share of an item's progress each phase covers
+PHASE_WEIGHTS = {"download": (0.0, 0.9), "upload": (0.9, 0.1)}
+
+
+class BatchManager:
+    def __init__(
+        self,
+        submit: Callable[[str, Dict[str, Any]], Dict[str, Any]],
+        get_job: Callable[[str], Optional[Dict[str, Any]]],
+        expand: Callable[[str, int], List[str]],
+        notify: Callable[[Dict[str, Any], str, Dict[str, Any]], None],
+        package: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        global_concurrency: int = BATCH_GLOBAL_CONCURRENCY,
+    ):
+        """
+        Run batches of downloads through the job queue.
+
+        Every item is submitted as a regular download job, so items share
+        the dedup, result cache, disk and worker limits of single downloads.
+        A batch keeps at most its concurrency of items in the queue, and all
+        batches together at most global_concurrency. Batches live in this
+        process; their items may run wherever the job queue runs them.
+
+        :param submit: Queues a download of (url, batch), returns the job
+        :param get_job: Looks up a job by id
+        :param expand: Lists the video URLs of (url, limit), raises on failure
+        :param notify: Receives (batch, event, data) for progress and completion
+        :param package: Builds the batch's ZIP, returns fields to add to it
+        :param global_concurrency: Items in flight across all batches
+        """
+        self.submit = submit
+        self.get_job = get_job
+        self.expand = expand
+        self.notify = notify
+        self.package = package
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self._slots = threading.BoundedSemaphore(max(1, global_concurrency))
+        # Job id -> items waiting on it; two batches may share a job
+        self._items_by_job: Dict[str, List[Dict[str, Any]]] = {}
+        self._throttles: Dict[str, ProgressThrottle] = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def create(
+        self,
+        client_id: str,
+        urls: Optional[List[str]] = None,
+        playlist_url: Optional[str] = None,
+        policy: Optional[Dict[str, Any]] = None,
+        delivery: str = "items",
+        concurrency: int = BATCH_CONCURRENCY,
+        priority: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Start a batch in the background and return its record.
+
+        :param client_id: Client receiving the batch's progress events
+        :param urls: Video URLs to download
+        :param playlist_url: Playlist whose entries are downloaded instead
+        :param policy: Format policy applied to every item
+        :param delivery: "items" for one S3 object per item, "zip" for one archive
+        :param concurrency: Items of this batch downloading at the same time
+        :param priority: Scheduling priority of the items, see utils.scheduler
+        :return: The batch record
+        """
+        batch = {
+            "id": uuid.uuid4().hex,
+            "client_id": client_id,
+            "status": BATCH_QUEUED,
+            "playlist_url": playlist_url,
+            "policy": policy,
+            "delivery": delivery,
+            "concurrency": max(1, min(concurrency, BATCH_CONCURRENCY)),
+            "priority": priority,
+            "items": [self._new_item(url) for url in (urls or [])[:BATCH_MAX_ITEMS]],
+            "created_at": time.time(),
+            "finished_at": None,
+            "error": None,
+        }
+        with self._lock:
+            self._prune()
+            self.batches[batch["id"]] = batch
+            self._throttles[batch["id"]] = ProgressThrottle(
+                lambda data: self.notify(batch, "batch_progress", data)
+            )
+        threading.Thread(
+            target=self._run, args=(batch,), name=f"batch-{batch['id']}", daemon=True
+        ).start()
+        return batch
+
+    def get(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.batches.get(batch_id)
+
+    def job_finished(self, job: Dict[str, Any]) -> None:
+        """
+        Wake the batches waiting on a job; called from the queue's on_complete.
+        """
+        with self._changed:
+            if job["id"] in self._items_by_job:
+                self._changed.notify_all()
+
+    def job_progress(self, job_id: str, data: Dict[str, Any]) -> None:
+        """
+        Fold a job's progress event into the progress of its batches.
+
+        :param job_id: Job the event belongs to
+        :param data: Event with "phase" and "percent"
+        """
+        offset, weight = PHASE_WEIGHTS.get(data.get("phase"), PHASE_WEIGHTS["download"])
+        with self._lock:
+            items = list(self._items_by_job.get(job_id, ()))
+            for item in items:
+                item["percent"] = (offset + weight * data["percent"] / 100) * 100
+        for batch_id in {item["batch_id"] for item in items}:
+            batch = self.get(batch_id)
+            if batch:
+                self._emit_progress(batch)
+
+    def _run(self, batch: Dict[str, Any]) -> None:
+        try:
+            if batch["playlist_url"]:
+                batch["status"] = BATCH_EXPANDING
+                urls = self.expand(batch["playlist_url"], BATCH_MAX_ITEMS)
+                batch["items"] = [self._new_item(url) for url in urls[:BATCH_MAX_ITEMS]]
+            for item in batch["items"]:
+                item["batch_id"] = batch["id"]
+            if not batch["items"]:
+                raise ValueError("The batch has no videos to download")
+
+            batch["status"] = BATCH_RUNNING
+            self._run_items(batch)
+
+            succeeded = [i for i in batch["items"] if i["status"] == JOB_FINISHED]
+            if batch["delivery"] == "zip" and succeeded and self.package:
+                batch["status"] = BATCH_PACKAGING
+                batch.update(self.package(batch))
+            batch["status"] = BATCH_FINISHED if succeeded else BATCH_FAILED
+            if not succeeded:
+                batch["error"] = "No video of the batch could be downloaded"
+        except Exception as e:
+            logger.exception(f"Batch {batch['id']} failed")
+            batch["status"] = BATCH_FAILED
+            batch["error"] = str(e)
+        batch["finished_at"] = time.time()
+        with self._lock:
+            self._throttles.pop(batch["id"], None)
+        self.notify(batch, "batch_complete", batch_status(batch))
+
+    def _run_items(self, batch: Dict[str, Any]) -> None:
+        pending = list(batch["items"])
+        active: List[Dict[str, Any]] = []
+        while pending or active:
+            while pending and len(active) < batch["concurrency"]:
+                if not self._slots.acquire(blocking=False):
+                    break
+                item = pending[0]
+                try:
+                    job = self.submit(item["url"], batch)
+                except QueueFullError:
+                    self._slots.release()
+                    break
+                except Exception as e:
+                    self._slots.release()
+                    pending.pop(0)
+                    self._finish_item(item, JOB_FAILED, error=str(e))
+                    continue
+                pending.pop(0)
+                item["job_id"] = job["id"]
+                item["status"] = ITEM_RUNNING
+                with self._lock:
+                    self._items_by_job.setdefault(job["id"], []).append(item)
+                active.append(item)
+
+            with self._changed:
+                self._changed.wait(timeout=BATCH_POLL_SECS)
+
+            # Jobs attached to from another node finish there, so the store
+            # is polled rather than relying on on_complete alone
+            for item in list(active):
+                job = self.get_job(item["job_id"])
+                if job and job["status"] not in (JOB_FINISHED, JOB_FAILED):
+                    continue
+                active.remove(item)
+                with self._lock:
+                    items = self._items_by_job.get(item["job_id"], [])
+                    if item in items:
+                        items.remove(item)
+                    if not items:
+                        self._items_by_job.pop(item["job_id"], None)
+                self._slots.release()
+                if job is None:
+                    self._finish_item(item, JOB_FAILED, error="Job expired")
+                elif job["status"] == JOB_FINISHED:
+                    self._finish_item(
+                        item,
+                        JOB_FINISHED,
+                        download_url=job["result"].get("download_url"),
+                        object_name=job["result"].get("object_name"),
+                    )
+                else:
+                    self._finish_item(item, JOB_FAILED, error=job["error"])
+            self._emit_progress(batch)
+
+    @staticmethod
+    def _finish_item(item: Dict[str, Any], status: str, **fields: Any) -> None:
+        item.update(fields)
+        item["status"] = status
+        item["percent"] = 100.0
+
+    def _emit_progress(self, batch: Dict[str, Any]) -> None:
+        with self._lock:
+            throttle = self._throttles.get(batch["id"])
+        if throttle:
+            throttle(batch_progress(batch))
+
+    @staticmethod
+    def _new_item(url: str) -> Dict[str, Any]:
+        return {
+            "url": url,
+            "job_id": None,
+            "status": ITEM_PENDING,
+            "percent": 0.0,
+            "download_url": None,
+            "object_name": None,
+            "error": None,
+        }
+
+    def _prune(self) -> None:
+        # Caller holds self._lock
+        cutoff = time.time() - JOB_RESULT_TTL_SECS
+        for batch_id, batch in list(self.batches.items()):
+            if batch["finished_at"] and batch["finished_at"] < cutoff:
+                del self.batches[batch_id]
+
+
+def batch_progress(batch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the aggregated progress event of a batch.
+
+    :param batch: Batch record
+    :return: Overall percent and per-status item counts
+    """
+    items = batch["items"]
+    counts = {status: 0 for status in (JOB_FINISHED, JOB_FAILED, ITEM_RUNNING)}
+    for item in items:
+        if item["status"] in counts:
+            counts[item["status"]] += 1
+    return {
+        "batch_id": batch["id"],
+        "status": batch["status"],
+        "percent": sum(item["percent"] for item in items) / len(items) if items else 0,
+        "total": len(items),
+        "completed": counts[JOB_FINISHED],
+        "failed": counts[JOB_FAILED],
+        "running": counts[ITEM_RUNNING],
+    }
+
+
+def batch_status(batch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the public view of a batch record for API responses.
+
+    :param batch: Batch record
+    :return: Dictionary safe to return as JSON
+    """
+    status = {
+        **batch_progress(batch),
+        "delivery": batch["delivery"],
+        "created_at": batch["created_at"],
+        "finished_at": batch["finished_at"],
+        "items": [
+            {
+                "url": item["url"],
+                "job_id": item["job_id"],
+                "status": item["status"],
+                "download_url": item["download_url"],
+                "error": item["error"],
+            }
+            for item in batch["items"]
+        ],
+    }
+    if batch.get("zip_url"):
+        status["zip_url"] = batch["zip_url"]
+    if batch["error"]:
+        status["error"] = batch["error"]
+    return status
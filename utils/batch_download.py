@@ -0,0 +1,75 @@
+"""
+Download a list of videos or playlists into a local directory.
+
+Playlists are expanded into their entries and every video is downloaded
+with download_video() in its own worker process, a few at a time.
+
+    python -m utils.batch_download URL [URL ...] --output-dir downloads --concurrency 4
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List
+
+from utils.batch import BATCH_CONCURRENCY, BATCH_MAX_ITEMS
+from utils.url_sanitizer import sanitize_url
+from utils.video_downloader import download_video, run_expand_task
+
+
+def expand_urls(urls: List[str], limit: int) -> List[str]:
+    """
+    Replace playlist URLs by the URLs of their entries.
+
+    :param urls: Video or playlist URLs
+    :param limit: Maximum number of videos in total
+    :return: Video URLs, in order and without duplicates
+    """
+    videos: List[str] = []
+    for url in urls:
+        result = run_expand_task(sanitize_url(url), limit)
+        if not result["success"]:
+            print(f"Skipping {url}: {result.get('error')}", file=sys.stderr)
+            continue
+        for entry in result["urls"]:
+            entry = sanitize_url(entry)
+            if entry not in videos:
+                videos.append(entry)
+    return videos[:limit]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("urls", nargs="+", help="Video or playlist URLs")
+    parser.add_argument("--output-dir", default=os.path.join(os.getcwd(), "downloads"))
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--max-items", type=int, default=BATCH_MAX_ITEMS)
+    args = parser.parse_args()
+
+    videos = expand_urls(args.urls, args.max_items)
+    print(f"Downloading {len(videos)} videos into {args.output_dir}")
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+        futures = {
+            executor.submit(download_video, url, args.output_dir): url for url in videos
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            url = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            if result["success"]:
+                print(f"[{done}/{len(videos)}] {url} -> {result['filename']}")
+            else:
+                failed += 1
+                print(f"[{done}/{len(videos)}] {url} failed: {result.get('error')}")
+
+    print(f"{len(videos) - failed} downloaded, {failed} failed")
+    return 1 if failed or not videos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
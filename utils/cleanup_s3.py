@@ -1,44 +1,123 @@
-from datetime import datetime, timezone
-from apscheduler.schedulers.background import BackgroundScheduler
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List
+import logging
 import os
 from utils.get_s3_client import get_s3_client
+from utils.metrics import record_cleanup
+from utils.s3_layout import (
+    MAX_FILE_AGE_MINS,
+    S3_TIME_BUCKET_MINS,
+    S3_TIME_BUCKET_ROOT,
+    time_bucket_end,
+)
+
+logger = logging.getLogger(__name__)
 
 S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME")
 
-def cleanup_old_files():
-    s3_client = get_s3_client()
+# delete_objects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
 
-    try:
-        objects = s3_client.list_objects_v2(Bucket=S3_BUCKET_NAME)
 
-        if "Contents" not in objects:
-            print("No objects found in bucket")
-            return
+def _list_pages(s3_client, **kwargs) -> Iterator[dict]:
+    paginator = s3_client.get_paginator("list_objects_v2")
+    return iter(paginator.paginate(Bucket=S3_BUCKET_NAME, **kwargs))
+
+
+def _delete_batch(s3_client, objects: List[dict], stats: Dict[str, int]) -> None:
+    """
+    Delete up to DELETE_BATCH_SIZE objects in one request and update stats.
+
+    :param objects: Entries from a list_objects_v2 page
+    :param stats: Running totals with "deleted", "bytes" and "errors"
+    """
+    if not objects:
+        return
+    response = s3_client.delete_objects(
+        Bucket=S3_BUCKET_NAME,
+        Delete={"Objects": [{"Key": obj["Key"]} for obj in objects], "Quiet": True},
+    )
+    failed = {error["Key"] for error in response.get("Errors", [])}
+    for error in response.get("Errors", []):
+        logger.error(f"Error deleting {error['Key']}: {error.get('Message')}")
+    for obj in objects:
+        if obj["Key"] not in failed:
+            stats["deleted"] += 1
+            stats["bytes"] += obj.get("Size", 0)
+    stats["errors"] += len(failed)
 
-        current_time = datetime.now(timezone.utc)
-        deleted_count = 0
 
-        for obj in objects["Contents"]:
-            age = (current_time - obj["LastModified"]).total_seconds() / 60
+def _delete_expired(
+    s3_client, pages: Iterator[dict], cutoff: datetime, stats: Dict[str, int]
+) -> None:
+    """
+    Delete every listed object last modified before cutoff, in batches.
+    """
+    batch: List[dict] = []
+    for page in pages:
+        for obj in page.get("Contents", []):
+            if obj["LastModified"] < cutoff:
+                batch.append(obj)
+            if len(batch) == DELETE_BATCH_SIZE:
+                _delete_batch(s3_client, batch, stats)
+                batch = []
+    _delete_batch(s3_client, batch, stats)
 
-            MAX_FILE_AGE_MINS = int(os.getenv("MAX_FILE_AGE_MINS"))
 
-            if age > MAX_FILE_AGE_MINS:
-                try:
-                    s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=obj["Key"])
-                    deleted_count += 1
-                    print(f"Deleted {obj['Key']} (age: {age:.2f} mins)")
-                except Exception as e:
-                    print(f"Error deleting {obj['Key']}: {str(e)}")
+def cleanup_old_files() -> Dict[str, int]:
+    """
+    Delete uploads older than MAX_FILE_AGE_MINS.
 
-        if deleted_count > 0:
-            print(f"Cleanup completed. Deleted {deleted_count} files.")
+    Without time buckets the whole bucket is listed. With S3_TIME_BUCKET_MINS
+    set, only top-level (pre-bucketing) objects and the prefixes of buckets
+    that ended before the cutoff are listed, so the cost of a run follows
+    what expired rather than the size of the bucket.
+
+    :return: Number of objects deleted, bytes reclaimed and failed deletes
+    """
+    s3_client = get_s3_client()
+    stats = {"deleted": 0, "bytes": 0, "errors": 0}
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=MAX_FILE_AGE_MINS)
+
+    try:
+        if S3_TIME_BUCKET_MINS <= 0:
+            _delete_expired(s3_client, _list_pages(s3_client), cutoff, stats)
+        else:
+            # Objects uploaded before bucketing was enabled sit at the top level
+            _delete_expired(
+                s3_client, _list_pages(s3_client, Delimiter="/"), cutoff, stats
+            )
+            for page in _list_pages(
+                s3_client, Prefix=S3_TIME_BUCKET_ROOT, Delimiter="/"
+            ):
+                for common_prefix in page.get("CommonPrefixes", []):
+                    prefix = common_prefix["Prefix"]
+                    end = time_bucket_end(prefix, S3_TIME_BUCKET_MINS)
+                    if end is not None and end <= cutoff:
+                        _delete_expired(
+                            s3_client,
+                            _list_pages(s3_client, Prefix=prefix),
+                            cutoff,
+                            stats,
+                        )
 
     except Exception as e:
-        print(f"Error during cleanup: {str(e)}")
+        stats["errors"] += 1
+        logger.error(f"Error during cleanup: {str(e)}")
+
+    record_cleanup(stats["deleted"], stats["bytes"])
+    if stats["deleted"] > 0 or stats["errors"] > 0:
+        logger.info(
+            f"Cleanup completed. Deleted {stats['deleted']} files, "
+            f"reclaimed {stats['bytes'] / 2**20:.1f} MB, {stats['errors']} errors."
+        )
+    return stats
 
 
 def init_cleanup_scheduler():
+    # Only imported when cleanup is enabled
+    from apscheduler.schedulers.background import BackgroundScheduler
+
     scheduler = BackgroundScheduler()
     scheduler.add_job(
         cleanup_old_files,
@@ -47,5 +126,5 @@ def init_cleanup_scheduler():
         id="cleanup_s3_files",
     )
     scheduler.start()
-    print("S3 cleanup scheduler initialized")
+    logger.info("S3 cleanup scheduler initialized")
     return scheduler
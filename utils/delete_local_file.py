@@ -1,5 +1,8 @@
+import logging
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
 
 def delete_local_file(download_directory: str) -> Optional[str]:
     """
@@ -15,11 +18,11 @@ def delete_local_file(download_directory: str) -> Optional[str]:
             import shutil
 
             shutil.rmtree(download_directory)
-            print(f"Successfully deleted directory: {download_directory}")
+            logger.info(f"Successfully deleted directory: {download_directory}")
             return None
         else:
             return f"Directory not found: {download_directory}"
     except Exception as e:
         error_msg = f"Failed to delete directory {download_directory}: {str(e)}"
-        print(error_msg)
+        logger.error(error_msg)
         return error_msg
@@ -0,0 +1,300 @@
+import fcntl
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from utils.resume import (
+    DOWNLOAD_RESUME_TTL_SECS,
+    LOCK_NAME,
+    RESUME_DONE,
+    is_resume_dir,
+    pid_alive,
+    read_manifest,
+    resume_dir_name,
+)
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+DOWNLOADS_DIR = os.environ.get("DOWNLOADS_DIR") or os.path.join(
+    os.getcwd(), "downloads"
+)
+# Once downloads/ holds more than the high watermark, the oldest unused
+# session directories are deleted until it is back under the low watermark.
+DISK_QUOTA_HIGH_MB = int(os.environ.get("DISK_QUOTA_HIGH_MB", "20480"))
+DISK_QUOTA_LOW_MB = int(os.environ.get("DISK_QUOTA_LOW_MB", "16384"))
+# New downloads are refused while the disk has less free space than this
+DISK_MIN_FREE_MB = int(os.environ.get("DISK_MIN_FREE_MB", "1024"))
+# How long a queued job waits for space before it fails
+DISK_WAIT_SECS = float(os.environ.get("DISK_WAIT_SECS", "60"))
+# How often a background thread measures downloads/ and evicts; requests
+# only check the disk's free space and the last measurement
+DISK_SCAN_INTERVAL_SECS = float(os.environ.get("DISK_SCAN_INTERVAL_SECS", "30"))
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class DiskManager:
+    def __init__(
+        self,
+        base_dir: str = DOWNLOADS_DIR,
+        high_watermark_mb: int = DISK_QUOTA_HIGH_MB,
+        low_watermark_mb: int = DISK_QUOTA_LOW_MB,
+        min_free_mb: int = DISK_MIN_FREE_MB,
+    ):
+        """
+        Own the session directories downloads are written to.
+
+        Each session directory is named after the process that created it,
+        so several Gunicorn workers can share base_dir: a directory is only
+        evicted or treated as orphaned when it is not in use by this process
+        and its owner is no longer running. Resumable working directories
+        are named after their download instead and are locked with flock
+        while in use; they outlive failures and restarts until they expire.
+
+        :param base_dir: Directory holding the session directories
+        :param high_watermark_mb: Usage that triggers eviction
+        :param low_watermark_mb: Usage eviction brings base_dir back under
+        :param min_free_mb: Free disk space required to start a download
+        """
+        self.base_dir = base_dir
+        self.high_watermark = high_watermark_mb * MB
+        self.low_watermark = min(low_watermark_mb, high_watermark_mb) * MB
+        self.min_free = min_free_mb * MB
+        self.evicted = 0
+        # Last measurement of base_dir, see enforce_quota
+        self.used_bytes = 0
+        self.session_count = 0
+        self._active = set()
+        self._dir_locks: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        os.makedirs(base_dir, exist_ok=True)
+
+    def start_monitor(self, interval: float = DISK_SCAN_INTERVAL_SECS) -> None:
+        """
+        Measure base_dir and evict over quota in a background thread.
+
+        Walking base_dir stats every file in it, so it is kept off the
+        request path; has_space wakes the thread early when space runs low.
+
+        :param interval: Seconds between two measurements
+        """
+        threading.Thread(
+            target=self._monitor, args=(interval,), name="disk-monitor", daemon=True
+        ).start()
+
+    @contextmanager
+    def session(self, resume_key: Optional[str] = None) -> Iterator[str]:
+        """
+        Create a session directory and delete it when the block exits.
+
+        Without resume_key the directory is removed whether the download
+        succeeded or failed. With it, the working directory of that download
+        is reused, and only removed once its manifest is marked done, so a
+        failed download continues where it stopped next time. If another
+        process is using that directory, a plain session is used instead.
+
+        :param resume_key: Optional key of a resumable download
+        :return: Path of the session directory
+        """
+        path = self._open_resume_dir(resume_key) if resume_key else None
+        resumable = path is not None
+        if not resumable:
+            path = os.path.join(self.base_dir, f"{os.getpid()}_{uuid4().hex[:8]}")
+            os.makedirs(path)
+        with self._lock:
+            self._active.add(path)
+        try:
+            yield path
+        finally:
+            with self._lock:
+                self._active.discard(path)
+                lock_fd = self._dir_locks.pop(path, None)
+            manifest = read_manifest(path) if resumable else None
+            if not resumable or not manifest or manifest.get("status") == RESUME_DONE:
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                logger.info(f"Keeping {path} to resume the download later")
+            if lock_fd is not None:
+                os.close(lock_fd)
+
+    def free_bytes(self) -> int:
+        return shutil.disk_usage(self.base_dir).free
+
+    def has_space(self) -> bool:
+        """
+        Report whether a download may start, without walking base_dir.
+
+        Asks the monitor thread to evict when space is short.
+        """
+        free = self.free_bytes()
+        if free < self.min_free or self.used_bytes > self.high_watermark:
+            self._wake.set()
+        return free >= self.min_free
+
+    def wait_for_space(self, timeout: float = DISK_WAIT_SECS) -> bool:
+        """
+        Block until a download may start or timeout seconds have passed.
+
+        :return: True if there is enough free space
+        """
+        deadline = time.monotonic() + timeout
+        while not self.has_space():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(1)
+        return True
+
+    def enforce_quota(self) -> int:
+        """
+        Delete the oldest unused session directories while base_dir is over
+        the high watermark or the disk is short of free space.
+
+        Runs on the monitor thread; the walk happens without holding the
+        lock, so sessions can open and close meanwhile.
+
+        :return: Bytes freed
+        """
+        sessions = self._scan()
+        used = sum(size for _, _, size in sessions)
+        free = self.free_bytes()
+        freed = 0
+        remaining = len(sessions)
+        with self._lock:
+            if used > self.high_watermark or free < self.min_free:
+                for _, path, size in sorted(sessions):
+                    if used <= self.low_watermark and free >= self.min_free:
+                        break
+                    # Checked under the lock, a session may have opened it
+                    if not self._is_evictable(path):
+                        continue
+                    shutil.rmtree(path, ignore_errors=True)
+                    used -= size
+                    free += size
+                    freed += size
+                    self.evicted += 1
+                    remaining -= 1
+                    logger.info(f"Evicted {path} ({size // MB} MB)")
+            self.used_bytes = used
+            self.session_count = remaining
+        return freed
+
+    def remove_orphans(self) -> int:
+        """
+        Delete session directories whose owning process is gone, e.g. left
+        behind by a crash or restart, and resumable working directories
+        that expired.
+
+        :return: Number of directories removed
+        """
+        removed = 0
+        cutoff = time.time() - DOWNLOAD_RESUME_TTL_SECS
+        with self._lock:
+            for mtime, path, _ in self._scan(with_size=False):
+                if is_resume_dir(path) and mtime >= cutoff:
+                    continue
+                if self._is_evictable(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+        if removed:
+            logger.info(f"Removed {removed} orphaned download directories")
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the disk figures, base_dir's as of the monitor's last pass.
+        """
+        with self._lock:
+            return {
+                "used_bytes": self.used_bytes,
+                "free_bytes": self.free_bytes(),
+                "sessions": self.session_count,
+                "active": len(self._active),
+                "evicted": self.evicted,
+            }
+
+    def _monitor(self, interval: float) -> None:
+        while True:
+            try:
+                self.enforce_quota()
+            except Exception:
+                logger.exception("Failed to enforce the disk quota")
+            self._wake.wait(interval)
+            self._wake.clear()
+
+    def _scan(self, with_size: bool = True) -> List[Tuple[float, str, int]]:
+        sessions = []
+        for entry in os.scandir(self.base_dir):
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            sessions.append(
+                (
+                    mtime,
+                    entry.path,
+                    _dir_size(entry.path) if with_size else 0,
+                )
+            )
+        return sessions
+
+    def _open_resume_dir(self, resume_key: str) -> Optional[str]:
+        path = os.path.join(self.base_dir, resume_dir_name(resume_key))
+        os.makedirs(path, exist_ok=True)
+        fd = os.open(os.path.join(path, LOCK_NAME), os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        # Keeps the directory from looking stale while it is being resumed
+        os.utime(path)
+        with self._lock:
+            self._dir_locks[path] = fd
+        return path
+
+    def _is_evictable(self, path: str) -> bool:
+        if path in self._active:
+            return False
+        if is_resume_dir(path):
+            return not self._locked_elsewhere(path)
+        pid = self._owner_pid(path)
+        return pid is None or pid == os.getpid() or not pid_alive(pid)
+
+    @staticmethod
+    def _locked_elsewhere(path: str) -> bool:
+        try:
+            fd = os.open(os.path.join(path, LOCK_NAME), os.O_RDWR)
+        except OSError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return False
+        except OSError:
+            return True
+        finally:
+            # Closing also drops the probe's lock
+            os.close(fd)
+
+    @staticmethod
+    def _owner_pid(path: str) -> Optional[int]:
+        prefix = os.path.basename(path).split("_", 1)[0]
+        return int(prefix) if prefix.isdigit() else None
@@ -0,0 +1,91 @@
+"""
+Worker process running yt-dlp jobs for DownloadProcessPool.
+
+Reads one JSON task per line from stdin and answers on the original stdout
+with JSON lines: any number of {"type": "progress", "data": ...} messages
+followed by one {"type": "result", "result": ..., "max_rss": ...}.
+"""
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+
+
+def max_rss_bytes() -> int:
+    """
+    Return the peak resident set size of this process in bytes.
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def main() -> None:
+    # yt-dlp and the downloader print to stdout, so keep the real stdout for
+    # the protocol and send everything else to stderr.
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    from utils.log_config import LOG_LEVEL, make_formatter
+
+    # Records carry the pid, so the worker's lines can be told apart
+    handler = logging.StreamHandler()
+    handler.setFormatter(make_formatter())
+    logging.basicConfig(level=LOG_LEVEL, handlers=[handler])
+
+    from yt_dlp import ImpersonateTarget
+
+    from utils.video_downloader import (
+        run_download_task,
+        run_expand_task,
+        run_info_task,
+    )
+
+    write_lock = threading.Lock()
+
+    def send(message) -> None:
+        with write_lock:
+            protocol.write(json.dumps(message, default=str) + "\n")
+
+    def send_progress(data) -> None:
+        send({"type": "progress", "data": data})
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        task = json.loads(line)
+        # The web process ranks the targets, since it learns from every result
+        targets = [
+            ImpersonateTarget.from_str(target)
+            for target in task.get("impersonate_targets") or []
+        ] or None
+        try:
+            if task.get("action") == "info":
+                result = run_info_task(task["url"], targets)
+            elif task.get("action") == "expand":
+                result = run_expand_task(task["url"], task["limit"], targets)
+            else:
+                result = run_download_task(
+                    task["url"],
+                    send_progress,
+                    output_dir=task.get("output_dir"),
+                    info=task.get("info"),
+                    policy=task.get("policy"),
+                    impersonate_targets=targets,
+                    resume=task.get("resume", False),
+                )
+        except Exception as e:
+            result = {"success": False, "error": str(e), "url": task.get("url")}
+        send({"type": "result", "result": result, "max_rss": max_rss_bytes()})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import math
+from typing import Any, Dict, Optional
+
+MB = 1024 * 1024
+
+
+def parse_format_policy(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate the quality/size policy of a download request.
+
+    :param data: Request body; reads max_height, max_filesize_mb,
+                 prefer_single, audio_only and the clip range start/end
+                 (seconds or "HH:MM:SS")
+    :return: Policy with only the fields that were set
+    :raises ValueError: If a field has an invalid value
+    """
+    policy: Dict[str, Any] = {}
+    for field in ("start", "end"):
+        value = data.get(field)
+        if value is None or value == "":
+            continue
+        if isinstance(value, str):
+            # yt-dlp is only imported once it is needed, see app.py
+            from yt_dlp.utils import parse_duration
+
+            seconds = parse_duration(value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            seconds = value
+        else:
+            seconds = None
+        if (
+            not isinstance(seconds, (int, float))
+            or not math.isfinite(seconds)
+            or seconds < 0
+        ):
+            raise ValueError(f"{field} must be a time like 90 or 00:01:30")
+        policy[field] = seconds
+    if policy.get("end") is not None and policy["end"] <= policy.get("start", 0):
+        raise ValueError("end must be after start")
+    if not policy.get("start"):
+        # A clip from 0 without an end is the whole video
+        policy.pop("start", None)
+    for field in ("max_height", "max_filesize_mb"):
+        value = data.get(field)
+        if value is None:
+            continue
+        if (
+            isinstance(value, bool)
+            or not isinstance(value, (int, float))
+            or not math.isfinite(value)
+            or value <= 0
+        ):
+            raise ValueError(f"{field} must be a positive number")
+        policy[field] = int(value) if field == "max_height" else value
+    for field in ("prefer_single", "audio_only"):
+        value = data.get(field)
+        if value is None:
+            continue
+        if not isinstance(value, bool):
+            raise ValueError(f"{field} must be true or false")
+        if value:
+            policy[field] = True
+    return policy
+
+
+def is_clip(policy: Optional[Dict[str, Any]]) -> bool:
+    return bool(policy) and ("start" in policy or "end" in policy)
+
+
+def _filters(max_height: Optional[int], max_bytes: Optional[int]) -> str:
+    # "<?" also accepts formats whose size is unknown
+    filters = ""
+    if max_height:
+        filters += f"[height<=?{max_height}]"
+    if max_bytes:
+        filters += f"[filesize<?{max_bytes}][filesize_approx<?{max_bytes}]"
+    return filters
+
+
+def plan_formats(policy: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Turn a download policy into yt-dlp options.
+
+    Without a policy this keeps the original selection: the best MP4 video
+    merged with the best audio, or the best single MP4. The policy narrows
+    that down by height and size, prefers a single pre-muxed file (no merge
+    at all) or picks audio only. Audio is never re-encoded; M4A is preferred
+    so merges into MP4 stay a stream copy. yt-dlp's merger runs ffmpeg with
+    "-c copy" and "-movflags +faststart", so merged files play progressively
+    from the presigned URL.
+
+    max_filesize_mb applies to each downloaded stream: yt-dlp cannot filter
+    on the size of a video and audio pair, so a merged file can be up to
+    about twice the limit. Streamed uploads are the exception, their
+    writer stops at the limit for the whole file.
+
+    :param policy: Policy from parse_format_policy
+    :return: yt-dlp options overriding the downloader's defaults
+    """
+    policy = policy or {}
+    max_bytes = (
+        int(policy["max_filesize_mb"] * MB) if policy.get("max_filesize_mb") else None
+    )
+    video = _filters(policy.get("max_height"), max_bytes)
+    audio = _filters(None, max_bytes)
+
+    if policy.get("audio_only"):
+        fmt = f"bestaudio[ext=m4a]{audio}/bestaudio{audio}"
+    else:
+        merged = (
+            f"bestvideo[ext=mp4]{video}+(bestaudio[ext=m4a]{audio}/bestaudio{audio})"
+        )
+        single = f"best[ext=mp4]{video}/best{video}"
+        fmt = (
+            f"{single}/{merged}"
+            if policy.get("prefer_single")
+            else f"{merged}/{single}"
+        )
+
+    options: Dict[str, Any] = {"format": fmt, "merge_output_format": "mp4"}
+    if max_bytes:
+        # Hard stop for formats that turn out larger than announced
+        options["max_filesize"] = max_bytes
+    if is_clip(policy):
+        # yt-dlp hands ranges to ffmpeg, which seeks with HTTP range requests
+        # or only fetches the fragments covering the range. Without forced
+        # keyframes it cuts at the nearest keyframes with -c copy, so nothing
+        # is re-encoded.
+        from yt_dlp.utils import download_range_func
+
+        options["download_ranges"] = download_range_func(
+            None, [(policy.get("start", 0), policy.get("end", float("inf")))]
+        )
+        options["force_keyframes_at_cuts"] = False
+    return options
@@ -1,11 +1,33 @@
 import os
-import boto3
-from botocore.config import Config
+import threading
+
+# Connections kept to the object store; every upload thread, multipart part
+# and presign of this process shares them, so keep it above
+# S3_MAX_CONCURRENCY times the uploads running at once
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", "50"))
+S3_MAX_ATTEMPTS = int(os.environ.get("S3_MAX_ATTEMPTS", "5"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def create_s3_client():
+    """
+    Build a new S3 client from the AWS_* environment variables.
+
+    boto3 is imported here rather than at module level, since it takes a
+    noticeable part of the app's startup.
+    """
+    import boto3
+    from botocore.config import Config
 
-def get_s3_client():
     boto_config = Config(
         region_name=os.environ.get("AWS_REGION"),
         signature_version="s3v4",
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+        # Idle pooled connections are kept open for the next request
+        tcp_keepalive=True,
+        retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": "standard"},
     )
 
     return boto3.client(
@@ -15,3 +37,19 @@ def get_s3_client():
         aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
         config=boto_config,
     )
+
+
+def get_s3_client():
+    """
+    Return the S3 client shared by this process, creating it on first use.
+
+    boto3 clients are thread-safe once built, but building one is not, so
+    creation is serialized. Sharing one client shares its connection pool,
+    so uploads, presigns and cleanup reuse open TCP/TLS connections.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_s3_client()
+    return _client
@@ -1,5 +1,30 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
 from yt_dlp import ImpersonateTarget
-from random import choice
+
+logger = logging.getLogger(__name__)
+
+# Targets tried for one job before its error is reported
+IMPERSONATE_MAX_ATTEMPTS = int(os.environ.get("IMPERSONATE_MAX_ATTEMPTS", "3"))
+# Evidence about a target loses half its weight after this long
+IMPERSONATE_HALF_LIFE_SECS = float(os.environ.get("IMPERSONATE_HALF_LIFE_SECS", "3600"))
+# Optional JSON file the selection stats are kept in across restarts
+IMPERSONATE_STATE_FILE = os.environ.get("IMPERSONATE_STATE_FILE")
+IMPERSONATE_SAVE_INTERVAL_SECS = 30
+
+# Responses telling us the site refused this client rather than the video
+BLOCKED_STATUSES = (403, 429, 503)
+BLOCKED_MESSAGE = re.compile(
+    r"HTTP Error (403|429|503)|confirm you.re not a bot|rate.?limit|too many requests",
+    re.IGNORECASE,
+)
 
 impersonate_target_list = (
     ImpersonateTarget(client='chrome', version='110', os='windows', os_version='10'),
@@ -13,17 +38,231 @@ impersonate_target_list = (
     ImpersonateTarget(client='safari', version='15.5', os='macos', os_version='12'),
     ImpersonateTarget(client='safari', version='15.3', os='macos', os_version='11'),
     ImpersonateTarget(client='chrome', version='99', os='android', os_version='12'),
-    ImpersonateTarget.from_str("chrome-99:android-12"),
-    ImpersonateTarget.from_str("safari-15.3:macos-11"),
 )
 
+
 def random_impersonate_target():
     """
     Return a random impersonation target
     """
-    target: ImpersonateTarget = choice(impersonate_target_list)
+    target: ImpersonateTarget = random.choice(impersonate_target_list)
     return target
 
+
+def is_blocked(error: BaseException) -> bool:
+    """
+    Tell whether an error means the site refused the impersonated client.
+
+    yt-dlp wraps HTTP errors in ExtractorError and DownloadError, so the
+    whole chain of causes is checked.
+
+    :param error: Exception raised by yt-dlp
+    :return: True for 403/429/503 responses and bot checks
+    """
+    seen = set()
+    pending = [error]
+    while pending:
+        current = pending.pop()
+        if current is None or id(current) in seen:
+            continue
+        seen.add(id(current))
+        status = getattr(current, "status", None) or getattr(current, "code", None)
+        if status in BLOCKED_STATUSES:
+            return True
+        exc_info = getattr(current, "exc_info", None)
+        pending += [
+            exc_info[1] if exc_info else None,
+            getattr(current, "cause", None),
+            current.__cause__,
+            current.__context__,
+        ]
+    return bool(BLOCKED_MESSAGE.search(str(error)))
+
+
+class ImpersonationSelector:
+    def __init__(
+        self,
+        targets: Iterable[ImpersonateTarget] = impersonate_target_list,
+        half_life: float = IMPERSONATE_HALF_LIFE_SECS,
+        state_file: Optional[str] = IMPERSONATE_STATE_FILE,
+    ):
+        """
+        Learn which impersonation targets work for which site.
+
+        Every (site, target) pair keeps a count of successes and blocks and
+        a moving average of its throughput. Targets are ranked by Thompson
+        sampling: a success rate is drawn from each pair's Beta distribution
+        and scaled by the target's speed relative to the fastest one, so
+        good targets are preferred while untried or recovering ones still
+        get picked now and then. Counts decay with half_life, so a site that
+        stops blocking a fingerprint is noticed again.
+
+        Failures that are not blocks (missing videos, network errors) say
+        nothing about the fingerprint and are not counted.
+
+        :param targets: Targets to choose from
+        :param half_life: Seconds after which evidence counts half
+        :param state_file: Optional JSON file to load and save the stats
+        """
+        self.targets = list(dict.fromkeys(targets))
+        self.half_life = half_life
+        self.state_file = state_file
+        # site -> target string -> {"successes", "blocks", "throughput", "updated"}
+        self._arms: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+        if state_file:
+            self._load()
+
+    def ranking(self, domain: str) -> List[ImpersonateTarget]:
+        """
+        Order the targets for a site, most promising first.
+
+        :param domain: Site as returned by utils.scheduler.job_domain
+        :return: Every target, in the order they should be tried
+        """
+        now = time.time()
+        with self._lock:
+            arms = {
+                str(t): self._decayed(self._arms.get(domain, {}).get(str(t)), now)
+                for t in self.targets
+            }
+        fastest = max((arm["throughput"] for arm in arms.values()), default=0)
+        scores = {}
+        for target in self.targets:
+            arm = arms[str(target)]
+            score = random.betavariate(arm["successes"] + 1, arm["blocks"] + 1)
+            if arm["throughput"] and fastest:
+                score *= (arm["throughput"] / fastest) ** 0.5
+            scores[str(target)] = score
+        return sorted(self.targets, key=lambda t: scores[str(t)], reverse=True)
+
+    def record(
+        self,
+        domain: str,
+        target: str,
+        success: bool,
+        blocked: bool = False,
+        num_bytes: int = 0,
+        seconds: float = 0,
+    ) -> None:
+        """
+        Update a site's stats with the outcome of one attempt.
+
+        :param domain: Site the attempt was made against
+        :param target: Target string, e.g. "chrome-110:windows-10"
+        :param success: Whether the attempt succeeded
+        :param blocked: Whether it failed because the site refused the client
+        :param num_bytes: Bytes downloaded, for the throughput average
+        :param seconds: Time the attempt took
+        """
+        if not success and not blocked:
+            return
+        now = time.time()
+        with self._lock:
+            arms = self._arms.setdefault(domain, {})
+            arm = self._decayed(arms.get(target), now)
+            if success:
+                arm["successes"] += 1
+                if num_bytes and seconds > 0:
+                    speed = num_bytes / seconds
+                    arm["throughput"] = (
+                        speed
+                        if not arm["throughput"]
+                        else 0.7 * arm["throughput"] + 0.3 * speed
+                    )
+            else:
+                arm["blocks"] += 1
+            arm["updated"] = now
+            arms[target] = arm
+            save = self.state_file and now - self._last_save >= (
+                IMPERSONATE_SAVE_INTERVAL_SECS
+            )
+            if save:
+                self._last_save = now
+        if save:
+            self.save()
+
+    def record_attempts(self, impersonation: Optional[Dict[str, Any]]) -> None:
+        """
+        Record the attempts listed in a download result's "impersonation".
+        """
+        if not impersonation:
+            return
+        for attempt in impersonation["attempts"]:
+            self.record(
+                impersonation["domain"],
+                attempt["target"],
+                attempt["success"],
+                blocked=attempt["blocked"],
+                num_bytes=attempt.get("bytes", 0),
+                seconds=attempt.get("seconds", 0),
+            )
+
+    def stats(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Return the decayed stats per site, best success rate first.
+        """
+        now = time.time()
+        with self._lock:
+            sites = {
+                domain: [
+                    {
+                        "target": target,
+                        **self._decayed(arm, now),
+                        "updated": arm["updated"],
+                    }
+                    for target, arm in arms.items()
+                ]
+                for domain, arms in self._arms.items()
+            }
+        for arms in sites.values():
+            for arm in arms:
+                arm["success_rate"] = (arm["successes"] + 1) / (
+                    arm["successes"] + arm["blocks"] + 2
+                )
+            arms.sort(key=lambda arm: arm["success_rate"], reverse=True)
+        return sites
+
+    def save(self) -> None:
+        """
+        Write the stats to state_file, replacing it atomically.
+        """
+        with self._lock:
+            state = json.dumps(self._arms)
+        tmp_file = f"{self.state_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, "w") as f:
+                f.write(state)
+            os.replace(tmp_file, self.state_file)
+        except OSError as e:
+            logger.warning(f"Could not save impersonation stats: {e}")
+
+    def _load(self) -> None:
+        try:
+            with open(self.state_file) as f:
+                self._arms = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable impersonation stats: {e}")
+
+    def _decayed(self, arm: Optional[Dict[str, float]], now: float) -> Dict[str, float]:
+        # Caller holds self._lock; returns a decayed copy
+        if not arm:
+            return {"successes": 0.0, "blocks": 0.0, "throughput": 0.0, "updated": now}
+        weight = 0.5 ** (max(0.0, now - arm["updated"]) / self.half_life)
+        return {
+            "successes": arm["successes"] * weight,
+            "blocks": arm["blocks"] * weight,
+            "throughput": arm["throughput"],
+            "updated": now,
+        }
+
+
+# Shared by every download of this process; see ImpersonationSelector
+impersonation_selector = ImpersonationSelector()
+
 # def download_vimeo_video(vimeo_url):
 #     for i in range(200):
 #         try:
@@ -0,0 +1,215 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.job_store import MemoryJobStore
+from utils.metrics import record_error
+from utils.scheduler import FairScheduler
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_QUEUE_SIZE = int(os.environ.get("DOWNLOAD_QUEUE_SIZE", "100"))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_FINISHED = "finished"
+JOB_FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobQueue:
+    def __init__(
+        self,
+        handler: Callable[[Dict[str, Any]], Dict[str, Any]],
+        on_complete: Optional[Callable[[Dict[str, Any]], None]] = None,
+        store=None,
+        workers: int = DOWNLOAD_WORKERS,
+        max_queue_size: int = DOWNLOAD_QUEUE_SIZE,
+    ):
+        """
+        Run jobs on a bounded pool of worker threads.
+
+        Waiting jobs are handed to workers by a FairScheduler, which caps
+        the jobs running per site and takes turns between clients.
+
+        Under the gevent Gunicorn worker the threads are monkey-patched into
+        greenlets, so a blocked download only parks its own worker.
+
+        :param handler: Callable run for every job, returns a result dictionary
+        :param on_complete: Callable run with the job once it has finished or failed
+        :param store: Where job records live (MemoryJobStore or RedisJobStore);
+                      the queue and workers themselves are always local
+        :param workers: Number of jobs allowed to run at the same time
+        :param max_queue_size: Number of jobs allowed to wait for a worker
+        """
+        self.handler = handler
+        self.on_complete = on_complete
+        self.store = store or MemoryJobStore()
+        self.workers = max(1, workers)
+        self.running = 0
+        self._queue = FairScheduler(max_queue_size)
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_workers(self) -> None:
+        # Threads are started lazily so importing the app does not spawn them
+        # in the Gunicorn master before the worker forks.
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker, name=f"download-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(
+        self, key: Optional[str] = None, client_id: Optional[str] = None, **payload: Any
+    ) -> Dict[str, Any]:
+        """
+        Queue a job and return its record without waiting for it to run.
+
+        If a job with the same key is already queued or running, no new work
+        is queued: the client is attached to that job and gets its progress
+        and result instead.
+
+        :param key: Optional dedup key identifying identical work
+        :param client_id: Client to notify about this job
+        :param payload: Fields stored on the job and passed to the handler
+        :return: The queued (or already in-flight) job record
+        """
+        if key:
+            job = self.store.attach(key, client_id)
+            if job:
+                return job
+
+        job = {
+            **payload,
+            "id": uuid.uuid4().hex,
+            "key": key,
+            "client_ids": [client_id] if client_id else [],
+            "coalesced": 0,
+            "status": JOB_QUEUED,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+
+        with self._lock:
+            self._ensure_workers()
+            if self._queue.full():
+                raise QueueFullError("Download queue is full, try again later")
+
+            self.store.create(job)
+            if key and not self.store.claim(key, job["id"]):
+                # Another request (possibly on another node) claimed the key
+                # between our attach and claim, so join that job instead.
+                attached = self.store.attach(key, client_id)
+                if attached:
+                    self.store.delete(job["id"])
+                    return attached
+            self._queue.put(job)
+
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a job by id.
+
+        :param job_id: Id returned by submit
+        :return: The job record, or None if unknown or expired
+        """
+        return self.store.get(job_id)
+
+    def client_ids(self, job_id: str) -> List[str]:
+        """
+        Return the clients currently attached to a job.
+        """
+        return self.store.client_ids(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the number of queued and running jobs on this node.
+        """
+        return {
+            "queued": self._queue.qsize(),
+            "running": self.running,
+            "workers": self.workers,
+        }
+
+    def scheduler_stats(self) -> Dict[str, Any]:
+        """
+        Return the queue depth, running jobs and wait times per site.
+        """
+        return self._queue.stats()
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            job["status"] = JOB_RUNNING
+            job["started_at"] = time.time()
+            self.store.save(job)
+            with self._lock:
+                self.running += 1
+            try:
+                result = self.handler(job)
+            except Exception as e:
+                record_error("job", e)
+                result = {"success": False, "error": str(e)}
+            with self._lock:
+                self.running -= 1
+            # Frees the site's slot for the next job of that site
+            self._queue.done(job)
+
+            job["result"] = result
+            if result.get("success"):
+                job["status"] = JOB_FINISHED
+            else:
+                job["status"] = JOB_FAILED
+                job["error"] = result.get("error", "Unknown error")
+            job["finished_at"] = time.time()
+            # Once the key is released, late requests start a new job
+            # instead of attaching to one that will not notify them.
+            self.store.finish(job)
+
+            if self.on_complete:
+                try:
+                    self.on_complete(job)
+                except Exception as e:
+                    logger.exception(
+                        f"Error notifying completion of job {job['id']}: {e}"
+                    )
+
+
+def job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the public view of a job record for API responses.
+
+    :param job: Job record from the queue
+    :return: Dictionary safe to return as JSON
+    """
+    status = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "coalesced": job["coalesced"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+    if job["status"] == JOB_FINISHED:
+        status["download_url"] = job["result"].get("download_url")
+        for field in ("format_id", "phase_seconds"):
+            if job["result"].get(field):
+                status[field] = job["result"][field]
+    elif job["status"] == JOB_FAILED:
+        status["error"] = job["error"]
+    return status
@@ -0,0 +1,234 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Shared backend for job records; without it jobs only live in this process
+REDIS_URL = os.environ.get("REDIS_URL")
+REDIS_KEY_PREFIX = os.environ.get("REDIS_KEY_PREFIX", "video-downloader:")
+# Keep finished jobs around as long as the presigned URL they point at is valid
+JOB_RESULT_TTL_SECS = int(os.environ.get("JOB_RESULT_TTL_SECS", "7200"))
+# Upper bound for unfinished records, so a node dying mid-job cannot leave
+# a dedup key that blocks the same video forever
+JOB_ACTIVE_TTL_SECS = int(os.environ.get("JOB_ACTIVE_TTL_SECS", "21600"))
+
+
+class MemoryJobStore:
+    def __init__(self, result_ttl: int = JOB_RESULT_TTL_SECS):
+        """
+        Keep job records and in-flight dedup keys in this process.
+
+        :param result_ttl: Seconds to keep a finished job's record
+        """
+        self.result_ttl = result_ttl
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        # Dedup key -> id of the queued or running job doing that work
+        self._inflight: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._prune()
+            self.jobs[job["id"]] = job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def save(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self.jobs[job["id"]] = job
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self.jobs.pop(job_id, None)
+
+    def claim(self, key: str, job_id: str) -> bool:
+        """
+        Mark job_id as the job doing the work for key, unless one already is.
+        """
+        with self._lock:
+            if key in self._inflight:
+                return False
+            self._inflight[key] = job_id
+            return True
+
+    def attach(self, key: str, client_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Add client_id to the in-flight job for key and return that job.
+
+        :return: The in-flight job, or None if no job holds the key
+        """
+        with self._lock:
+            job_id = self._inflight.get(key)
+            if not job_id:
+                return None
+            job = self.jobs[job_id]
+            if client_id and client_id not in job["client_ids"]:
+                job["client_ids"].append(client_id)
+            job["coalesced"] += 1
+            return job
+
+    def finish(self, job: Dict[str, Any]) -> None:
+        """
+        Release the job's dedup key and store its final state.
+
+        Both happen under one lock, so a request either attaches before the
+        job completes (and is notified) or starts a new job.
+        """
+        with self._lock:
+            if job["key"] and self._inflight.get(job["key"]) == job["id"]:
+                del self._inflight[job["key"]]
+            self.jobs[job["id"]] = job
+
+    def client_ids(self, job_id: str) -> List[str]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return list(job["client_ids"]) if job else []
+
+    def _prune(self) -> None:
+        # Caller holds self._lock
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job["finished_at"] and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+
+class RedisJobStore:
+    def __init__(
+        self,
+        client,
+        result_ttl: int = JOB_RESULT_TTL_SECS,
+        active_ttl: int = JOB_ACTIVE_TTL_SECS,
+        prefix: str = REDIS_KEY_PREFIX,
+    ):
+        """
+        Keep job records and in-flight dedup keys in Redis, shared by all nodes.
+
+        A job's record is a hash holding its JSON and coalesced count, its
+        clients a set, and each dedup key a string holding the job id.
+        Expiry is left to Redis.
+
+        :param client: redis.Redis client created with decode_responses=True
+        :param result_ttl: Seconds to keep a finished job's record
+        :param active_ttl: Seconds an unfinished record or dedup key may live
+        :param prefix: Prefix for every key
+        """
+        self.client = client
+        self.result_ttl = result_ttl
+        self.active_ttl = active_ttl
+        self.prefix = prefix
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}job:{job_id}"
+
+    def _clients_key(self, job_id: str) -> str:
+        return f"{self.prefix}job:{job_id}:clients"
+
+    def _inflight_key(self, key: str) -> str:
+        return f"{self.prefix}inflight:{key}"
+
+    def create(self, job: Dict[str, Any]) -> None:
+        pipe = self.client.pipeline()
+        pipe.hset(
+            self._job_key(job["id"]),
+            mapping={"data": self._dump(job), "coalesced": job["coalesced"]},
+        )
+        pipe.expire(self._job_key(job["id"]), self.active_ttl)
+        if job["client_ids"]:
+            pipe.sadd(self._clients_key(job["id"]), *job["client_ids"])
+            pipe.expire(self._clients_key(job["id"]), self.active_ttl)
+        pipe.execute()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data, coalesced = self.client.hmget(self._job_key(job_id), "data", "coalesced")
+        if data is None:
+            return None
+        job = json.loads(data)
+        job["coalesced"] = int(coalesced or 0)
+        job["client_ids"] = self.client_ids(job_id)
+        return job
+
+    def save(self, job: Dict[str, Any]) -> None:
+        self.client.hset(self._job_key(job["id"]), "data", self._dump(job))
+
+    def delete(self, job_id: str) -> None:
+        self.client.delete(self._job_key(job_id), self._clients_key(job_id))
+
+    def claim(self, key: str, job_id: str) -> bool:
+        return bool(
+            self.client.set(self._inflight_key(key), job_id, nx=True, ex=self.active_ttl)
+        )
+
+    def attach(self, key: str, client_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        job_id = self.client.get(self._inflight_key(key))
+        if not job_id:
+            return None
+        pipe = self.client.pipeline()
+        if client_id:
+            pipe.sadd(self._clients_key(job_id), client_id)
+        pipe.hincrby(self._job_key(job_id), "coalesced", 1)
+        pipe.execute()
+        return self.get(job_id)
+
+    def finish(self, job: Dict[str, Any]) -> None:
+        if job["key"]:
+            self._release(job["key"], job["id"])
+        pipe = self.client.pipeline()
+        pipe.hset(self._job_key(job["id"]), "data", self._dump(job))
+        pipe.expire(self._job_key(job["id"]), self.result_ttl)
+        pipe.expire(self._clients_key(job["id"]), self.result_ttl)
+        pipe.execute()
+
+    def client_ids(self, job_id: str) -> List[str]:
+        return sorted(self.client.smembers(self._clients_key(job_id)))
+
+    def _release(self, key: str, job_id: str) -> None:
+        # Only delete the dedup key if this job still holds it
+        from redis.exceptions import WatchError
+
+        inflight_key = self._inflight_key(key)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(inflight_key)
+                if pipe.get(inflight_key) == job_id:
+                    pipe.multi()
+                    pipe.delete(inflight_key)
+                    pipe.execute()
+            except WatchError:
+                pass
+
+    @staticmethod
+    def _dump(job: Dict[str, Any]) -> str:
+        # Clients and the coalesced count are stored separately so they can
+        # be updated atomically by other nodes.
+        return json.dumps(
+            {k: v for k, v in job.items() if k not in ("client_ids", "coalesced")},
+            default=str,
+        )
+
+
+def get_redis_client():
+    """
+    Return a Redis client for REDIS_URL, or None when it is not configured.
+    """
+    if not REDIS_URL:
+        return None
+    import redis
+
+    return redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+
+def create_job_store(result_ttl: int = JOB_RESULT_TTL_SECS):
+    """
+    Return a RedisJobStore when REDIS_URL is set, else a MemoryJobStore.
+    """
+    client = get_redis_client()
+    if client is not None:
+        return RedisJobStore(client, result_ttl=result_ttl)
+    return MemoryJobStore(result_ttl=result_ttl)
@@ -0,0 +1,204 @@
+import logging
+import os
+import secrets
+import shutil
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from itsdangerous import URLSafeTimedSerializer
+from werkzeug.security import safe_join
+
+from utils.metrics import time_phase
+from utils.s3_layout import MAX_FILE_AGE_MINS
+from utils.upload_to_s3 import (
+    PRESIGNED_URL_EXPIRES_SECS,
+    S3_BUCKET_NAME,
+    get_s3_presigned_url,
+    make_unique_object_name,
+    upload_to_s3,
+)
+
+logger = logging.getLogger(__name__)
+
+# "s3" uploads every download before handing out a link, "local" serves it
+# from this node's disk right away
+DELIVERY_BACKEND = os.environ.get("DELIVERY_BACKEND", "s3").lower()
+LOCAL_DELIVERY_DIR = os.environ.get("LOCAL_DELIVERY_DIR") or os.path.join(
+    os.getcwd(), "delivery"
+)
+# Signs the links; must be shared by every worker serving them
+LOCAL_DELIVERY_SECRET = os.environ.get("LOCAL_DELIVERY_SECRET")
+# Prefix of the links, e.g. https://videos.example.com; relative when unset
+LOCAL_DELIVERY_BASE_URL = os.environ.get("LOCAL_DELIVERY_BASE_URL", "").rstrip("/")
+# Also copy delivered files to S3 in the background, for long-term storage
+LOCAL_DELIVERY_UPLOAD = os.environ.get(
+    "LOCAL_DELIVERY_UPLOAD", "True"
+).lower() == "true" and bool(S3_BUCKET_NAME)
+LOCAL_DELIVERY_UPLOAD_WORKERS = int(
+    os.environ.get("LOCAL_DELIVERY_UPLOAD_WORKERS", "2")
+)
+LOCAL_CLEANUP_INTERVAL_MINS = int(os.environ.get("CLEANUP_INTERVAL") or 30)
+
+if DELIVERY_BACKEND == "local" and not LOCAL_DELIVERY_SECRET:
+    logger.warning(
+        "LOCAL_DELIVERY_SECRET is not set, links only work on this process "
+        "until it restarts"
+    )
+    LOCAL_DELIVERY_SECRET = secrets.token_hex(32)
+
+_serializer = URLSafeTimedSerializer(LOCAL_DELIVERY_SECRET or "", salt="local-delivery")
+_uploads = ThreadPoolExecutor(
+    max_workers=max(1, LOCAL_DELIVERY_UPLOAD_WORKERS),
+    thread_name_prefix="delivery-upload",
+)
+
+
+def local_path(object_name: str) -> Optional[str]:
+    """
+    Return where a delivered object is kept on disk.
+
+    :param object_name: Object name as returned by deliver_locally
+    :return: Path under LOCAL_DELIVERY_DIR, or None for names escaping it
+    """
+    return safe_join(LOCAL_DELIVERY_DIR, object_name)
+
+
+def get_local_presigned_url(object_name: str) -> Optional[str]:
+    """
+    Generate a signed link to a delivered file, like get_s3_presigned_url.
+
+    :param object_name: Object name as returned by deliver_locally
+    :return: URL valid for PRESIGNED_URL_EXPIRES_SECS, or None if the file is gone
+    """
+    path = local_path(object_name)
+    if not path or not os.path.isfile(path):
+        return None
+    return f"{LOCAL_DELIVERY_BASE_URL}/files/{_serializer.dumps(object_name)}"
+
+
+def verify_token(token: str) -> str:
+    """
+    Return the object name a link was signed for.
+
+    :param token: Last path segment of the link
+    :return: Object name
+    :raises itsdangerous.SignatureExpired: If the link is older than its expiry
+    :raises itsdangerous.BadSignature: If the link was not signed by us
+    """
+    return _serializer.loads(token, max_age=PRESIGNED_URL_EXPIRES_SECS)
+
+
+def get_presigned_url(object_name: str) -> Optional[str]:
+    """
+    Generate a download link for an object of the configured backend.
+
+    With local delivery, a file that is no longer on disk is linked from S3
+    if it was uploaded there in the background.
+
+    :param object_name: Object name of the download
+    :return: Download URL, or None on failure
+    """
+    if DELIVERY_BACKEND == "local":
+        url = get_local_presigned_url(object_name)
+        if url or not LOCAL_DELIVERY_UPLOAD:
+            return url
+    return get_s3_presigned_url(S3_BUCKET_NAME, object_name)
+
+
+def deliver_locally(
+    file_path: str, object_name: str, extractor: Optional[str] = None
+) -> Optional[Tuple[str, str]]:
+    """
+    Move a finished download out of its session directory and link to it.
+
+    The file is renamed into LOCAL_DELIVERY_DIR (no copy when both are on
+    the same filesystem), so the client can fetch it at once; the optional
+    upload to S3 runs in the background, under the same object name.
+
+    :param file_path: Path of the downloaded file
+    :param object_name: Name to deliver it under, usually the file name
+    :param extractor: yt-dlp extractor of the video, used as a metrics label
+    :return: (object name, signed URL), or None on failure
+    """
+    unique_object_name = make_unique_object_name(object_name)
+    path = local_path(unique_object_name)
+    try:
+        with time_phase("deliver"):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.move(file_path, path)
+            # yt-dlp dates files by the server's Last-Modified; cleanup
+            # goes by the time they were delivered
+            os.utime(path)
+    except OSError as e:
+        logger.error(f"Failed to deliver {file_path}: {e}")
+        return None
+    if LOCAL_DELIVERY_UPLOAD:
+        _uploads.submit(
+            upload_to_s3, path, unique_object_name, extractor=extractor, unique=False
+        )
+    return unique_object_name, get_local_presigned_url(unique_object_name)
+
+
+def zip_local_files(object_name: str, members: List[Tuple[str, str]]) -> int:
+    """
+    Write delivered files into one uncompressed ZIP, delivered the same way.
+
+    :param object_name: Object name of the archive
+    :param members: (name in archive, object name) of each delivered file
+    :return: Size of the archive in bytes
+    """
+    path = local_path(object_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Videos do not compress, storing them keeps this a plain copy
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, member in members:
+            archive.write(local_path(member), arcname)
+    if LOCAL_DELIVERY_UPLOAD:
+        _uploads.submit(upload_to_s3, path, object_name, unique=False)
+    return os.path.getsize(path)
+
+
+def cleanup_local_files(max_age_mins: int = MAX_FILE_AGE_MINS) -> Dict[str, int]:
+    """
+    Delete delivered files older than max_age_mins, as cleanup_old_files does in S3.
+
+    :param max_age_mins: Age after which a file is deleted
+    :return: Number of files deleted and bytes reclaimed
+    """
+    stats = {"deleted": 0, "bytes": 0}
+    cutoff = time.time() - max_age_mins * 60
+    for root, _, files in os.walk(LOCAL_DELIVERY_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime < cutoff:
+                    os.remove(path)
+                    stats["deleted"] += 1
+                    stats["bytes"] += stat.st_size
+            except OSError as e:
+                logger.warning(f"Could not delete {path}: {e}")
+    if stats["deleted"]:
+        logger.info(
+            f"Deleted {stats['deleted']} delivered files, "
+            f"reclaimed {stats['bytes'] / 2**20:.1f} MB"
+        )
+    return stats
+
+
+def init_local_cleanup_scheduler():
+    # Only imported with local delivery
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(
+        cleanup_local_files,
+        "interval",
+        minutes=LOCAL_CLEANUP_INTERVAL_MINS,
+        id="cleanup_local_files",
+    )
+    scheduler.start()
+    logger.info("Local delivery cleanup scheduler initialized")
+    return scheduler
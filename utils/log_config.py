@@ -0,0 +1,176 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Iterable, Optional
+
+# "json" writes one JSON object per line, "text" the classic format
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_DIR = os.environ.get("LOG_DIR") or os.path.join(os.getcwd(), "logs")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "10"))
+# Records waiting for the writer thread; beyond this new ones are dropped
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# Share of downloads whose full extraction is logged at DEBUG level
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]"
+
+# Attributes every LogRecord has; anything else was passed in extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+# Heavy parts of an extraction, left out even of the debug detail
+_INFO_HEAVY_KEYS = (
+    "formats",
+    "thumbnails",
+    "subtitles",
+    "automatic_captions",
+    "requested_formats",
+    "requested_downloads",
+    "heatmap",
+    "http_headers",
+    "_format_sort_fields",
+)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as single-line JSON objects.
+
+    Fields passed with extra= are added to the object as they are.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    # The stock handler formats the record into msg on the calling thread
+    # and drops the extra= fields' types; only merge the arguments here and
+    # leave formatting to the writer thread.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Losing a log line is better than stalling a download
+            pass
+
+
+def make_formatter() -> logging.Formatter:
+    return JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+
+
+def setup_queue_logging(loggers: Iterable[logging.Logger]) -> QueueListener:
+    """
+    Send the records of loggers through a queue to a background writer.
+
+    Callers only put records on the queue; a QueueListener thread formats
+    them and writes them to logs/app.log, so file I/O and rotation happen
+    off the request and download path.
+
+    :param loggers: Loggers to attach the queue handler to
+    :return: The started listener, stopped again at exit
+    """
+    os.makedirs(LOG_DIR, exist_ok=True)
+    file_handler = RotatingFileHandler(
+        os.path.join(LOG_DIR, "app.log"),
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUP_COUNT,
+    )
+    file_handler.setFormatter(make_formatter())
+
+    queue_handler = _QueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    for logger in loggers:
+        logger.addHandler(queue_handler)
+        logger.setLevel(LOG_LEVEL)
+
+    listener = QueueListener(
+        queue_handler.queue, file_handler, respect_handler_level=True
+    )
+    listener.start()
+    # Flushes the records still queued
+    atexit.register(listener.stop)
+    return listener
+
+
+def info_summary(
+    info_dict: Dict[str, Any], result: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Build the compact description of a download logged instead of info_dict.
+
+    :param info_dict: yt-dlp extraction of the downloaded video
+    :param result: Optional download result with bytes and phase timings
+    :return: Dictionary of a few scalar fields
+    """
+    result = result or {}
+    return {
+        "video_id": info_dict.get("id"),
+        "extractor": info_dict.get("extractor"),
+        "format_id": info_dict.get("format_id"),
+        "ext": info_dict.get("ext"),
+        "duration": info_dict.get("duration"),
+        "formats": len(info_dict.get("formats") or ()),
+        "bytes": result.get("downloaded_bytes"),
+        "phase_seconds": {
+            phase: round(seconds, 3)
+            for phase, seconds in (result.get("phase_seconds") or {}).items()
+        },
+    }
+
+
+def log_download(
+    logger: logging.Logger,
+    url: str,
+    info_dict: Dict[str, Any],
+    result: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    Log a finished download as a summary, and a sample of them in detail.
+
+    The detail (the extraction without its format list and other heavy
+    parts) is only built for LOG_DEBUG_SAMPLE_RATE of the downloads, and
+    only when DEBUG is enabled.
+
+    :param logger: Logger to write to
+    :param url: URL of the video
+    :param info_dict: yt-dlp extraction of the video
+    :param result: Optional download result with bytes and phase timings
+    """
+    logger.info(
+        f"Downloaded {url}", extra={"url": url, **info_summary(info_dict, result)}
+    )
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_DEBUG_SAMPLE_RATE:
+        detail = {
+            key: value
+            for key, value in info_dict.items()
+            if key not in _INFO_HEAVY_KEYS and not key.startswith("__")
+        }
+        logger.debug(f"Extraction of {url}", extra={"url": url, "info": detail})
@@ -0,0 +1,207 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# Phases range from sub-second presigning to hour-long downloads
+PHASE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+THROUGHPUT_BUCKETS = tuple(2**i * 64 * 1024 for i in range(12))  # 64 KB/s .. 128 MB/s
+
+PHASE_SECONDS = Histogram(
+    "video_downloader_phase_seconds",
+    "Time spent in each phase of a download job",
+    ["phase"],
+    buckets=PHASE_BUCKETS,
+)
+TRANSFERRED_BYTES = Counter(
+    "video_downloader_transferred_bytes_total",
+    "Bytes downloaded from the source or uploaded to S3",
+    ["direction", "extractor"],
+)
+THROUGHPUT = Histogram(
+    "video_downloader_throughput_bytes_per_second",
+    "Effective throughput of each download or upload",
+    ["direction", "extractor"],
+    buckets=THROUGHPUT_BUCKETS,
+)
+ERRORS = Counter(
+    "video_downloader_errors_total",
+    "Errors by phase and exception class",
+    ["phase", "exception"],
+)
+CLEANUP_DELETED = Counter(
+    "video_downloader_cleanup_deleted_objects_total",
+    "Expired S3 objects deleted by cleanup",
+)
+CLEANUP_RECLAIMED_BYTES = Counter(
+    "video_downloader_cleanup_reclaimed_bytes_total",
+    "Bytes freed in S3 by cleanup",
+)
+JOBS_QUEUED = Gauge("video_downloader_jobs_queued", "Jobs waiting for a worker")
+JOBS_RUNNING = Gauge("video_downloader_jobs_running", "Jobs currently running")
+DOMAIN_JOBS_QUEUED = Gauge(
+    "video_downloader_domain_jobs_queued",
+    "Jobs waiting for a worker by site",
+    ["domain"],
+)
+DOMAIN_JOBS_RUNNING = Gauge(
+    "video_downloader_domain_jobs_running", "Jobs currently running by site", ["domain"]
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "video_downloader_queue_wait_seconds",
+    "Time jobs waited in the queue before a worker picked them up",
+    ["domain"],
+    buckets=PHASE_BUCKETS,
+)
+DISK_USED = Gauge(
+    "video_downloader_disk_used_bytes", "Bytes held in local session directories"
+)
+DISK_FREE = Gauge("video_downloader_disk_free_bytes", "Free space on the download disk")
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.seconds = 0.0
+
+
+@contextmanager
+def time_phase(phase: str) -> Iterator[PhaseTimer]:
+    """
+    Time the enclosed block and record it in the phase histogram.
+
+    :param phase: Phase label, e.g. "extract", "download", "upload"
+    :return: Timer whose seconds attribute is set when the block exits
+    """
+    timer = PhaseTimer()
+    start = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        timer.seconds = time.perf_counter() - start
+        PHASE_SECONDS.labels(phase).observe(timer.seconds)
+
+
+def observe_phase(phase: str, seconds: float) -> None:
+    PHASE_SECONDS.labels(phase).observe(seconds)
+
+
+def record_transfer(
+    direction: str, extractor: Optional[str], num_bytes: int, seconds: float
+) -> None:
+    """
+    Record bytes moved and the effective throughput of one transfer.
+
+    :param direction: "download" or "upload"
+    :param extractor: yt-dlp extractor name of the video
+    :param num_bytes: Bytes transferred
+    :param seconds: Time the transfer took
+    """
+    extractor = extractor or "unknown"
+    TRANSFERRED_BYTES.labels(direction, extractor).inc(num_bytes)
+    if seconds > 0:
+        THROUGHPUT.labels(direction, extractor).observe(num_bytes / seconds)
+
+
+def exception_name(error: BaseException) -> str:
+    """
+    Return the class name used to label an error.
+
+    yt-dlp wraps extractor and network failures in DownloadError, so the
+    wrapped exception's class is used when there is one.
+    """
+    exc_info = getattr(error, "exc_info", None)
+    if exc_info and exc_info[1] is not None:
+        error = exc_info[1]
+    return type(error).__name__
+
+
+def record_error(phase: str, error: BaseException) -> None:
+    """
+    Count an error by phase and exception class.
+    """
+    ERRORS.labels(phase, exception_name(error)).inc()
+
+
+def record_cleanup(deleted: int, num_bytes: int) -> None:
+    CLEANUP_DELETED.inc(deleted)
+    CLEANUP_RECLAIMED_BYTES.inc(num_bytes)
+
+
+def record_download_metrics(result: Dict[str, Any]) -> None:
+    """
+    Record phase timings, transfers and errors reported in a download result.
+
+    Downloads may run in a worker process, so VideoDownloader only reports
+    its numbers and they are recorded here, in the web process.
+
+    :param result: Result dictionary from VideoDownloader
+    """
+    phase_seconds = result.get("phase_seconds") or {}
+    for phase, seconds in phase_seconds.items():
+        observe_phase(phase, seconds)
+
+    if not result.get("success"):
+        if result.get("error_type"):
+            ERRORS.labels(result["error_phase"], result["error_type"]).inc()
+        return
+
+    extractor = result.get("extractor")
+    if "stream" in phase_seconds:
+        # Bytes go to S3 as they arrive, so both directions share the time
+        for direction in ("download", "upload"):
+            record_transfer(
+                direction,
+                extractor,
+                result.get("downloaded_bytes", 0),
+                phase_seconds["stream"],
+            )
+    elif "download" in phase_seconds:
+        record_transfer(
+            "download",
+            extractor,
+            result.get("downloaded_bytes", 0),
+            phase_seconds["download"],
+        )
+
+
+def register_queue_gauges(stats: Callable[[], Dict[str, int]]) -> None:
+    """
+    Read the queued/running gauges from a stats callable at scrape time.
+
+    :param stats: Callable returning a dictionary with "queued" and "running"
+    """
+    JOBS_QUEUED.set_function(lambda: stats()["queued"])
+    JOBS_RUNNING.set_function(lambda: stats()["running"])
+
+
+def record_queue_wait(domain: str, seconds: float) -> None:
+    QUEUE_WAIT_SECONDS.labels(domain).observe(seconds)
+
+
+def set_domain_gauges(domain: str, queued: int, running: int) -> None:
+    DOMAIN_JOBS_QUEUED.labels(domain).set(queued)
+    DOMAIN_JOBS_RUNNING.labels(domain).set(running)
+
+
+def register_disk_gauges(stats: Callable[[], Dict[str, int]]) -> None:
+    """
+    Read the local disk gauges from a stats callable at scrape time.
+
+    :param stats: Callable returning a dictionary with "used_bytes" and "free_bytes"
+    """
+    DISK_USED.set_function(lambda: stats()["used_bytes"])
+    DISK_FREE.set_function(lambda: stats()["free_bytes"])
+
+
+def render_metrics():
+    """
+    Return the Prometheus exposition payload and its content type.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
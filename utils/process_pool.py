@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+from queue import Empty, LifoQueue
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 0 keeps yt-dlp in the web process
+DOWNLOAD_PROCESSES = int(os.environ.get("DOWNLOAD_PROCESSES", "0"))
+# Recycle a worker after this many jobs or once its peak RSS passes the limit
+WORKER_MAX_JOBS = int(os.environ.get("WORKER_MAX_JOBS", "50"))
+WORKER_MAX_RSS_MB = int(os.environ.get("WORKER_MAX_RSS_MB", "1024"))
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class WorkerCrashedError(Exception):
+    """Raised when a worker process exits in the middle of a job."""
+
+
+class _Worker:
+    def __init__(self):
+        env = {**os.environ}
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [REPO_ROOT, env.get("PYTHONPATH")])
+        )
+        # subprocess is cooperative under gevent, so reading the worker's
+        # output only parks the calling greenlet.
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "utils.download_worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=os.getcwd(),
+            env=env,
+            text=True,
+            bufsize=1,
+        )
+        self.jobs_done = 0
+        self.max_rss = 0
+
+    def run(
+        self, task: Dict[str, Any], progress_callback: Callable[[Dict[str, Any]], None]
+    ) -> Dict[str, Any]:
+        self.process.stdin.write(json.dumps(task) + "\n")
+        self.process.stdin.flush()
+
+        for line in self.process.stdout:
+            message = json.loads(line)
+            if message["type"] == "progress":
+                progress_callback(message["data"])
+            elif message["type"] == "result":
+                self.jobs_done += 1
+                self.max_rss = message["max_rss"]
+                return message["result"]
+
+        raise WorkerCrashedError(
+            f"Download worker {self.process.pid} exited with {self.process.wait()}"
+        )
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def stop(self) -> None:
+        if self.is_alive():
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+
+class DownloadProcessPool:
+    def __init__(
+        self,
+        size: int = DOWNLOAD_PROCESSES,
+        max_jobs: int = WORKER_MAX_JOBS,
+        max_rss_mb: int = WORKER_MAX_RSS_MB,
+    ):
+        """
+        Run yt-dlp jobs in separate worker processes.
+
+        Extraction and postprocessing are CPU- and memory-heavy; running them
+        out of process keeps the web worker's event loop responsive and its
+        memory flat. Workers are started on demand and replaced after
+        max_jobs jobs or once their peak RSS exceeds max_rss_mb.
+
+        :param size: Maximum number of worker processes
+        :param max_jobs: Jobs a worker runs before it is recycled
+        :param max_rss_mb: Peak RSS in MB after which a worker is recycled
+        """
+        self.size = max(1, size)
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.recycled = 0
+        # LIFO so the most recently used (warm) worker is reused first
+        self._idle: LifoQueue = LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    def run(
+        self,
+        task: Dict[str, Any],
+        progress_callback: Callable[[Dict[str, Any]], None],
+    ) -> Dict[str, Any]:
+        """
+        Run a task on a worker, blocking until it finishes.
+
+        :param task: Task dictionary with "url" and optional "output_dir" (a
+                     working directory to resume in if "resume") and cached
+                     "info"; "action": "info" only extracts metadata,
+                     "expand" lists a playlist's entries (up to "limit");
+                     "impersonate_targets" orders the targets to try
+        :param progress_callback: Called in this process for every progress event
+        :return: Result dictionary from the worker
+        """
+        with self._slots:
+            worker = self._acquire()
+            try:
+                result = worker.run(task, progress_callback)
+            except Exception:
+                worker.process.kill()
+                worker.process.wait()
+                raise
+            self._release(worker)
+            return result
+
+    def shutdown(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except Empty:
+                return
+
+    def _acquire(self) -> _Worker:
+        while True:
+            try:
+                worker: Optional[_Worker] = self._idle.get_nowait()
+            except Empty:
+                return _Worker()
+            if worker.is_alive():
+                return worker
+
+    def _release(self, worker: _Worker) -> None:
+        if worker.jobs_done >= self.max_jobs or worker.max_rss >= self.max_rss:
+            logger.info(
+                f"Recycling download worker {worker.process.pid} after "
+                f"{worker.jobs_done} jobs, peak RSS {worker.max_rss // 2**20} MB"
+            )
+            self.recycled += 1
+            worker.stop()
+        else:
+            self._idle.put(worker)
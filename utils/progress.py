@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+PROGRESS_MIN_INTERVAL_SECS = float(os.environ.get("PROGRESS_MIN_INTERVAL_SECS", "0.5"))
+PROGRESS_MIN_PERCENT_DELTA = float(os.environ.get("PROGRESS_MIN_PERCENT_DELTA", "1"))
+
+
+class ProgressThrottle:
+    def __init__(
+        self,
+        callback: Callable[[Dict[str, Any]], None],
+        min_interval: float = PROGRESS_MIN_INTERVAL_SECS,
+        min_percent_delta: float = PROGRESS_MIN_PERCENT_DELTA,
+    ):
+        """
+        Coalesce progress events so at most a few per second reach the callback.
+
+        An event is passed on when min_interval seconds have passed since
+        the last one or its percent moved by at least min_percent_delta, so
+        slow downloads still report every interval. The first event that
+        reaches 100% and events sent with final=True are always passed on.
+
+        :param callback: Receives the events that get through
+        :param min_interval: Minimum seconds between two events
+        :param min_percent_delta: Minimum change in percent between two events
+        """
+        self.callback = callback
+        self.min_interval = min_interval
+        self.min_percent_delta = min_percent_delta
+        self._last_time = float("-inf")
+        self._last_percent: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def __call__(self, data: Dict[str, Any], final: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            completed = data["percent"] >= 100 and self._last_percent != 100
+            if not (final or completed):
+                if (
+                    now - self._last_time < self.min_interval
+                    and self._last_percent is not None
+                    and abs(data["percent"] - self._last_percent)
+                    < self.min_percent_delta
+                ):
+                    return
+            self._last_time = now
+            self._last_percent = data["percent"]
+        self.callback(data)
+
+
+def progress_event(
+    d: Dict[str, Any], phase: str = "download"
+) -> Optional[Dict[str, Any]]:
+    """
+    Build a progress event from a yt-dlp progress hook dictionary.
+
+    Fragmented formats (HLS/DASH) often have no total size, so the
+    fragment counters are used for the percentage instead.
+
+    :param d: Dictionary passed to a yt-dlp progress hook
+    :param phase: Phase label for the event
+    :return: Event with percent, bytes, speed and ETA, or None if unknown
+    """
+    downloaded_bytes = d.get("downloaded_bytes") or 0
+    total_bytes = d.get("total_bytes") or d.get("total_bytes_estimate") or 0
+
+    if total_bytes > 0:
+        percent = downloaded_bytes / total_bytes * 100
+    elif d.get("fragment_count"):
+        percent = (d.get("fragment_index") or 0) / d["fragment_count"] * 100
+    else:
+        return None
+
+    return {
+        "phase": phase,
+        "percent": min(percent, 100.0),
+        "downloaded_bytes": downloaded_bytes,
+        "total_bytes": total_bytes or None,
+        "speed": d.get("speed"),
+        "eta": d.get("eta"),
+    }
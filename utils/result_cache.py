@@ -0,0 +1,31 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+from utils.s3_layout import MAX_FILE_AGE_MINS
+from utils.ttl_cache import TTLCache
+
+# Objects older than MAX_FILE_AGE_MINS are removed by cleanup_old_files, so a
+# cached key must expire before that, with some margin for the client to
+# start fetching the presigned URL.
+RESULT_CACHE_SAFETY_SECS = int(os.environ.get("RESULT_CACHE_SAFETY_SECS", "600"))
+RESULT_CACHE_TTL_SECS = max(0, MAX_FILE_AGE_MINS * 60 - RESULT_CACHE_SAFETY_SECS)
+
+
+def make_cache_key(url: str, options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Build a stable cache key from a sanitized URL and download options.
+
+    :param url: URL as returned by sanitize_url
+    :param options: Options that change the produced file (format etc.)
+    :return: Hex digest identifying the download result
+    """
+    payload = json.dumps(
+        {"url": url, "options": options or {}}, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Maps a cache key to the S3 object key holding that download
+result_cache = TTLCache(RESULT_CACHE_TTL_SECS)
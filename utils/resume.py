@@ -0,0 +1,216 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Keep the working directory of a failed download so a retry or a restart
+# continues from the bytes and fragments already on disk
+DOWNLOAD_RESUME = os.environ.get("DOWNLOAD_RESUME", "True").lower() == "true"
+# Partial downloads older than this are given up on and deleted
+DOWNLOAD_RESUME_TTL_SECS = int(os.environ.get("DOWNLOAD_RESUME_TTL_SECS", "86400"))
+# Requeue the unfinished downloads found on disk when the app starts
+RESUME_ON_START = os.environ.get("RESUME_ON_START", "True").lower() == "true"
+# Restarts a download is requeued on before it is given up on, in case the
+# download itself is what brings the process down
+RESUME_MAX_ATTEMPTS = int(os.environ.get("RESUME_MAX_ATTEMPTS", "3"))
+# yt-dlp retries of a request or fragment, resuming from the last byte
+DOWNLOAD_RETRIES = int(os.environ.get("DOWNLOAD_RETRIES", "10"))
+RETRY_BACKOFF_MAX_SECS = float(os.environ.get("RETRY_BACKOFF_MAX_SECS", "60"))
+
+RESUME_DIR_PREFIX = "resume_"
+MANIFEST_NAME = "job.json"
+LOCK_NAME = ".lock"
+
+RESUME_RUNNING = "running"
+RESUME_DONE = "done"
+RESUME_FAILED = "failed"
+# Requeued on startup by the process in owner_pid, not started yet
+RESUME_QUEUED = "queued"
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def retry_sleep(attempt: int) -> float:
+    """
+    Seconds yt-dlp waits before retry number attempt (1, 2, 4, ... capped).
+
+    A module-level function rather than a lambda, so the options it is
+    passed in keep the same pool key across jobs.
+    """
+    return min(2.0 ** max(attempt - 1, 0), RETRY_BACKOFF_MAX_SECS)
+
+
+def resume_dir_name(key: str) -> str:
+    """
+    Name of the working directory of the download identified by key.
+
+    :param key: Result cache key of the download (URL and format policy)
+    :return: Directory name, the same across processes and restarts
+    """
+    return RESUME_DIR_PREFIX + hashlib.sha256(key.encode()).hexdigest()[:24]
+
+
+def is_resume_dir(path: str) -> bool:
+    return os.path.basename(path).startswith(RESUME_DIR_PREFIX)
+
+
+def read_manifest(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Read the record of the download kept in a working directory.
+
+    :param path: Working directory
+    :return: The record, or None if there is none or it is unreadable
+    """
+    try:
+        with open(os.path.join(path, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(path: str, **fields: Any) -> Dict[str, Any]:
+    """
+    Update the record of a working directory, replacing the file atomically.
+
+    :param path: Working directory
+    :param fields: Fields to set, e.g. key, url, policy, format_id, status
+    :return: The updated record
+    """
+    manifest = {**(read_manifest(path) or {}), **fields, "updated_at": time.time()}
+    tmp_file = os.path.join(path, f"{MANIFEST_NAME}.tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, os.path.join(path, MANIFEST_NAME))
+    return manifest
+
+
+def prepare_resume(path: str, format_id: Optional[str]) -> bool:
+    """
+    Keep a working directory's partial files only if they are of format_id.
+
+    Partial files of another format would be resumed with the wrong bytes,
+    so they are deleted when the selected format changed since last time.
+
+    :param path: Working directory
+    :param format_id: Format selected for this attempt, e.g. "137+140"
+    :return: True if earlier partial files are kept for resuming
+    """
+    manifest = read_manifest(path) or {}
+    previous = manifest.get("format_id")
+    kept = [name for name in os.listdir(path) if name not in (MANIFEST_NAME, LOCK_NAME)]
+    if previous and previous != format_id and kept:
+        logger.info(f"Format changed from {previous} to {format_id}, starting over")
+        for name in kept:
+            full_path = os.path.join(path, name)
+            if os.path.isdir(full_path):
+                shutil.rmtree(full_path, ignore_errors=True)
+            else:
+                os.remove(full_path)
+        kept = []
+    write_manifest(path, format_id=format_id)
+    return bool(kept)
+
+
+def verify_download(filename: str, expected_size: Optional[int] = None) -> None:
+    """
+    Check a finished download before it is uploaded.
+
+    The file must be non-empty and, when the site announced an exact size,
+    have that size. If ffprobe is installed, it must also be able to read
+    the container.
+
+    :param filename: Downloaded file
+    :param expected_size: Exact size announced for the format, if any
+    :raises ValueError: If the file is incomplete or unreadable
+    """
+    size = os.path.getsize(filename)
+    if size == 0:
+        raise ValueError(f"{filename} is empty")
+    if expected_size and size != expected_size:
+        raise ValueError(f"{filename} has {size} bytes, expected {expected_size}")
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe:
+        probe = subprocess.run(
+            [ffprobe, "-v", "error", "-show_entries", "format=duration", filename],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if probe.returncode != 0:
+            raise ValueError(f"{filename} is not readable: {probe.stderr.strip()}")
+
+
+def is_interrupted(manifest: Optional[Dict[str, Any]]) -> bool:
+    """
+    Tell whether a download stopped because its process went away.
+
+    Failed downloads are not interrupted, they wait for the client to ask
+    again. The caller holds the directory's lock, so a download marked
+    running is not running anywhere anymore.
+
+    :param manifest: Record of a working directory
+    :return: True if the download should be requeued
+    """
+    if not manifest or not manifest.get("url"):
+        return False
+    if manifest.get("updated_at", 0) < time.time() - DOWNLOAD_RESUME_TTL_SECS:
+        return False
+    if manifest.get("resumes", 0) >= RESUME_MAX_ATTEMPTS:
+        return False
+    if manifest.get("status") == RESUME_QUEUED:
+        # Requeued by a process that died before running it
+        return not pid_alive(manifest.get("owner_pid") or 0)
+    return manifest.get("status") == RESUME_RUNNING
+
+
+def claim_unfinished_downloads(base_dir: str) -> List[Dict[str, Any]]:
+    """
+    Claim the interrupted downloads kept under base_dir for requeueing.
+
+    Each directory is checked and marked queued under its lock, so when
+    several workers start at once only one of them requeues a download.
+
+    :param base_dir: Directory holding the working directories
+    :return: Records of the downloads claimed by this process
+    """
+    claimed = []
+    for entry in os.scandir(base_dir):
+        if not entry.is_dir(follow_symlinks=False) or not is_resume_dir(entry.path):
+            continue
+        try:
+            fd = os.open(os.path.join(entry.path, LOCK_NAME), os.O_CREAT | os.O_RDWR)
+        except OSError:
+            continue
+        try:
+            # Held while the download runs or another worker checks it
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            manifest = read_manifest(entry.path)
+            if is_interrupted(manifest):
+                claimed.append(
+                    write_manifest(
+                        entry.path,
+                        status=RESUME_QUEUED,
+                        owner_pid=os.getpid(),
+                        resumes=manifest.get("resumes", 0) + 1,
+                    )
+                )
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    return claimed
@@ -0,0 +1,46 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+# Uploaded objects are deleted by cleanup_old_files once older than this
+MAX_FILE_AGE_MINS = int(os.environ.get("MAX_FILE_AGE_MINS") or 120)
+
+# When > 0, uploads are written under <root>/<bucket start>/ prefixes of this
+# many minutes, so cleanup can drop whole expired prefixes without looking
+# at every object in the bucket.
+S3_TIME_BUCKET_MINS = int(os.environ.get("S3_TIME_BUCKET_MINS", "0"))
+S3_TIME_BUCKET_ROOT = "uploads/"
+TIME_BUCKET_FORMAT = "%Y%m%d%H%M"
+
+
+def time_bucket_prefix(now: Optional[datetime] = None) -> str:
+    """
+    Return the key prefix new uploads are written under.
+
+    :param now: Upload time, defaults to the current UTC time
+    :return: "uploads/<bucket start>/" or "" when bucketing is disabled
+    """
+    if S3_TIME_BUCKET_MINS <= 0:
+        return ""
+    now = now or datetime.now(timezone.utc)
+    minutes = (now.hour * 60 + now.minute) // S3_TIME_BUCKET_MINS * S3_TIME_BUCKET_MINS
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(
+        minutes=minutes
+    )
+    return f"{S3_TIME_BUCKET_ROOT}{start.strftime(TIME_BUCKET_FORMAT)}/"
+
+
+def time_bucket_end(prefix: str, bucket_mins: int) -> Optional[datetime]:
+    """
+    Return when the time bucket stopped receiving uploads.
+
+    :param prefix: Prefix as returned by time_bucket_prefix
+    :param bucket_mins: Bucket length the prefix was written with
+    :return: End of the bucket in UTC, or None if prefix is not a time bucket
+    """
+    name = prefix[len(S3_TIME_BUCKET_ROOT) :].strip("/")
+    try:
+        start = datetime.strptime(name, TIME_BUCKET_FORMAT).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return start + timedelta(minutes=bucket_mins)
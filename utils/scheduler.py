@@ -0,0 +1,232 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from utils.metrics import record_queue_wait, set_domain_gauges
+
+# Jobs allowed to run against one site at the same time
+DOMAIN_MAX_CONCURRENCY = int(os.environ.get("DOMAIN_MAX_CONCURRENCY", "2"))
+# Per-site overrides, e.g. "youtube.com=3,vimeo.com=1"
+DOMAIN_CONCURRENCY_LIMITS = os.environ.get("DOMAIN_CONCURRENCY_LIMITS", "")
+
+PRIORITIES = {"low": 0, "normal": 1, "high": 2}
+DEFAULT_PRIORITY = os.environ.get("DEFAULT_PRIORITY", "normal")
+BATCH_PRIORITY = os.environ.get("BATCH_PRIORITY", "low")
+# A waiting job gains one priority level per this many seconds, so low
+# priority work still runs under sustained load
+PRIORITY_AGING_SECS = float(os.environ.get("PRIORITY_AGING_SECS", "120"))
+
+# Hosts that serve the same site as another one
+DOMAIN_ALIASES = {"youtu.be": "youtube.com", "youtube-nocookie.com": "youtube.com"}
+# Wait times kept per domain for the stats
+WAIT_SAMPLES = 100
+
+
+def parse_domain_limits(spec: str) -> Dict[str, int]:
+    """
+    Parse "domain=limit" pairs separated by commas.
+
+    :param spec: e.g. "youtube.com=3,vimeo.com=1"
+    :return: Mapping of domain to concurrency limit
+    """
+    limits = {}
+    for pair in spec.split(","):
+        if "=" not in pair:
+            continue
+        domain, limit = pair.split("=", 1)
+        limits[domain.strip().lower()] = max(1, int(limit))
+    return limits
+
+
+def job_domain(url: str) -> str:
+    """
+    Return the site a URL downloads from, used to group jobs per site.
+
+    Mobile and www hosts count as the site itself, and known short-link
+    hosts as the site they redirect to.
+
+    :param url: Sanitized video URL
+    :return: Host name without "www."/"m.", or "unknown"
+    """
+    host = (urlparse(url).hostname or "").lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix) :]
+    return DOMAIN_ALIASES.get(host, host) or "unknown"
+
+
+def priority_value(name: str) -> int:
+    """
+    Map a priority name to its level.
+
+    :raises ValueError: If name is not a known priority
+    """
+    if not isinstance(name, str) or name not in PRIORITIES:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+    return PRIORITIES[name]
+
+
+class FairScheduler:
+    def __init__(
+        self,
+        max_size: int,
+        default_limit: int = DOMAIN_MAX_CONCURRENCY,
+        limits: Optional[Dict[str, int]] = None,
+        aging_secs: float = PRIORITY_AGING_SECS,
+    ):
+        """
+        Queue of jobs that decides which job a free worker runs next.
+
+        Jobs whose site already has its limit of running jobs are skipped,
+        so a burst against one site does not hold up others. Of the jobs
+        that may run, the one with the highest priority (plus one level per
+        full aging_secs it waited) wins; on a tie, the client served least
+        recently, so a client with many queued jobs takes turns with the
+        others. Levels are whole numbers, so jobs queued moments apart tie
+        and only a job that waited a full period overtakes. A client's own
+        jobs are ranked the same way, oldest first on a tie, so its urgent
+        job does not wait behind its earlier low priority batch.
+
+        :param max_size: Number of jobs allowed to wait
+        :param default_limit: Running jobs allowed per site
+        :param limits: Per-site overrides of default_limit
+        :param aging_secs: Seconds of waiting worth one priority level
+        """
+        self.max_size = max(1, max_size)
+        self.default_limit = max(1, default_limit)
+        self.limits = (
+            parse_domain_limits(DOMAIN_CONCURRENCY_LIMITS) if limits is None else limits
+        )
+        self.aging_secs = aging_secs
+        self._queues: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._last_served: Dict[str, float] = {}
+        self._size = 0
+        self._queued: Dict[str, int] = defaultdict(int)
+        self._running: Dict[str, int] = defaultdict(int)
+        self._waits: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=WAIT_SAMPLES)
+        )
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def limit(self, domain: str) -> int:
+        return self.limits.get(domain, self.default_limit)
+
+    def qsize(self) -> int:
+        with self._lock:
+            return self._size
+
+    def full(self) -> bool:
+        with self._lock:
+            return self._size >= self.max_size
+
+    def put(self, job: Dict[str, Any]) -> None:
+        """
+        Queue a job; the caller checks full() first.
+
+        :param job: Job record with "url", "client_ids", "created_at" and an
+                    optional "owner" and "priority"
+        """
+        domain = job_domain(job["url"])
+        client = job.get("owner") or next(iter(job["client_ids"]), "anonymous")
+        with self._changed:
+            self._queues.setdefault(client, deque()).append(job)
+            self._size += 1
+            self._queued[domain] += 1
+            self._update_gauges(domain)
+            self._changed.notify()
+
+    def get(self) -> Dict[str, Any]:
+        """
+        Block until a job may run and take it off the queue.
+
+        :return: The job, counted as running until done() is called
+        """
+        with self._changed:
+            while True:
+                picked = self._pick(time.time())
+                if picked:
+                    break
+                self._changed.wait()
+            client, job, domain = picked
+            self._queues[client].remove(job)
+            if not self._queues[client]:
+                del self._queues[client]
+            self._last_served[client] = time.monotonic()
+            self._size -= 1
+            self._queued[domain] -= 1
+            self._running[domain] += 1
+            wait = time.time() - job["created_at"]
+            self._waits[domain].append(wait)
+            self._update_gauges(domain)
+        record_queue_wait(domain, wait)
+        return job
+
+    def done(self, job: Dict[str, Any]) -> None:
+        """
+        Release the site slot of a job returned by get().
+        """
+        domain = job_domain(job["url"])
+        with self._changed:
+            self._running[domain] -= 1
+            self._update_gauges(domain)
+            # A slot of this site opened up, which may unblock any worker
+            self._changed.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the queue depth, running jobs and recent wait times per site.
+        """
+        with self._lock:
+            domains = {}
+            for domain in set(self._queued) | set(self._running):
+                waits = sorted(self._waits[domain])
+                if not (self._queued[domain] or self._running[domain] or waits):
+                    continue
+                domains[domain] = {
+                    "queued": self._queued[domain],
+                    "running": self._running[domain],
+                    "limit": self.limit(domain),
+                    "wait_p50": waits[len(waits) // 2] if waits else None,
+                    "wait_max": waits[-1] if waits else None,
+                }
+            return {
+                "queued": self._size,
+                "clients": len(self._queues),
+                "domains": domains,
+            }
+
+    def _pick(self, now: float) -> Optional[Tuple[str, Dict[str, Any], str]]:
+        # Caller holds self._lock
+        best = None
+        best_rank = None
+        for client, jobs in self._queues.items():
+            # The client's highest priority job whose site has a free slot
+            candidate = None
+            for job in jobs:
+                domain = job_domain(job["url"])
+                if self._running[domain] >= self.limit(domain):
+                    continue
+                job_rank = (self._aged_priority(job, now), -job["created_at"])
+                if candidate is None or job_rank > candidate[0]:
+                    candidate = (job_rank, job, domain)
+            if candidate is None:
+                continue
+            (priority, _), job, domain = candidate
+            rank = (priority, -self._last_served.get(client, float("-inf")))
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (client, job, domain), rank
+        return best
+
+    def _aged_priority(self, job: Dict[str, Any], now: float) -> int:
+        priority = job.get("priority", PRIORITIES["normal"])
+        if self.aging_secs > 0:
+            priority += int((now - job["created_at"]) // self.aging_secs)
+        return priority
+
+    def _update_gauges(self, domain: str) -> None:
+        # Caller holds self._lock
+        set_domain_gauges(domain, self._queued[domain], self._running[domain])
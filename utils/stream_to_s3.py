@@ -0,0 +1,146 @@
+import logging
+import os
+import zipfile
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.get_s3_client import get_s3_client
+from utils.upload_to_s3 import S3_BUCKET_NAME
+
+logger = logging.getLogger(__name__)
+
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+STREAM_PART_SIZE = max(
+    MIN_PART_SIZE, int(os.environ.get("STREAM_PART_SIZE_MB", "8")) * 1024 * 1024
+)
+# Size of the reads when copying S3 objects into an archive
+ZIP_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class FileTooLargeError(Exception):
+    pass
+
+
+class MultipartUploadWriter:
+    def __init__(
+        self,
+        object_name: str,
+        part_size: int = STREAM_PART_SIZE,
+        max_bytes: Optional[int] = None,
+    ):
+        """
+        File-like writer that streams data into an S3 multipart upload.
+
+        At most one part is held in memory; it is uploaded as soon as it is
+        full, so memory use stays at part_size regardless of the file size.
+
+        :param object_name: Key of the object to create in S3
+        :param part_size: Size of each uploaded part in bytes
+        :param max_bytes: Optional size limit; writing past it raises
+                          FileTooLargeError, and leaving the with block
+                          then aborts the upload
+        """
+        self.object_name = object_name
+        self.part_size = max(MIN_PART_SIZE, part_size)
+        self.max_bytes = max_bytes
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._parts: List[Dict[str, Any]] = []
+        self._upload_id: Optional[str] = get_s3_client().create_multipart_upload(
+            Bucket=S3_BUCKET_NAME, Key=object_name
+        )["UploadId"]
+
+    def write(self, data: bytes) -> int:
+        if self.max_bytes and self.bytes_written + len(data) > self.max_bytes:
+            raise FileTooLargeError(
+                f"File is larger than the size limit of {self.max_bytes} bytes"
+            )
+        self._buffer.extend(data)
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[: self.part_size]))
+            del self._buffer[: self.part_size]
+        return len(data)
+
+    def flush(self) -> None:
+        # Parts are only uploaded once full; see close()
+        pass
+
+    def close(self) -> None:
+        """
+        Upload the remaining buffer and complete the multipart upload.
+        """
+        if self._upload_id is None:
+            return
+        if self._buffer or not self._parts:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        get_s3_client().complete_multipart_upload(
+            Bucket=S3_BUCKET_NAME,
+            Key=self.object_name,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+        self._upload_id = None
+
+    def abort(self) -> None:
+        """
+        Abort the multipart upload so S3 discards the parts already stored.
+        """
+        if self._upload_id is None:
+            return
+        try:
+            get_s3_client().abort_multipart_upload(
+                Bucket=S3_BUCKET_NAME, Key=self.object_name, UploadId=self._upload_id
+            )
+        except Exception as e:
+            logger.warning(
+                f"Failed to abort multipart upload of {self.object_name}: {e}"
+            )
+        self._upload_id = None
+        self._buffer.clear()
+
+    def _upload_part(self, data: bytes) -> None:
+        part_number = len(self._parts) + 1
+        response = get_s3_client().upload_part(
+            Bucket=S3_BUCKET_NAME,
+            Key=self.object_name,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+
+    def __enter__(self) -> "MultipartUploadWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def zip_objects_to_s3(object_name: str, members: List[Tuple[str, str]]) -> int:
+    """
+    Stream S3 objects into a ZIP archive stored as another S3 object.
+
+    Members are copied chunk by chunk from S3 into the multipart upload, so
+    neither the files nor the archive touch the disk. Videos are already
+    compressed, so members are stored rather than deflated.
+
+    :param object_name: Key of the archive to create in S3
+    :param members: (name in the archive, key of the S3 object) pairs
+    :return: Size of the archive in bytes
+    """
+    with MultipartUploadWriter(object_name) as writer:
+        # The writer cannot seek, so zipfile writes data descriptors
+        with zipfile.ZipFile(writer, mode="w", compression=zipfile.ZIP_STORED) as zf:
+            for arcname, key in members:
+                body = get_s3_client().get_object(Bucket=S3_BUCKET_NAME, Key=key)[
+                    "Body"
+                ]
+                with zf.open(arcname, mode="w", force_zip64=True) as member:
+                    for chunk in body.iter_chunks(ZIP_COPY_CHUNK_SIZE):
+                        member.write(chunk)
+    return writer.bytes_written
@@ -1,15 +1,88 @@
-from typing import Optional
-from botocore.exceptions import ClientError
+import logging
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Optional, Tuple
 import re
 import os
+import threading
 from uuid import uuid4
 
 from utils.delete_local_file import delete_local_file
 from utils.get_s3_client import get_s3_client
+from utils.metrics import record_error, record_transfer, time_phase
+from utils.s3_layout import time_bucket_prefix
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+logger = logging.getLogger(__name__)
 
-s3_client = get_s3_client()
 S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME")
 
+MB = 1024 * 1024
+
+# 64 MB parts keep multi-GB files well under S3's 10,000 part limit while
+# ten parts in flight saturate most links to the object store.
+S3_MULTIPART_THRESHOLD_MB = int(os.environ.get("S3_MULTIPART_THRESHOLD_MB", "64"))
+S3_MULTIPART_CHUNKSIZE_MB = int(os.environ.get("S3_MULTIPART_CHUNKSIZE_MB", "64"))
+S3_MAX_CONCURRENCY = int(os.environ.get("S3_MAX_CONCURRENCY", "10"))
+
+# Lifetime of the download links handed to clients
+PRESIGNED_URL_EXPIRES_SECS = 7200  # 2 hours
+
+
+def build_transfer_config(
+    multipart_threshold_mb: int, multipart_chunksize_mb: int, max_concurrency: int
+) -> "TransferConfig":
+    """
+    Build the boto3 transfer settings used for uploads.
+
+    :param multipart_threshold_mb: Files at least this large use multipart uploads
+    :param multipart_chunksize_mb: Size of each uploaded part
+    :param max_concurrency: Number of parts uploaded in parallel
+    :return: TransferConfig for upload_file
+    """
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=multipart_threshold_mb * MB,
+        multipart_chunksize=multipart_chunksize_mb * MB,
+        max_concurrency=max_concurrency,
+        use_threads=max_concurrency > 1,
+    )
+
+
+@lru_cache(maxsize=None)
+def transfer_config() -> "TransferConfig":
+    """
+    Return the transfer settings of uploads, built on first use.
+    """
+    return build_transfer_config(
+        S3_MULTIPART_THRESHOLD_MB, S3_MULTIPART_CHUNKSIZE_MB, S3_MAX_CONCURRENCY
+    )
+
+
+class UploadProgress:
+    def __init__(self, file_path: str, callback: Callable[[int, int], None]):
+        """
+        Collect boto3 transfer callbacks into (uploaded, total) byte counts.
+
+        boto3 calls back from every part's thread with the bytes just sent,
+        so the running total is kept under a lock.
+
+        :param file_path: File being uploaded
+        :param callback: Called with (uploaded bytes, total bytes)
+        """
+        self.total_bytes = os.path.getsize(file_path)
+        self.uploaded_bytes = 0
+        self.callback = callback
+        self._lock = threading.Lock()
+
+    def __call__(self, bytes_amount: int) -> None:
+        with self._lock:
+            self.uploaded_bytes += bytes_amount
+            uploaded_bytes = self.uploaded_bytes
+        self.callback(uploaded_bytes, self.total_bytes)
+
 
 def get_s3_presigned_url(bucket_name: str, object_name: str) -> Optional[str]:
     """
@@ -19,16 +92,20 @@ def get_s3_presigned_url(bucket_name: str, object_name: str) -> Optional[str]:
     :param object_name: S3 object name
     :return: Presigned URL as string. If error, returns None.
     """
+    from botocore.exceptions import ClientError
+
     try:
         # Generate URL that expires in 2 hours
-        response = s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket_name, "Key": object_name},
-            ExpiresIn=7200,  # 2 hours
-        )
+        with time_phase("presign"):
+            response = get_s3_client().generate_presigned_url(
+                "get_object",
+                Params={"Bucket": bucket_name, "Key": object_name},
+                ExpiresIn=PRESIGNED_URL_EXPIRES_SECS,
+            )
         return response
     except ClientError as e:
-        print(f"Failed to generate presigned URL: {str(e)}")
+        record_error("presign", e)
+        logger.error(f"Failed to generate presigned URL: {str(e)}")
         return None
 
 
@@ -54,47 +131,112 @@ def sanitize_object_name(object_name: str) -> str:
     return "vidf_"+ sanitized
 
 
-def upload_to_s3(file_path: str, object_name: str) -> Optional[str]:
+def make_unique_object_name(object_name: str) -> str:
+    """
+    Build a sanitized S3 object name that does not collide with other uploads.
+
+    With S3_TIME_BUCKET_MINS set the name starts with the current time
+    bucket's prefix, see utils.s3_layout.
+
+    :param object_name: Original object name, usually the file name
+    :return: Unique object name
+    """
+    return f"{time_bucket_prefix()}{uuid4()}_{sanitize_object_name(object_name)}"
+
+
+def upload_to_s3(
+    file_path: str,
+    object_name: str,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    extractor: Optional[str] = None,
+    unique: bool = True,
+) -> Optional[str]:
     """
     Upload a file to S3 with a unique name.
 
     :param file_path: Path to the file to upload
     :param object_name: Name of the object in S3
+    :param progress_callback: Optional callable receiving (uploaded bytes, total bytes)
+    :param extractor: yt-dlp extractor of the video, used as a metrics label
+    :param unique: False to upload under object_name as is, when it is
+                   already unique
     :return: The unique object name used in S3
     """
     try:
-        print(f"Uploading to S3, Bucket: {S3_BUCKET_NAME}")
+        logger.info(f"Uploading to S3, Bucket: {S3_BUCKET_NAME}")
 
         # Sanitize and create a unique object name
-        sanitized_name = sanitize_object_name(object_name)
-        unique_object_name = f"{uuid4()}_{sanitized_name}"
+        unique_object_name = (
+            make_unique_object_name(object_name) if unique else object_name
+        )
 
         # Upload the file
-        s3_client.upload_file(file_path, S3_BUCKET_NAME, unique_object_name)
+        with time_phase("upload") as upload_timer:
+            get_s3_client().upload_file(
+                file_path,
+                S3_BUCKET_NAME,
+                unique_object_name,
+                Config=transfer_config(),
+                Callback=(
+                    UploadProgress(file_path, progress_callback)
+                    if progress_callback
+                    else None
+                ),
+            )
+        record_transfer(
+            "upload", extractor, os.path.getsize(file_path), upload_timer.seconds
+        )
 
-        print(f"File {file_path} uploaded to S3 as {unique_object_name}.")
+        logger.info(f"File {file_path} uploaded to S3 as {unique_object_name}.")
         return unique_object_name
     except Exception as e:
-        print(f"Failed to upload {file_path} to S3: {e}")
+        record_error("upload", e)
+        logger.error(f"Failed to upload {file_path} to S3: {e}")
         return None
 
 
-def upload_to_s3_and_get_url(
-    file_path: str, object_name: str, download_directory: str
-) -> Optional[str]:
+def upload_to_s3_and_presign(
+    file_path: str,
+    object_name: str,
+    download_directory: str,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    extractor: Optional[str] = None,
+) -> Optional[Tuple[str, str]]:
     """
-    Upload a file to S3 and return a presigned URL for download.
+    Upload a file to S3 and return both the object key and a presigned URL.
 
     :param file_path: Path to the file to upload
     :param object_name: Name of the object in S3
     :param download_directory: Directory to download the file to
-    :return: Presigned URL for the uploaded object
+    :param progress_callback: Optional callable receiving (uploaded bytes, total bytes)
+    :param extractor: yt-dlp extractor of the video, used as a metrics label
+    :return: (uploaded object name, presigned URL), or None on failure
     """
-    uploaded_object_name = upload_to_s3(file_path, object_name)
+    uploaded_object_name = upload_to_s3(
+        file_path, object_name, progress_callback, extractor
+    )
     if uploaded_object_name:
         presigned_url = get_s3_presigned_url(S3_BUCKET_NAME, uploaded_object_name)
 
         delete_local_file(download_directory)
 
-        return presigned_url
+        if presigned_url:
+            return uploaded_object_name, presigned_url
+    return None
+
+
+def upload_to_s3_and_get_url(
+    file_path: str, object_name: str, download_directory: str
+) -> Optional[str]:
+    """
+    Upload a file to S3 and return a presigned URL for download.
+
+    :param file_path: Path to the file to upload
+    :param object_name: Name of the object in S3
+    :param download_directory: Directory to download the file to
+    :return: Presigned URL for the uploaded object
+    """
+    uploaded = upload_to_s3_and_presign(file_path, object_name, download_directory)
+    if uploaded:
+        return uploaded[1]
     return None
@@ -1,30 +1,235 @@
+import os
 import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
+# Sanitized URLs remembered per process; batches and retries repeat them
+URL_CACHE_SIZE = int(os.environ.get("URL_CACHE_SIZE", "4096"))
+
+# Query parameters that only say where a click came from
+TRACKING_PARAMS = frozenset(
+    {
+        "fbclid",
+        "gclid",
+        "msclkid",
+        "dclid",
+        "mc_eid",
+        "mc_cid",
+        "igshid",
+        "igsh",
+        "yclid",
+        "twclid",
+        "ttclid",
+    }
+)
+TRACKING_PREFIXES = ("utm_",)
+# Share and referrer parameters of Facebook links; the ids come in several
+# other parameters (v, fbid, story_fbid, id, video_id, ...) and are kept
+FACEBOOK_NOISE_PARAMS = frozenset(
+    {"mibextid", "rdid", "ref", "refsrc", "sfnsn", "share_url", "__tn__"}
+)
+
+DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+
+YOUTUBE_ID = re.compile(r"[A-Za-z0-9_-]{11}")
+# /shorts/ID, /embed/ID, /live/ID and /v/ID name a single video
+YOUTUBE_ID_PATH = re.compile(r"/(?:shorts|embed|live|v)/([A-Za-z0-9_-]{11})(?:[/?]|$)")
+TIKTOK_VIDEO_PATH = re.compile(r"/(@[^/]+)/video/(\d+)")
+INSTAGRAM_POST_PATH = re.compile(r"/(?:p|reels?(?!/audio/)|tv)/([A-Za-z0-9_-]+)")
+# /video/N picks one video of a post with several
+TWITTER_STATUS_PATH = re.compile(
+    r"/(?:[^/]+/status|i/web/status|statuses)/(\d+)(/(?:video|photo)/\d+)?/?$"
+)
+# Channels and groups only list the video, its id is global; unlisted
+# videos add their hash, /ID/HASH or ?h=HASH
+VIMEO_VIDEO_PATH = re.compile(
+    r"/(?:video/|channels/[^/]+/|groups/[^/]+/videos/)?(\d+)(?:/([0-9a-f]{10}))?/?$"
+)
+DAILYMOTION_VIDEO_PATH = re.compile(r"/video/(x[0-9a-z]+)")
+DAILYMOTION_SHORT_PATH = re.compile(r"/(x[0-9a-z]+)/?$")
+
+
+def _is_tracking_param(key: str) -> bool:
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+
+def _youtube(path: str, query: Dict[str, str]) -> Optional[str]:
+    video_id = query.get("v") if path in ("/watch", "/watch/") else None
+    if not video_id:
+        match = YOUTUBE_ID_PATH.match(path)
+        video_id = match.group(1) if match else None
+    if not video_id and path == "/playlist" and query.get("list"):
+        return "https://www.youtube.com/playlist?" + urlencode({"list": query["list"]})
+    # /embed/videoseries?list=... embeds a playlist
+    if not video_id or video_id == "videoseries" or not YOUTUBE_ID.fullmatch(video_id):
+        return None
+    params = {"v": video_id}
+    # watch?v=X&list=Y still makes yt-dlp download the playlist
+    if query.get("list"):
+        params["list"] = query["list"]
+    return "https://www.youtube.com/watch?" + urlencode(params)
+
+
+def _youtu_be(path: str, query: Dict[str, str]) -> Optional[str]:
+    video_id = path.strip("/")
+    if not YOUTUBE_ID.fullmatch(video_id):
+        return None
+    return _youtube("/watch", {**query, "v": video_id})
+
+
+def _tiktok(path: str, query: Dict[str, str]) -> Optional[str]:
+    match = TIKTOK_VIDEO_PATH.match(path)
+    if not match:
+        return None
+    return f"https://www.tiktok.com/{match.group(1)}/video/{match.group(2)}"
+
+
+def _instagram(path: str, query: Dict[str, str]) -> Optional[str]:
+    match = INSTAGRAM_POST_PATH.match(path)
+    if not match:
+        return None
+    return f"https://www.instagram.com/p/{match.group(1)}/"
+
+
+def _twitter(path: str, query: Dict[str, str]) -> Optional[str]:
+    match = TWITTER_STATUS_PATH.match(path)
+    if not match:
+        return None
+    # The status id identifies the post, whoever is in the path
+    return f"https://x.com/i/status/{match.group(1)}{match.group(2) or ''}"
+
+
+def _vimeo(path: str, query: Dict[str, str]) -> Optional[str]:
+    match = VIMEO_VIDEO_PATH.match(path)
+    if not match:
+        return None
+    url = f"https://vimeo.com/{match.group(1)}"
+    unlisted_hash = match.group(2) or query.get("h")
+    return f"{url}/{unlisted_hash}" if unlisted_hash else url
+
+
+def _dailymotion(path: str, query: Dict[str, str]) -> Optional[str]:
+    match = DAILYMOTION_VIDEO_PATH.match(path)
+    if not match:
+        return None
+    return f"https://www.dailymotion.com/video/{match.group(1)}"
+
+
+def _dai_ly(path: str, query: Dict[str, str]) -> Optional[str]:
+    match = DAILYMOTION_SHORT_PATH.match(path)
+    if not match:
+        return None
+    return f"https://www.dailymotion.com/video/{match.group(1)}"
+
+
+def _facebook(path: str, query: Dict[str, str]) -> Optional[str]:
+    params = {
+        key: value
+        for key, value in query.items()
+        if key not in FACEBOOK_NOISE_PARAMS and not _is_tracking_param(key)
+    }
+    url = "https://www.facebook.com" + path
+    return f"{url}?{urlencode(params)}" if params else url
+
+
+# Canonical form of each site's video URLs, by host. A rule gets the path
+# and the query and returns the canonical URL, or None to leave the URL to
+# the generic cleanup. Only the parameters a rule keeps survive, so mobile
+# hosts, short links, timestamps and share ids all map to the same URL.
+# The result keys the result cache and job coalescing, so a rule must only
+# drop path segments and parameters known not to identify the video.
+SITE_RULES: Dict[str, Callable[[str, Dict[str, str]], Optional[str]]] = {
+    "youtube.com": _youtube,
+    "www.youtube.com": _youtube,
+    "m.youtube.com": _youtube,
+    "music.youtube.com": _youtube,
+    "youtube-nocookie.com": _youtube,
+    "www.youtube-nocookie.com": _youtube,
+    "youtu.be": _youtu_be,
+    "tiktok.com": _tiktok,
+    "www.tiktok.com": _tiktok,
+    "m.tiktok.com": _tiktok,
+    "instagram.com": _instagram,
+    "www.instagram.com": _instagram,
+    "twitter.com": _twitter,
+    "www.twitter.com": _twitter,
+    "mobile.twitter.com": _twitter,
+    "x.com": _twitter,
+    "www.x.com": _twitter,
+    "mobile.x.com": _twitter,
+    "vimeo.com": _vimeo,
+    "www.vimeo.com": _vimeo,
+    "player.vimeo.com": _vimeo,
+    "dailymotion.com": _dailymotion,
+    "www.dailymotion.com": _dailymotion,
+    "dai.ly": _dai_ly,
+    "facebook.com": _facebook,
+    "www.facebook.com": _facebook,
+    "m.facebook.com": _facebook,
+    "mbasic.facebook.com": _facebook,
+    "web.facebook.com": _facebook,
+}
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
 def sanitize_url(url: str) -> str:
-    # Ensure URL starts with http:// or https://
-    if not url.startswith(('http://', 'https://')):
-        url = 'https://' + url
-    
-    # Remove 'amp.' prefix if present in URL for any protocol
-    if "://amp." in url:
-        # Find the protocol separator and replace amp. with empty string
-        protocol_end = url.find("://") + 3
-        if url[protocol_end:].startswith("amp."):
-            url = url[:protocol_end] + url[protocol_end + 4:]
-    
-    # Remove common tracking parameters
-    tracking_params = [
-        'utm_source', 'utm_medium', 'utm_campaign', 
-        'utm_term', 'utm_content', 'fbclid',
-        'gclid', 'msclkid', 'dclid', 'mc_eid'
-    ]
-    for param in tracking_params:
-        url = re.sub(fr'[?&]{param}=[^&]*', '', url)
-    
-    # Remove trailing ? or & if they exist after parameter removal
-    url = re.sub(r'[?&]$', '', url)
-    
-    # Remove URL fragment
-    url = url.split('#')[0]
-    
-    return url
\ No newline at end of file
+    """
+    Normalize a URL to a stable canonical form.
+
+    The URL is parsed once: the scheme defaults to https, the host is
+    lowercased without an `amp.` prefix or default port, tracking
+    parameters and the fragment are dropped. URLs of the sites in
+    SITE_RULES are then reduced to their video id, e.g. youtu.be/ID,
+    m.youtube.com/watch?v=ID&t=5 and youtube.com/shorts/ID all become
+    https://www.youtube.com/watch?v=ID.
+
+    :param url: URL as given by the client
+    :return: Canonical URL
+    """
+    url = url.strip()
+    if not url.startswith(("http://", "https://")):
+        url = "https://" + url
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url.split("#")[0]
+
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    default_port = DEFAULT_PORTS.get(scheme)
+    if default_port and netloc.endswith(default_port):
+        netloc = netloc[: -len(default_port)]
+    if netloc.startswith("amp."):
+        netloc = netloc[4:]
+
+    rule = SITE_RULES.get(netloc)
+    if rule:
+        canonical = rule(
+            parts.path or "/", dict(parse_qsl(parts.query, keep_blank_values=True))
+        )
+        if canonical:
+            return canonical
+
+    # Keep the other parameters exactly as sent, signed media URLs break
+    # when they are re-encoded
+    query = "&".join(
+        param
+        for param in parts.query.split("&")
+        if param and not _is_tracking_param(param.split("=", 1)[0])
+    )
+    return urlunsplit((scheme, netloc, parts.path, query, ""))
+
+
+def sanitize_urls(urls: Iterable[str], unique: bool = False) -> List[str]:
+    """
+    Normalize several URLs, see sanitize_url.
+
+    :param urls: URLs as given by the client
+    :param unique: Drop URLs whose canonical form was already seen
+    :return: Canonical URLs, in the order given
+    """
+    canonical = [sanitize_url(url) for url in urls]
+    if unique:
+        return list(dict.fromkeys(canonical))
+    return canonical
@@ -0,0 +1,722 @@
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import yt_dlp
+from yt_dlp import ImpersonateTarget
+from yt_dlp.networking import Request
+
+from utils.delete_local_file import delete_local_file
+from utils.format_planner import is_clip, plan_formats
+from utils.impersonate import (
+    IMPERSONATE_MAX_ATTEMPTS,
+    impersonation_selector,
+    is_blocked,
+)
+from utils.local_delivery import DELIVERY_BACKEND
+from utils.log_config import log_download
+from utils.metrics import exception_name
+from utils.progress import ProgressThrottle, progress_event
+from utils.resume import (
+    DOWNLOAD_RETRIES,
+    prepare_resume,
+    retry_sleep,
+    verify_download,
+)
+from utils.scheduler import job_domain
+from utils.stream_to_s3 import FileTooLargeError, MultipartUploadWriter
+from utils.upload_to_s3 import make_unique_object_name
+from utils.video_info import cacheable_info, summarize_info
+from utils.ydl_pool import probe_ffmpeg, ydl_pool
+
+logger = logging.getLogger(__name__)
+# Receives yt-dlp's own output; a module-level object keeps pool keys stable
+ydl_logger = logging.getLogger("utils.yt_dlp")
+
+# Pipe downloads straight into S3 instead of through downloads/<session>
+STREAM_UPLOADS = os.environ.get("STREAM_UPLOADS", "False").lower() == "true"
+STREAMABLE_PROTOCOLS = ("http", "https")
+STREAM_READ_SIZE = 1024 * 1024
+
+
+class VideoDownloader:
+    _ffmpeg_warning_shown = False
+
+    def __init__(
+        self,
+        output_dir: Optional[str] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        impersonate_targets: Optional[List[ImpersonateTarget]] = None,
+        resume: bool = False,
+    ):
+        """
+        Initialize the VideoDownloader with a custom or default output directory.
+
+        :param output_dir: Directory to save downloaded videos.
+                            If None, creates a 'downloads' folder in current directory.
+        :param progress_callback: Optional callable receiving progress events
+                            ({"phase": "download", "percent": ...})
+        :param impersonate_targets: Optional impersonation targets to try, in
+                            order; defaults to this process's ranking for the site
+        :param resume: Download into output_dir itself, continuing from the
+                            partial files an earlier attempt left there
+        """
+        # yt-dlp calls the hook for every chunk, so events are throttled here,
+        # before they cross into the web process or onto the socket.
+        self._progress = (
+            ProgressThrottle(progress_callback) if progress_callback else None
+        )
+        self.phase_seconds: Dict[str, float] = {}
+        self.impersonate_targets = impersonate_targets
+        self._impersonate: Optional[ImpersonateTarget] = None
+        # Every attempt of this session, reported in results for the selector
+        self.attempts: List[Dict[str, Any]] = []
+
+        base_output_dir = output_dir or os.path.join(os.getcwd(), "downloads")
+        self.resume = resume and output_dir is not None
+
+        if self.resume:
+            # A stable working directory, see utils.resume
+            self.output_dir = output_dir
+        else:
+            # Create a unique subdirectory for each download session
+            unique_session_id = str(uuid.uuid4())[:8]  # Use first 8 characters of UUID
+            self.output_dir = os.path.join(base_output_dir, unique_session_id)
+
+        # Ensure the unique directory is created
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        self._check_ffmpeg()
+
+    def _check_ffmpeg(self):
+        """
+        Check if ffmpeg is installed, provide installation instructions if not.
+
+        ffmpeg is probed once per process and the instructions logged once.
+        """
+        if probe_ffmpeg()["available"] or VideoDownloader._ffmpeg_warning_shown:
+            return
+        VideoDownloader._ffmpeg_warning_shown = True
+        if sys.platform == "darwin":
+            install = "brew install ffmpeg (https://brew.sh)"
+        elif sys.platform.startswith("linux"):
+            install = "sudo apt-get install ffmpeg or sudo dnf install ffmpeg"
+        else:
+            install = "https://ffmpeg.org/download.html, then add it to PATH"
+        logger.warning(
+            "FFmpeg is not installed! It is required for merging video and "
+            f"audio streams. Install it with {install}"
+        )
+
+    def _build_options(
+        self, options: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Build the yt-dlp options for this session.
+
+        :param options: Optional dictionary of yt-dlp options overriding the defaults
+        :return: yt-dlp options dictionary
+        """
+        # Default download options with headers and bypass configurations
+        default_opts = {
+            # Format selection and merge options, narrowed by a download policy
+            **plan_formats(),
+            "outtmpl": os.path.join(self.output_dir, "%(title).50s.%(ext)s"),
+            # yt-dlp's messages go to the logging pipeline, not stdout;
+            # progress is reported by the hooks
+            "logger": ydl_logger,
+            "noprogress": True,
+            "progress_hooks": [self._progress_hook],
+            "postprocessor_hooks": [self._postprocessor_hook],
+            "nooverwrites": True,
+            # "http_headers": {
+            #     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            #     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+            #     "Accept-Language": "en-US,en;q=0.5",
+            #     "Referer": "https://www.google.com/",
+            # },
+            # "extractor_args": {
+            #     "youtube": {
+            #         "player_client": ["android"],
+            #         "player_skip": ["webpage"],
+            #     }
+            # },
+            # "force_generic_extractor": True,
+            # "ignoreerrors": True,
+            # Retries continue from the last byte or fragment, with backoff
+            "retries": DOWNLOAD_RETRIES,
+            "fragment_retries": DOWNLOAD_RETRIES,
+            "retry_sleep_functions": {"http": retry_sleep, "fragment": retry_sleep},
+            "continuedl": True,
+            # A missing fragment fails the download instead of a broken file
+            "skip_unavailable_fragments": False,
+            # "extract_flat": True,
+            "impersonate": self._impersonate,
+            # "referer": url,  # Use the video URL as referer
+            # "playlist_items": None,
+            # "throttled_rate": "1M",  # Limit download speed to avoid detection
+            # "sleep_interval": 5,  # Add delay between requests
+            # "max_sleep_interval": 10,
+            # "force_ipv4": False,
+            # Add filename sanitization options
+            # "restrictfilenames": True,  # Convert filename to ASCII
+            "windowsfilenames": True,  # Ensure Windows compatibility
+        }
+
+        # Update default options with user-provided options
+        if options:
+            default_opts.update(options)
+
+        return default_opts
+
+    def _with_fallback(
+        self, url: str, attempt: Callable[[], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Run attempt() with the best impersonation target, moving on to the
+        next one while the site blocks it.
+
+        :param url: URL the attempt downloads from
+        :param attempt: Runs the work once with self._impersonate, returns a
+                        result dictionary ("blocked" set on blocked failures)
+        :return: Result of the last attempt, with the "impersonation" site
+                 and every attempt of this session
+        """
+        domain = job_domain(url)
+        targets = self.impersonate_targets or impersonation_selector.ranking(domain)
+        for number, target in enumerate(targets[:IMPERSONATE_MAX_ATTEMPTS], start=1):
+            self._impersonate = target
+            start = time.perf_counter()
+            result = attempt()
+            blocked = not result["success"] and result.get("blocked", False)
+            self.attempts.append(
+                {
+                    "target": str(target),
+                    "success": result["success"],
+                    "blocked": blocked,
+                    "bytes": result.get("downloaded_bytes", 0),
+                    "seconds": time.perf_counter() - start,
+                }
+            )
+            if not blocked:
+                break
+            if number < min(len(targets), IMPERSONATE_MAX_ATTEMPTS):
+                logger.warning(f"{domain} blocked {target}, retrying as the next one")
+        result["impersonation"] = {"domain": domain, "attempts": list(self.attempts)}
+        return result
+
+    def extract_info(
+        self, url: str, options: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Extract a video's metadata and formats without downloading it.
+
+        :param url: URL of the video
+        :param options: Optional dictionary of yt-dlp options
+        :return: Dictionary with a compact "summary" and, for single videos,
+                 the sanitized "info" a later download can reuse
+        """
+        return self._with_fallback(url, lambda: self._extract_info(url, options))
+
+    def _extract_info(
+        self, url: str, options: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        self.phase_seconds = {}
+        try:
+            with ydl_pool.acquire(self._build_options(options)) as ydl:
+                start = time.perf_counter()
+                info_dict = ydl.extract_info(url, download=False)
+                self.phase_seconds["extract"] = time.perf_counter() - start
+            return {
+                "success": True,
+                "url": url,
+                "summary": summarize_info(info_dict),
+                "info": cacheable_info(info_dict),
+                "phase_seconds": self.phase_seconds,
+            }
+        except Exception as e:
+            logger.error(f"Error extracting video info: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "blocked": is_blocked(e),
+                "url": url,
+                "error_phase": "extract",
+                "error_type": exception_name(e),
+                "phase_seconds": self.phase_seconds,
+            }
+
+    def list_entries(self, url: str, limit: int) -> Dict[str, Any]:
+        """
+        List the video URLs of a playlist without resolving each entry.
+
+        :param url: Playlist or video URL
+        :param limit: Maximum number of entries to return
+        :return: Dictionary with the playlist "title" and its entry "urls";
+                 a single video yields just its own URL
+        """
+        return self._with_fallback(url, lambda: self._list_entries(url, limit))
+
+    def _list_entries(self, url: str, limit: int) -> Dict[str, Any]:
+        options = {
+            **self._build_options(),
+            "extract_flat": "in_playlist",
+            "playlistend": limit,
+        }
+        try:
+            with ydl_pool.acquire(options) as ydl:
+                info_dict = ydl.extract_info(url, download=False)
+            if info_dict.get("_type") in ("playlist", "multi_video"):
+                urls = [
+                    entry.get("url") or entry.get("webpage_url")
+                    for entry in info_dict.get("entries") or []
+                    if entry
+                ]
+            else:
+                urls = [info_dict.get("webpage_url") or url]
+            return {
+                "success": True,
+                "title": info_dict.get("title"),
+                "urls": [u for u in urls if u][:limit],
+            }
+        except Exception as e:
+            logger.error(f"Error listing entries of {url}: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "blocked": is_blocked(e),
+                "url": url,
+            }
+
+    def download(
+        self,
+        url: str,
+        options: Optional[Dict[str, Any]] = None,
+        info: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Download a video from the given URL.
+
+        :param url: URL of the video to download
+        :param options: Optional dictionary of yt-dlp download options
+        :param info: Optional cached extraction (see extract_info) to download
+                     from instead of extracting again
+        :return: Dictionary containing download information
+        """
+        return self._with_fallback(url, lambda: self._download(url, options, info))
+
+    def _download(
+        self,
+        url: str,
+        options: Optional[Dict[str, Any]] = None,
+        info: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        self.phase_seconds = {}
+        phase = "extract"
+        try:
+            with ydl_pool.acquire(self._build_options(options)) as ydl:
+                # Extract video information, then download it as a separate
+                # step so both phases can be timed
+                if info is None:
+                    start = time.perf_counter()
+                    info_dict = ydl.extract_info(url, download=False)
+                    self.phase_seconds["extract"] = time.perf_counter() - start
+                else:
+                    logger.info(f"Reusing cached extraction of {url}")
+                    # Only selects formats, no network access
+                    info_dict = ydl.process_ie_result(info, download=False)
+
+                if self.resume and prepare_resume(
+                    self.output_dir, info_dict.get("format_id")
+                ):
+                    logger.info(f"Resuming {url} from {self.output_dir}")
+
+                phase = "download"
+                start = time.perf_counter()
+                info_dict = ydl.process_ie_result(info_dict, download=True)
+                # Postprocessing (the ffmpeg merge) is timed by its own hook
+                download_seconds = (
+                    time.perf_counter()
+                    - start
+                    - self.phase_seconds.get("merge", 0)
+                    - self.phase_seconds.get("postprocess", 0)
+                )
+                self.phase_seconds["download"] = download_seconds
+
+                # Final path after merging; clips are written per section
+                requested = info_dict.get("requested_downloads") or [{}]
+                filename = requested[0].get("filepath") or ydl.prepare_filename(
+                    info_dict
+                )
+                if not os.path.exists(filename):
+                    # e.g. skipped for exceeding max_filesize
+                    raise yt_dlp.utils.DownloadError(
+                        "Download produced no file, it may exceed the size limit"
+                    )
+                # Merges and clips change the size, single files must match it
+                single = not info_dict.get("requested_formats") and not (
+                    options or {}
+                ).get("download_ranges")
+                try:
+                    verify_download(
+                        filename, info_dict.get("filesize") if single else None
+                    )
+                except ValueError as e:
+                    # Otherwise the next attempt would take it as finished
+                    os.remove(filename)
+                    raise yt_dlp.utils.DownloadError(f"Download is corrupt: {e}")
+                downloaded_bytes = os.path.getsize(filename)
+
+                # Prepare return information
+                result = {
+                    "success": True,
+                    "title": info_dict.get("title"),
+                    "filename": filename,
+                    "url": url,
+                    "extractor": info_dict.get("extractor"),
+                    "format_id": info_dict.get("format_id"),
+                    "download_directory": self.output_dir,
+                    "downloaded_bytes": downloaded_bytes,
+                    "phase_seconds": self.phase_seconds,
+                }
+                log_download(logger, url, info_dict, result)
+                return result
+
+        except Exception as e:
+            logger.error(f"Error downloading video: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {
+                "success": False,
+                "error": str(e),
+                "blocked": is_blocked(e),
+                "url": url,
+                "error_phase": phase,
+                "error_type": exception_name(e),
+                "phase_seconds": self.phase_seconds,
+            }
+
+    def stream_to_s3(
+        self,
+        url: str,
+        options: Optional[Dict[str, Any]] = None,
+        info: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Download a video straight into an S3 multipart upload, without a local file.
+
+        Single progressive formats are copied from the HTTP response. Formats
+        that need a merge are stream-copied by ffmpeg into fragmented MP4 on
+        stdout. If the selected formats cannot be streamed (HLS/DASH
+        fragments, playlists, no ffmpeg) or streaming fails, the result has
+        "streamable": False and the caller should fall back to download().
+
+        :param url: URL of the video to download
+        :param options: Optional dictionary of yt-dlp download options
+        :param info: Optional cached extraction to stream from
+        :return: Dictionary containing the uploaded S3 object name
+        """
+        return self._with_fallback(url, lambda: self._stream_to_s3(url, options, info))
+
+    def _stream_to_s3(
+        self,
+        url: str,
+        options: Optional[Dict[str, Any]] = None,
+        info: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        self.phase_seconds = {}
+        phase = "extract"
+        try:
+            with ydl_pool.acquire(self._build_options(options)) as ydl:
+                start = time.perf_counter()
+                if info is None:
+                    info_dict = ydl.extract_info(url, download=False)
+                else:
+                    # Only selects formats, no network access
+                    info_dict = ydl.process_ie_result(info, download=False)
+                self.phase_seconds["extract"] = time.perf_counter() - start
+                formats = info_dict.get("requested_formats") or [info_dict]
+
+                if not self._can_stream(info_dict, formats):
+                    return {"success": False, "streamable": False, "url": url}
+
+                object_name = make_unique_object_name(
+                    os.path.basename(ydl.prepare_filename(info_dict))
+                )
+                total_bytes = sum(
+                    f.get("filesize") or f.get("filesize_approx") or 0 for f in formats
+                )
+
+                phase = "stream"
+                start = time.perf_counter()
+                # Streams are not checked by yt-dlp's max_filesize, the
+                # writer enforces it instead
+                with MultipartUploadWriter(
+                    object_name, max_bytes=(options or {}).get("max_filesize")
+                ) as writer:
+                    if len(formats) == 1:
+                        self._stream_http(ydl, formats[0], writer, total_bytes)
+                    else:
+                        self._stream_ffmpeg_merge(formats, writer, total_bytes)
+                self.phase_seconds["stream"] = time.perf_counter() - start
+
+                self._progress_hook({"status": "finished", "filename": object_name})
+                result = {
+                    "success": True,
+                    "title": info_dict.get("title"),
+                    "object_name": object_name,
+                    "url": url,
+                    "extractor": info_dict.get("extractor"),
+                    "format_id": info_dict.get("format_id"),
+                    "downloaded_bytes": writer.bytes_written,
+                    "uploaded_bytes": writer.bytes_written,
+                    "phase_seconds": self.phase_seconds,
+                }
+                log_download(logger, url, info_dict, result)
+                return result
+
+        except FileTooLargeError as e:
+            logger.warning(f"Stopped streaming {url}: {e}")
+            # Final: downloading to disk would stop at the same limit
+            return {
+                "success": False,
+                "streamable": True,
+                "error": str(e),
+                "blocked": False,
+                "url": url,
+                "error_phase": phase,
+                "error_type": exception_name(e),
+                "phase_seconds": self.phase_seconds,
+            }
+        except Exception as e:
+            logger.warning(f"Streaming upload failed, falling back: {str(e)}")
+            return {
+                "success": False,
+                "streamable": False,
+                "error": str(e),
+                "blocked": is_blocked(e),
+                "url": url,
+                "error_phase": phase,
+                "error_type": exception_name(e),
+            }
+
+    def _can_stream(
+        self, info_dict: Dict[str, Any], formats: List[Dict[str, Any]]
+    ) -> bool:
+        if info_dict.get("_type", "video") != "video":
+            return False
+        if len(formats) > 1 and not probe_ffmpeg()["available"]:
+            return False
+        return all(
+            f.get("url") and f.get("protocol") in STREAMABLE_PROTOCOLS for f in formats
+        )
+
+    def _stream_http(
+        self,
+        ydl: yt_dlp.YoutubeDL,
+        fmt: Dict[str, Any],
+        writer: MultipartUploadWriter,
+        total_bytes: int,
+    ) -> None:
+        # Go through yt-dlp's request director so impersonation and cookies apply
+        # Closing the response returns its connection to the pool, also on errors
+        with ydl.urlopen(
+            Request(fmt["url"], headers=fmt.get("http_headers"))
+        ) as response:
+            total_bytes = int(response.headers.get("Content-Length") or total_bytes)
+            if writer.max_bytes and total_bytes > writer.max_bytes:
+                raise FileTooLargeError(
+                    f"File has {total_bytes} bytes, the size limit is "
+                    f"{writer.max_bytes}"
+                )
+            downloaded_bytes = 0
+            while chunk := response.read(STREAM_READ_SIZE):
+                writer.write(chunk)
+                downloaded_bytes += len(chunk)
+                self._progress_hook(
+                    {
+                        "status": "downloading",
+                        "downloaded_bytes": downloaded_bytes,
+                        "total_bytes": total_bytes,
+                    }
+                )
+
+    def _stream_ffmpeg_merge(
+        self,
+        formats: List[Dict[str, Any]],
+        writer: MultipartUploadWriter,
+        total_bytes: int,
+    ) -> None:
+        command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin"]
+        for fmt in formats:
+            headers = "".join(
+                f"{key}: {value}\r\n"
+                for key, value in (fmt.get("http_headers") or {}).items()
+            )
+            if headers:
+                command += ["-headers", headers]
+            command += ["-i", fmt["url"]]
+        for index, fmt in enumerate(formats):
+            if fmt.get("vcodec") != "none":
+                command += ["-map", f"{index}:v:0"]
+            if fmt.get("acodec") != "none":
+                command += ["-map", f"{index}:a:0"]
+        # Fragmented MP4 can be written to a pipe since it needs no seek back
+        command += [
+            "-c",
+            "copy",
+            "-movflags",
+            "frag_keyframe+empty_moov+default_base_moof",
+            "-f",
+            "mp4",
+            "pipe:1",
+        ]
+
+        process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        try:
+            while chunk := process.stdout.read(STREAM_READ_SIZE):
+                writer.write(chunk)
+                self._progress_hook(
+                    {
+                        "status": "downloading",
+                        "downloaded_bytes": writer.bytes_written,
+                        "total_bytes": total_bytes,
+                    }
+                )
+            stderr = process.stderr.read().decode(errors="replace")
+            if process.wait() != 0:
+                raise RuntimeError(f"ffmpeg exited with {process.returncode}: {stderr}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    def _postprocessor_hook(self, d: Dict[str, Any]) -> None:
+        """
+        Internal postprocessor hook timing the ffmpeg merge and other postprocessors.
+        """
+        if d["status"] == "started":
+            self._postprocess_start = time.perf_counter()
+        elif d["status"] == "finished":
+            phase = "merge" if d.get("postprocessor") == "Merger" else "postprocess"
+            seconds = time.perf_counter() - self._postprocess_start
+            self.phase_seconds[phase] = self.phase_seconds.get(phase, 0) + seconds
+
+    def _progress_hook(self, d: Dict[str, Any]) -> None:
+        """
+        Internal progress hook for download tracking.
+        """
+        if not self._progress:
+            return
+
+        if d["status"] == "finished":
+            logger.info(f"Download complete: {d['filename']}")
+            self._progress({"phase": "download", "percent": 100}, final=True)
+
+        elif d["status"] == "downloading":
+            event = progress_event(d)
+            if event:
+                self._progress(event)
+
+
+def download_video(url: str, output_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Convenience function for quick video downloads.
+
+    :param url: URL of the video to download
+    :param output_dir: Optional directory to save the video
+    :return: Download result dictionary
+    """
+    downloader = VideoDownloader(output_dir)
+    return downloader.download(url)
+
+
+def run_info_task(
+    url: str, impersonate_targets: Optional[List[ImpersonateTarget]] = None
+) -> Dict[str, Any]:
+    """
+    Extract a video's metadata without downloading it.
+
+    :param url: URL of the video
+    :param impersonate_targets: Optional impersonation targets to try, in order
+    :return: Result dictionary from VideoDownloader.extract_info
+    """
+    # Nothing is written, the session directory only satisfies VideoDownloader
+    with tempfile.TemporaryDirectory() as output_dir:
+        return VideoDownloader(
+            output_dir, impersonate_targets=impersonate_targets
+        ).extract_info(url)
+
+
+def run_expand_task(
+    url: str, limit: int, impersonate_targets: Optional[List[ImpersonateTarget]] = None
+) -> Dict[str, Any]:
+    """
+    List the entries of a playlist URL.
+
+    :param url: Playlist or video URL
+    :param limit: Maximum number of entries
+    :param impersonate_targets: Optional impersonation targets to try, in order
+    :return: Result dictionary from VideoDownloader.list_entries
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        return VideoDownloader(
+            output_dir, impersonate_targets=impersonate_targets
+        ).list_entries(url, limit)
+
+
+def run_download_task(
+    url: str,
+    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    output_dir: Optional[str] = None,
+    info: Optional[Dict[str, Any]] = None,
+    policy: Optional[Dict[str, Any]] = None,
+    impersonate_targets: Optional[List[ImpersonateTarget]] = None,
+    resume: bool = False,
+) -> Dict[str, Any]:
+    """
+    Download a video, streaming it straight to S3 when STREAM_UPLOADS is set.
+
+    The result has "object_name" when the video was streamed to S3, and
+    "filename"/"download_directory" when it still needs to be uploaded.
+
+    :param url: URL of the video to download
+    :param progress_callback: Optional callable receiving progress events
+    :param output_dir: Optional base directory for the download session
+    :param info: Optional cached extraction of url from run_info_task
+    :param policy: Optional quality/size policy, see utils.format_planner
+    :param impersonate_targets: Optional impersonation targets to try, in order
+    :param resume: Whether output_dir is a working directory to resume in
+    :return: Download result dictionary; "impersonation" lists every attempt
+    """
+    downloader = VideoDownloader(
+        output_dir, progress_callback, impersonate_targets, resume=resume
+    )
+    options = plan_formats(policy) if policy else None
+
+    # Clips are cut by ffmpeg from ranged reads, which needs a local file,
+    # and local delivery serves the file from disk
+    if STREAM_UPLOADS and DELIVERY_BACKEND == "s3" and not is_clip(policy):
+        result = downloader.stream_to_s3(url, options, info=info)
+        if result["success"]:
+            # Nothing was written to the session directory
+            delete_local_file(downloader.output_dir)
+            return result
+        if result.get("streamable"):
+            # Over the size limit, see _stream_to_s3
+            return result
+        logger.info(f"Cannot stream {url}, downloading to a temp file")
+
+    result = downloader.download(url, options, info=info)
+    if info is not None and not result["success"]:
+        # The cached format URLs may have expired
+        logger.info(f"Download from cached extraction failed, extracting {url} again")
+        result = downloader.download(url, options)
+    return result
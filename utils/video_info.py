@@ -0,0 +1,101 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from utils.ttl_cache import TTLCache
+
+# Format URLs in an extraction are signed and expire, so a cached extraction
+# is only reused for a few minutes
+INFO_CACHE_TTL_SECS = int(os.environ.get("INFO_CACHE_TTL_SECS", "300"))
+INFO_CACHE_MAX_ENTRIES = int(os.environ.get("INFO_CACHE_MAX_ENTRIES", "256"))
+
+# Large fields the downloader never uses, dropped before caching
+UNCACHED_INFO_KEYS = ("automatic_captions", "subtitles", "heatmap")
+
+
+def estimate_filesize(fmt: Dict[str, Any], duration: Optional[float]) -> Optional[int]:
+    """
+    Return a format's size, or an estimate from its bitrate and the duration.
+
+    :param fmt: yt-dlp format dictionary
+    :param duration: Duration of the video in seconds
+    :return: Size in bytes, or None if unknown
+    """
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return int(size)
+    if fmt.get("tbr") and duration:
+        # tbr is in kbit/s
+        return int(fmt["tbr"] * 1000 / 8 * duration)
+    return None
+
+
+def summarize_format(fmt: Dict[str, Any], duration: Optional[float]) -> Dict[str, Any]:
+    return {
+        "format_id": fmt.get("format_id"),
+        "ext": fmt.get("ext"),
+        "resolution": fmt.get("resolution"),
+        "height": fmt.get("height"),
+        "fps": fmt.get("fps"),
+        "vcodec": fmt.get("vcodec"),
+        "acodec": fmt.get("acodec"),
+        "protocol": fmt.get("protocol"),
+        "filesize": estimate_filesize(fmt, duration),
+    }
+
+
+def summarize_info(info: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the compact description returned by /info from a yt-dlp extraction.
+
+    :param info: Result of YoutubeDL.extract_info(download=False)
+    :return: Title, duration, formats with estimated sizes and the format a
+             download would pick by default
+    """
+    duration = info.get("duration")
+    summary = {
+        "title": info.get("title"),
+        "duration": duration,
+        "extractor": info.get("extractor"),
+        "webpage_url": info.get("webpage_url"),
+        "thumbnail": info.get("thumbnail"),
+        "uploader": info.get("uploader"),
+        "is_live": info.get("is_live"),
+    }
+    if info.get("_type", "video") != "video":
+        summary["entries"] = len(info.get("entries") or [])
+        return summary
+
+    formats: List[Dict[str, Any]] = info.get("formats") or [info]
+    summary["formats"] = [summarize_format(f, duration) for f in formats]
+
+    selected = info.get("requested_formats") or [info]
+    sizes = [estimate_filesize(f, duration) for f in selected]
+    summary["default_format"] = {
+        "format_id": "+".join(str(f.get("format_id")) for f in selected),
+        "ext": info.get("ext"),
+        "filesize": sum(sizes) if all(sizes) else None,
+    }
+    return summary
+
+
+def cacheable_info(info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Return a JSON-safe copy of an extraction that a later download can reuse.
+
+    Playlists are not reused since their entries are resolved per download.
+
+    :param info: Result of YoutubeDL.extract_info(download=False)
+    :return: Sanitized info dictionary, or None if it cannot be reused
+    """
+    if info.get("_type", "video") != "video":
+        return None
+    import yt_dlp
+
+    info = yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+    for key in UNCACHED_INFO_KEYS:
+        info.pop(key, None)
+    return info
+
+
+# Maps a sanitized URL to {"summary": ..., "info": ...}
+info_cache = TTLCache(INFO_CACHE_TTL_SECS, max_size=INFO_CACHE_MAX_ENTRIES)
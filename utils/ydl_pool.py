@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+# Idle YoutubeDL instances kept per set of construction options
+YDL_POOL_MAX_IDLE = int(os.environ.get("YDL_POOL_MAX_IDLE", "4"))
+# Replace an instance after this many jobs, so per-instance state stays bounded
+YDL_POOL_MAX_USES = int(os.environ.get("YDL_POOL_MAX_USES", "100"))
+
+# Options that change per job; everything else is fixed when the instance is built
+PER_JOB_OPTIONS = (
+    "outtmpl",
+    "progress_hooks",
+    "postprocessor_hooks",
+    "download_ranges",
+)
+
+
+@lru_cache(maxsize=None)
+def probe_ffmpeg() -> Dict[str, Any]:
+    """
+    Look up ffmpeg once per process.
+
+    :return: Dictionary with "available", "path" and the "version" line
+    """
+    path = shutil.which("ffmpeg")
+    if path:
+        try:
+            output = subprocess.run(
+                [path, "-version"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                check=True,
+                text=True,
+            ).stdout
+            return {
+                "available": True,
+                "path": path,
+                "version": output.splitlines()[0] if output else None,
+            }
+        except (subprocess.CalledProcessError, OSError):
+            pass
+    return {"available": False, "path": None, "version": None}
+
+
+def pool_key(options: Dict[str, Any]) -> str:
+    """
+    Build the key of the instances that can serve a set of options.
+
+    :param options: yt-dlp options including the per-job ones
+    :return: Stable string identifying the construction options
+    """
+    fixed = {k: v for k, v in options.items() if k not in PER_JOB_OPTIONS}
+    return json.dumps(fixed, sort_keys=True, default=str)
+
+
+class YoutubeDLPool:
+    def __init__(
+        self, max_idle: int = YDL_POOL_MAX_IDLE, max_uses: int = YDL_POOL_MAX_USES
+    ):
+        """
+        Reuse YoutubeDL instances across jobs.
+
+        Building a YoutubeDL loads the extractor list, the cookie jar, the
+        request handlers (including the impersonation handler, which is bound
+        to the "impersonate" option) and the postprocessors. Instances are
+        therefore pooled by their construction options, and only the per-job
+        state (output template, hooks, cookies, counters) is reset when one
+        is handed out.
+
+        :param max_idle: Idle instances kept per key
+        :param max_uses: Jobs an instance serves before it is closed
+        """
+        self.max_idle = max_idle
+        self.max_uses = max_uses
+        self.created = 0
+        self.reused = 0
+        self._idle: Dict[str, List[yt_dlp.YoutubeDL]] = defaultdict(list)
+        self._uses: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, options: Dict[str, Any]) -> Iterator[yt_dlp.YoutubeDL]:
+        """
+        Hand out a YoutubeDL configured with options for the duration of a job.
+
+        :param options: yt-dlp options, as passed to YoutubeDL()
+        :return: YoutubeDL instance used by this job only
+        """
+        key = pool_key(options)
+        ydl = self._take(key)
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL(
+                {k: v for k, v in options.items() if k not in PER_JOB_OPTIONS}
+            )
+            with self._lock:
+                self.created += 1
+        else:
+            with self._lock:
+                self.reused += 1
+        self._reset(ydl, options)
+
+        healthy = False
+        try:
+            yield ydl
+            healthy = True
+        finally:
+            self._give_back(key, ydl, healthy)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "idle": sum(len(idle) for idle in self._idle.values()),
+                "keys": len(self._idle),
+                "created": self.created,
+                "reused": self.reused,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            idle = [ydl for instances in self._idle.values() for ydl in instances]
+            self._idle.clear()
+            self._uses.clear()
+        for ydl in idle:
+            ydl.close()
+
+    def _take(self, key: str) -> Optional[yt_dlp.YoutubeDL]:
+        with self._lock:
+            idle = self._idle.get(key)
+            return idle.pop() if idle else None
+
+    def _give_back(self, key: str, ydl: yt_dlp.YoutubeDL, healthy: bool) -> None:
+        # Drop the job's hooks so the instance does not keep the job alive
+        ydl._progress_hooks = []
+        ydl._postprocessor_hooks = []
+        with self._lock:
+            uses = self._uses.pop(id(ydl), 0) + 1
+            keep = (
+                healthy
+                and uses < self.max_uses
+                and len(self._idle[key]) < self.max_idle
+            )
+            if keep:
+                self._uses[id(ydl)] = uses
+                self._idle[key].append(ydl)
+        if not keep:
+            ydl.close()
+
+    @staticmethod
+    def _reset(ydl: yt_dlp.YoutubeDL, options: Dict[str, Any]) -> None:
+        # Mirrors the per-job state YoutubeDL.__init__ sets up
+        ydl.params["outtmpl"] = options.get("outtmpl")
+        ydl._parse_outtmpl()
+        # Only read while processing a video, so it can change between jobs
+        if options.get("download_ranges"):
+            ydl.params["download_ranges"] = options["download_ranges"]
+        else:
+            ydl.params.pop("download_ranges", None)
+        ydl._progress_hooks = list(options.get("progress_hooks") or [])
+        ydl._postprocessor_hooks = list(options.get("postprocessor_hooks") or [])
+        ydl._printed_messages = set()
+        ydl._first_webpage_request = True
+        ydl._download_retcode = 0
+        ydl._num_downloads = 0
+        ydl._num_videos = 0
+        ydl._playlist_level = 0
+        ydl._playlist_urls = set()
+        # Cookies set by one job's site must not leak into the next job
+        ydl.cookiejar.clear()
+        ydl._YoutubeDL__header_cookies = []
+
+
+# One pool per process; download worker processes get their own
+ydl_pool = YoutubeDLPool()